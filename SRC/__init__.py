@@ -6,9 +6,21 @@ __version__ = "1.0.0"
 __author__ = "LastForEnd Team"
 __description__ = "Advanced Telegram Airdrop Bot with API, Referral & Wallet System"
 
-# Import main components for easier access
-from .database import DatabaseManager, db
-from .bot import LastForEndBot
+# اجزای اصلی هنگام اولین دسترسی import می‌شوند؛ import کردن یک زیرماژول سبک (مثلا src.signatures در
+# workerهای pool) نباید دیتابیس global و ربات را بسازد
+_LAZY = {
+    'DatabaseManager': '.database',
+    'db': '.database',
+    'LastForEndBot': '.bot',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        from importlib import import_module
+
+        return getattr(import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Export main classes and functions
 __all__ = [
@@ -62,6 +74,8 @@ def run_bot(token: str = None):
     Returns:
         LastForEndBot: The bot instance
     """
+    from .bot import LastForEndBot
+
     bot_token = token or BOT_CONFIG["token"]
     bot = LastForEndBot(bot_token)
     
@@ -82,15 +96,11 @@ def init_database():
     """
     Initialize database tables
     """
+    from .database import db
+
     db.init_database()
     print("✅ Database initialized successfully")
 
-# Auto-initialize database when module is imported
-try:
-    init_database()
-except Exception as e:
-    print(f"⚠️  Database initialization warning: {e}")
-
 if __name__ == "__main__":
     # If this file is run directly, start the bot
     run_bot()
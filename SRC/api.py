@@ -1,34 +1,271 @@
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    # توکن ربات
-    BOT_TOKEN = "8437428190:AAGI__RqJzin1PjbSPCpyz2p5mK_P7-8z2w"
-    
-    # تنظیمات دیتابیس
-    DATABASE_PATH = "data/airdrop.db"
-    
-    # تنظیمات API
-    API_HOST = "0.0.0.0"
-    API_PORT = 5000
-    
-    # تنظیمات توکن
-    TOKEN_NAME = "LFE"
-    TOKEN_SYMBOL = "LFE"
-    TOKEN_DECIMALS = 18
-    
-    # پاداش‌ها
-    REFERRAL_BONUS = 25
-    WELCOME_BONUS = 10
-    
-    # ماموریت‌ها
-    TASKS = {
-        "join_telegram": {"reward": 50, "name": "Join Telegram Channel"},
-        "follow_twitter": {"reward": 30, "name": "Follow Twitter"},
-        "invite_friends": {"reward": 25, "name": "Invite Friends"}
-    }
-    
-    # کیف پول‌های پشتیبانی شده
-    SUPPORTED_WALLETS = ["Metamask", "Trust Wallet", "Coinbase Wallet", "WalletConnect"]
+import hmac
+import logging
+from aiohttp import web
+
+from .async_database import AsyncDatabaseManager, async_db
+from .config import Config
+from .job_queue import JobQueue, job_queue
+from .wallet_integration import WalletIntegration, wallet_manager
+
+logger = logging.getLogger(__name__)
+
+# پاسخ‌های کوچک‌تر از این اندازه فشرده نمی‌شوند
+COMPRESSION_MIN_SIZE = 1024
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+def _parse_cursor(value: str):
+    """cursor به شکل <id>:<created_at>"""
+    tx_id, created_at = value.split(":", 1)
+    return created_at, int(tx_id)
+
+
+def _format_cursor(cursor):
+    return f"{cursor[1]}:{cursor[0]}" if cursor else None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """مقایسه If-None-Match با etag فعلی (پشتیبانی از چند مقدار و W/)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/").strip('"') == etag for tag in header.split(","))
+
+
+class APIServer:
+    def __init__(self, database: AsyncDatabaseManager = None, host: str = None, port: int = None):
+        self.db = database or async_db
+        self.wallets = wallet_manager if database is None else WalletIntegration(self.db.manager)
+        self.jobs = job_queue if database is None else JobQueue(self.db.manager)
+        self.host = host or Config.API_HOST
+        self.port = port or Config.API_PORT
+        self.app = self.create_app()
+
+    def create_app(self) -> web.Application:
+        """ساخت اپلیکیشن aiohttp و ثبت مسیرها"""
+        app = web.Application(middlewares=[self.cors_middleware, self.compression_middleware,
+                                           self.auth_middleware])
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        app.router.add_get("/api/balance", self.balance)
+        app.router.add_get("/api/dashboard", self.dashboard)
+        app.router.add_get("/api/tasks", self.tasks)
+        app.router.add_post("/api/tasks/{task_id:\\d+}/complete", self.complete_task)
+        app.router.add_get("/api/jobs/{job_id:\\d+}", self.job_status)
+        app.router.add_get("/api/transactions", self.transactions)
+        app.router.add_get("/api/leaderboard", self.leaderboard)
+        app.router.add_post("/api/wallet/challenge", self.wallet_challenge)
+        app.router.add_post("/api/wallet/verify", self.wallet_verify)
+        return app
+
+    # ===== MIDDLEWARES =====
+
+    @web.middleware
+    async def cors_middleware(self, request: web.Request, handler):
+        """اجازه دسترسی mini app از دامنه‌ی دیگر"""
+        if request.method == "OPTIONS":
+            response = web.Response()
+        else:
+            response = await handler(request)
+        response.headers["Access-Control-Allow-Origin"] = Config.API_CORS_ORIGIN
+        response.headers["Access-Control-Allow-Headers"] = "X-API-Key, Authorization, Content-Type, Idempotency-Key, If-None-Match"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        response.headers["Access-Control-Expose-Headers"] = "ETag, Location"
+        return response
+
+    @web.middleware
+    async def compression_middleware(self, request: web.Request, handler):
+        """فشرده‌سازی gzip/deflate برای پاسخ‌های بزرگ"""
+        response = await handler(request)
+        body = getattr(response, "body", None)
+        if body is not None and len(body) >= COMPRESSION_MIN_SIZE:
+            response.enable_compression()
+        return response
+
+    @web.middleware
+    async def auth_middleware(self, request: web.Request, handler):
+        """احراز هویت با api_key (هدر X-API-Key یا Authorization: Bearer)"""
+        if not request.path.startswith("/api/"):
+            return await handler(request)
+
+        api_key = request.headers.get("X-API-Key")
+        if not api_key:
+            auth = request.headers.get("Authorization", "")
+            if auth.startswith("Bearer "):
+                api_key = auth[7:]
+        if not api_key:
+            return _error(401, "Missing API key")
+
+        user = await self.db.get_user_by_api_key(api_key)
+        if not user:
+            return _error(401, "Invalid API key")
+
+        request["user"] = user
+        return await handler(request)
+
+    # ===== HANDLERS =====
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """آمار pool، cache، ledger و executor دیتابیس (فقط با API_METRICS_TOKEN)"""
+        # api_key کاربران برای این مسیر کافی نیست؛ بدون توکن مسیر وجود ندارد
+        if not Config.API_METRICS_TOKEN:
+            return _error(404, "Not found")
+        auth = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(auth.encode(), f"Bearer {Config.API_METRICS_TOKEN}".encode()):
+            return _error(401, "Invalid metrics token")
+        manager = self.db.manager
+        return web.json_response({
+            "pool": manager.get_pool_stats(),
+            "cache": manager.get_cache_stats(),
+            "ledger": manager.get_ledger_stats(),
+            "executor": self.db.get_executor_stats(),
+        })
+
+    async def balance(self, request: web.Request) -> web.Response:
+        user = request["user"]
+        return web.json_response({
+            "telegram_id": user["telegram_id"],
+            "username": user["username"],
+            "balance": user["total_tokens"],
+            "symbol": Config.TOKEN_SYMBOL,
+            "wallet_address": user["wallet_address"],
+            "referral_count": user["referral_count"],
+            "completed_tasks_count": user["completed_tasks_count"],
+        })
+
+    async def dashboard(self, request: web.Request) -> web.Response:
+        """snapshot کامل داشبورد در یک درخواست؛ 304 اگر etag تغییر نکرده باشد"""
+        try:
+            limit = min(max(int(request.query.get("transactions", 10)), 1), 100)
+        except ValueError:
+            return _error(400, "Invalid transactions limit")
+
+        snapshot = await self.db.get_dashboard_snapshot(request["user"]["telegram_id"], limit)
+        if snapshot is None:
+            return _error(503, "Dashboard unavailable")
+
+        etag = snapshot.pop("etag")
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+        if _etag_matches(request.headers.get("If-None-Match"), etag):
+            return web.Response(status=304, headers=headers)
+
+        cursor = snapshot["transactions"]["older"]
+        snapshot["transactions"]["older"] = _format_cursor(cursor)
+        return web.json_response(snapshot, headers=headers)
+
+    async def tasks(self, request: web.Request) -> web.Response:
+        tasks = await self.db.get_available_tasks(request["user"]["id"])
+        return web.json_response({"tasks": tasks})
+
+    async def complete_task(self, request: web.Request) -> web.Response:
+        """ثبت درخواست بررسی ماموریت؛ مثل ربات، بررسی (عضویت کانال و ...) و پاداش در job verify_task"""
+        user = request["user"]
+        task_id = int(request.match_info["task_id"])
+
+        # فقط ماموریت‌های فعال (get_task به ماموریت‌های غیرفعال هم برمی‌گردد)
+        tasks = {task["id"]: task for task in await self.db.get_available_tasks(user["id"])}
+        task = tasks.get(task_id)
+        if task is None:
+            return _error(404, "Task not found or not active")
+        if task["completed"]:
+            return _error(409, "Task already completed")
+
+        job_id, _ = await self.db.run(
+            self.jobs.enqueue, "verify_task",
+            {"telegram_id": user["telegram_id"], "task_id": task_id,
+             "idempotency_key": request.headers.get("Idempotency-Key")},
+            dedup_key=f"verify_task:{user['telegram_id']}:{task_id}"
+        )
+        return web.json_response({"job_id": job_id, "task_id": task_id}, status=202,
+                                 headers={"Location": f"/api/jobs/{job_id}"})
+
+    async def job_status(self, request: web.Request) -> web.Response:
+        """وضعیت job بررسی ماموریت؛ result بعد از پایان همان نتیجه‌ی verify_task است"""
+        job = await self.db.run(self.jobs.get_job, int(request.match_info["job_id"]))
+        if job is None or job["payload"].get("telegram_id") != request["user"]["telegram_id"]:
+            return _error(404, "Job not found")
+
+        body = {"job_id": job["id"], "kind": job["kind"], "status": job["status"], "result": job["result"]}
+        if job["status"] == "failed":
+            body["error"] = "Verification is temporarily unavailable"
+        return web.json_response(body)
+
+    async def transactions(self, request: web.Request) -> web.Response:
+        direction = request.query.get("direction", "older")
+        if direction not in ("older", "newer"):
+            return _error(400, "direction must be 'older' or 'newer'")
+        try:
+            limit = min(max(int(request.query.get("limit", 20)), 1), 100)
+            cursor = _parse_cursor(request.query["cursor"]) if "cursor" in request.query else None
+        except ValueError:
+            return _error(400, "Invalid cursor or limit")
+
+        page = await self.db.get_transactions_page(request["user"]["id"], cursor, direction, limit)
+        return web.json_response({
+            "transactions": page["transactions"],
+            "older": _format_cursor(page["older"]),
+            "newer": _format_cursor(page["newer"]),
+        })
+
+    async def leaderboard(self, request: web.Request) -> web.Response:
+        try:
+            limit = min(max(int(request.query.get("limit", 10)), 1), 100)
+            page = max(int(request.query.get("page", 0)), 0)
+        except ValueError:
+            return _error(400, "Invalid page or limit")
+
+        # لیدربرد در حافظه است و نیازی به executor ندارد
+        manager = self.db.manager
+        return web.json_response({
+            "leaderboard": manager.get_referral_leaderboard(limit, page * limit),
+            "me": manager.get_leaderboard_rank(request["user"]["telegram_id"]),
+        })
+
+    async def wallet_challenge(self, request: web.Request) -> web.Response:
+        """پیام یکبار مصرف برای امضا با personal_sign"""
+        try:
+            address = (await request.json())["address"]
+        except (ValueError, KeyError, TypeError):
+            return _error(400, "Body must be JSON with an 'address' field")
+        if not self.wallets.validate_wallet_address(address):
+            return _error(400, "Invalid wallet address")
+
+        user = request["user"]
+        message = await self.db.run(self.wallets.create_wallet_challenge, user["id"], user["telegram_id"], address)
+        if message is None:
+            return _error(500, "Could not create wallet challenge")
+        return web.json_response({"message": message, "expires_in": Config.WALLET_NONCE_TTL})
+
+    async def wallet_verify(self, request: web.Request) -> web.Response:
+        """بررسی امضای challenge و ثبت کیف پول کاربر"""
+        try:
+            signature = (await request.json())["signature"]
+        except (ValueError, KeyError, TypeError):
+            return _error(400, "Body must be JSON with a 'signature' field")
+
+        user = request["user"]
+        result = await self.wallets.connect_wallet(user["id"], user["telegram_id"], str(signature))
+        if not result["success"]:
+            return _error(400, result["error"])
+        return web.json_response({"wallet_address": result["wallet_address"]})
+
+    def run(self):
+        """اجرای سرور API (keep-alive فعال)"""
+        print(f"🌐 LastForEnd API running on {self.host}:{self.port}")
+        web.run_app(self.app, host=self.host, port=self.port,
+                    keepalive_timeout=Config.API_KEEPALIVE_TIMEOUT, print=None)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    APIServer().run()
@@ -0,0 +1,79 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from .config import Config
+from .database import DatabaseManager, db
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabaseManager:
+    """لایه async روی DatabaseManager؛ کوئری‌ها روی thread pool اختصاصی اجرا می‌شوند"""
+
+    def __init__(self, manager: DatabaseManager, max_workers: int = None, max_pending: int = None):
+        self.manager = manager
+        self.max_workers = max_workers or Config.DB_EXECUTOR_WORKERS
+        self.max_pending = max_pending or Config.DB_EXECUTOR_MAX_PENDING
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+        self._slots = None
+        self._loop = None
+
+        self.submitted = 0
+        self.completed = 0
+        self.queued_waits = 0
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        """semaphore صف محدود (برای هر event loop یک بار ساخته می‌شود)"""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._loop = loop
+        return self._slots
+
+    async def run(self, func, *args, **kwargs):
+        """اجرای یک تابع sync دیتابیس بدون بلاک کردن event loop"""
+        slots = self._get_slots()
+        if slots.locked():
+            self.queued_waits += 1
+        async with slots:
+            self.submitted += 1
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(
+                    self._executor, functools.partial(func, *args, **kwargs)
+                )
+            finally:
+                self.completed += 1
+
+    def __getattr__(self, name):
+        attr = getattr(self.manager, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+    def get_executor_stats(self) -> Dict:
+        """آمار executor دیتابیس"""
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.submitted - self.completed,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "queued_waits": self.queued_waits,
+        }
+
+    def shutdown(self):
+        """بستن executor"""
+        self._executor.shutdown(wait=True)
+
+
+# نمونه global برای هندلرهای async
+async_db = AsyncDatabaseManager(db)
@@ -0,0 +1,245 @@
+import asyncio
+import itertools
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector
+from web3 import Web3
+
+from .cache import LRUCache
+from .config import Config
+from .rate_limit import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+ETH = "ETH"
+ZERO_ADDRESS = "0x" + "00" * 20
+BALANCE_OF = function_signature_to_4byte_selector("balanceOf(address)")
+CHECKER_BALANCES = function_signature_to_4byte_selector("balances(address[],address[])")
+# سقف قرارداد BalanceChecker (MAX_OWNERS)
+CHECKER_MAX_OWNERS = 200
+
+
+class RPCError(Exception):
+    pass
+
+
+class JSONRPCClient:
+    """JSON-RPC روی HTTP با یک session مشترک؛ چند فراخوانی در یک درخواست batch ارسال می‌شوند"""
+
+    def __init__(self, url: str = None, max_batch: int = None, connections: int = None, timeout: float = None):
+        self.url = url or Config.WEB3_PROVIDER_URI
+        self.max_batch = max_batch or Config.RPC_MAX_BATCH
+        self.connections = connections or Config.RPC_CONNECTIONS
+        self.timeout = timeout or Config.WEB3_REQUEST_TIMEOUT
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ids = itertools.count(1)
+
+        self.requests = 0
+        self.calls = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            if not self.url:
+                raise RuntimeError("WEB3_PROVIDER_URI is not configured")
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def _post(self, payload: List[Dict]) -> List[Dict]:
+        self.requests += 1
+        self.calls += len(payload)
+        async with self._get_session().post(self.url, json=payload) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def call(self, method: str, params: list) -> Any:
+        return (await self.batch([(method, params)]))[0]
+
+    async def batch(self, calls: List[Tuple[str, list]]) -> List[Any]:
+        """نتیجه‌ها به ترتیب calls؛ بیش از max_batch فراخوانی در چند درخواست همزمان"""
+        requests = [{"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+                    for method, params in calls]
+        chunks = [requests[i:i + self.max_batch] for i in range(0, len(requests), self.max_batch)]
+        responses = await asyncio.gather(*(self._post(chunk) for chunk in chunks))
+
+        # پاسخ batch ممکن است ترتیب درخواست‌ها را نداشته باشد
+        by_id = {item["id"]: item for response in responses for item in response}
+        results = []
+        for request in requests:
+            item = by_id.get(request["id"])
+            if item is None or "error" in item:
+                error = item["error"] if item else "missing response"
+                raise RPCError(f"{request['method']} failed: {error}")
+            results.append(item["result"])
+        return results
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class BalanceService:
+    """موجودی ETH و توکن‌ها برای /wallet؛ درخواست‌های همزمان آدرس‌های مختلف در یک batch جمع می‌شوند
+
+    نتیجه برای هر آدرس تا بلاک بعدی cache می‌شود و درخواست‌های همزمان یک آدرس فقط یک بار خوانده می‌شوند.
+    اگر BALANCE_CHECKER_ADDRESS تنظیم شده باشد هر batch یک eth_call به قرارداد BalanceChecker است،
+    وگرنه یک درخواست JSON-RPC batch با eth_getBalance و balanceOf برای هر آدرس.
+    """
+
+    def __init__(self, rpc: JSONRPCClient = None, tokens: Dict[str, Tuple[str, int]] = None,
+                 checker_address: str = None, cache_size: int = None, batch_window: float = None,
+                 max_batch: int = None, head_ttl: float = None):
+        self.rpc = rpc or JSONRPCClient()
+        if tokens is None:
+            tokens = {"LFE": (Config.LFE_TOKEN_ADDRESS, Config.TOKEN_DECIMALS),
+                      "USDT": (Config.USDT_TOKEN_ADDRESS, Config.USDT_DECIMALS)}
+        self.tokens = {symbol: (Web3.to_checksum_address(address), decimals)
+                       for symbol, (address, decimals) in tokens.items() if address}
+        self.checker_address = checker_address if checker_address is not None else Config.BALANCE_CHECKER_ADDRESS
+        self.batch_window = batch_window if batch_window is not None else Config.BALANCE_BATCH_WINDOW
+        self.max_batch = max_batch or Config.BALANCE_MAX_BATCH
+        self.head_ttl = head_ttl if head_ttl is not None else Config.BALANCE_HEAD_TTL
+        # اعتبار اصلی با شماره‌ی بلاک است؛ ttl فقط حافظه‌ی آدرس‌های قدیمی را آزاد می‌کند
+        self.cache = LRUCache(cache_size or Config.BALANCE_CACHE_SIZE, 300)
+        self.reads = SingleFlight()
+
+        self._head: Tuple[int, float] = (-1, 0.0)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._queued: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.coalesced = 0
+
+    async def head(self) -> int:
+        """آخرین بلاک؛ حداکثر یک eth_blockNumber در هر head_ttl"""
+        block, fetched_at = self._head
+        loop = asyncio.get_running_loop()
+        if loop.time() - fetched_at < self.head_ttl:
+            return block
+
+        async def fetch():
+            number = int(await self.rpc.call("eth_blockNumber", []), 16)
+            self._head = (max(number, self._head[0]), loop.time())
+            return self._head[0]
+
+        return await self.reads.do("head", fetch)
+
+    async def get_balances(self, address: str) -> Dict[str, Decimal]:
+        """موجودی یک آدرس در آخرین بلاک (از cache اگر در همین بلاک خوانده شده باشد)"""
+        address = Web3.to_checksum_address(address)
+        head = await self.head()
+        cached = self.cache.get(address)
+        if cached is not None and cached[0] >= head:
+            return cached[1]
+
+        # آدرسی که در حال خواندن است دوباره خوانده نمی‌شود؛ آدرس‌های جدیدِ همین batch_window با هم خوانده می‌شوند
+        future = self._inflight.get(address)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = self._inflight[address] = loop.create_future()
+        self._queued.append(address)
+        if len(self._queued) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        queued, self._queued = self._queued, []
+        if queued:
+            asyncio.ensure_future(self._resolve(queued))
+
+    async def _resolve(self, addresses: List[str]):
+        try:
+            results = await self.get_many(addresses)
+        except Exception as e:
+            logger.error(f"Error fetching balances of {len(addresses)} addresses: {e}")
+            results = None
+        for address in addresses:
+            future = self._inflight.pop(address)
+            if future.done():
+                continue
+            if results is None:
+                future.set_exception(RPCError(f"balance lookup failed for {address}"))
+            else:
+                future.set_result(results[address])
+
+    async def get_many(self, addresses: Iterable[str]) -> Dict[str, Dict[str, Decimal]]:
+        """موجودی چند آدرس؛ آدرس‌هایی که در cache نیستند با یک درخواست HTTP خوانده می‌شوند"""
+        addresses = list(dict.fromkeys(Web3.to_checksum_address(address) for address in addresses))
+        head = await self.head()
+        results, missing = {}, []
+        for address in addresses:
+            cached = self.cache.get(address)
+            if cached is not None and cached[0] >= head:
+                results[address] = cached[1]
+            else:
+                missing.append(address)
+        if missing:
+            fetched = await self._fetch(missing, head)
+            for address, balances in fetched.items():
+                self.cache.set(address, (head, balances))
+            results.update(fetched)
+        return results
+
+    async def _fetch(self, addresses: List[str], block: int) -> Dict[str, Dict[str, Decimal]]:
+        """خواندن موجودی‌ها در همان بلاک head تا نتیجه‌ی هر batch سازگار باشد"""
+        self.batches += 1
+        block_tag = hex(block)
+        symbols = [ETH] + list(self.tokens)
+        decimals = [18] + [decimals for _, decimals in self.tokens.values()]
+
+        if self.checker_address:
+            tokens = [ZERO_ADDRESS] + [address for address, _ in self.tokens.values()]
+            chunks = [addresses[i:i + CHECKER_MAX_OWNERS] for i in range(0, len(addresses), CHECKER_MAX_OWNERS)]
+            responses = await self.rpc.batch([
+                ("eth_call", [{"to": self.checker_address,
+                               "data": Web3.to_hex(CHECKER_BALANCES + encode(["address[]", "address[]"],
+                                                                             [chunk, tokens]))}, block_tag])
+                for chunk in chunks
+            ])
+            raw = [value for response in responses
+                   for value in decode(["uint256[]"], Web3.to_bytes(hexstr=response))[0]]
+        else:
+            calls = []
+            for address in addresses:
+                calls.append(("eth_getBalance", [address, block_tag]))
+                data = Web3.to_hex(BALANCE_OF + encode(["address"], [address]))
+                calls += [("eth_call", [{"to": token, "data": data}, block_tag]) for token, _ in self.tokens.values()]
+            raw = [int(value, 16) if value not in ("0x", None) else 0 for value in await self.rpc.batch(calls)]
+
+        width = len(symbols)
+        return {
+            address: {symbol: Decimal(value).scaleb(-places)
+                      for symbol, places, value in zip(symbols, decimals, raw[i * width:(i + 1) * width])}
+            for i, address in enumerate(addresses)
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "head": self._head[0],
+            "cache": self.cache.stats(),
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "rpc_requests": self.rpc.requests,
+            "rpc_calls": self.rpc.calls,
+        }
+
+    async def close(self):
+        await self.rpc.close()
+
+
+# نمونه global (اتصال HTTP در اولین درخواست ساخته می‌شود)
+balance_service = BalanceService()
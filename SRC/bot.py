@@ -1,25 +1,61 @@
+import asyncio
 import logging
 import sqlite3
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram import Update
+from telegram.ext import (Application, ApplicationHandlerStop, CommandHandler, CallbackQueryHandler,
+                          ContextTypes, MessageHandler, TypeHandler, filters)
 
 # ایمپورت دیتابیس
 from src.database import db
+from src.async_database import async_db
+from src.cache import LRUCache
+from src.config import Config
+from src.job_queue import job_queue
+from src.rate_limit import SingleFlight, TokenBucketLimiter
+from src.send_queue import SendScheduler
+from src.task_manager import task_manager
+from src.wallet_integration import wallet_manager
+from src.withdrawals import withdrawals
+from src import templates
+from src.webhook import WebhookServer
 
 # تنظیمات لاگ
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+logger = logging.getLogger(__name__)
 
 class LastForEndBot:
-    def __init__(self, token: str):
+    def __init__(self, token: str, base_url: str = None):
         self.token = token
-        self.app = Application.builder().token(token).build()
+        # pool پیش‌فرض httpx فقط یک اتصال دارد و همه‌ی پاسخ‌ها پشت هم ارسال می‌شوند
+        builder = Application.builder().token(token).connection_pool_size(Config.BOT_CONNECTION_POOL_SIZE)
+        if base_url:
+            # برای سرور آزمایشی Telegram (benchmarks/fake_telegram.py)
+            builder = builder.base_url(base_url)
+        if Config.SEND_SCHEDULER_ENABLED:
+            # همه‌ی ارسال‌ها از صف اولویت‌دار با سقف سراسری و فاصله‌ی هر چت عبور می‌کنند
+            builder = builder.rate_limiter(SendScheduler.from_config())
+        self.app = builder.build()
+        
+        # محدودیت برای هر (telegram_id, command)؛ دکمه‌های refresh سخت‌گیرانه‌تر
+        refresh_rule = (Config.REFRESH_RATE, Config.REFRESH_BURST)
+        self.limiter = TokenBucketLimiter(
+            Config.RATE_LIMIT_RATE, Config.RATE_LIMIT_BURST, Config.RATE_LIMIT_MAX_KEYS,
+            rules={"refresh_tasks": refresh_rule, "refresh_wallet": refresh_rule, "refresh_profile": refresh_rule}
+        )
+        # خواندن‌های یکسان همزمان (مثلا چند refresh پشت سر هم) فقط یک بار به دیتابیس می‌روند
+        self.reads = SingleFlight()
+        # کاربرانی که بررسی عضویتشان اخیرا در صف قرار گرفته است
+        self.prefetched = LRUCache(Config.MEMBERSHIP_CACHE_SIZE, Config.MEMBERSHIP_NEGATIVE_TTL)
         self.setup_handlers()
     
     def setup_handlers(self):
         """تنظیم هندلرهای ربات"""
+        # rate limit قبل از همه‌ی هندلرها (group منفی)
+        self.app.add_handler(TypeHandler(Update, self.rate_limit_check), group=-1)
+        
         # دستورات اصلی
         self.app.add_handler(CommandHandler("start", self.start_command))
         self.app.add_handler(CommandHandler("wallet", self.wallet_command))
@@ -27,10 +63,57 @@ class LastForEndBot:
         self.app.add_handler(CommandHandler("invite", self.invite_command))
         self.app.add_handler(CommandHandler("profile", self.profile_command))
         self.app.add_handler(CommandHandler("leaderboard", self.leaderboard_command))
+        self.app.add_handler(CommandHandler("withdraw", self.withdraw_command))
+        self.app.add_handler(CommandHandler("connect_wallet", self.connect_wallet_command))
+        self.app.add_handler(CommandHandler("verify_wallet", self.verify_wallet_command))
+        # /complete_<task_id> (لینک داخل لیست ماموریت‌ها)
+        self.app.add_handler(MessageHandler(filters.Regex(r"^/complete_(\d+)(@\w+)?$"), self.complete_command))
         
         # هندلرهای اینلاین
         self.app.add_handler(CallbackQueryHandler(self.button_handler))
     
+    async def rate_limit_check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """رد کردن دستورها و کلیک‌های بیش از حد مجاز"""
+        user = update.effective_user
+        query = update.callback_query
+        message = update.effective_message
+        
+        if query and query.data:
+            command = query.data.split(":", 1)[0]
+        elif message and message.text and message.text.startswith("/"):
+            command = message.text.split()[0].split("@")[0][1:]
+        else:
+            return
+        if user is None:
+            return
+        
+        allowed, rejections = self.limiter.acquire(user.id, command)
+        if allowed:
+            return
+        
+        # پیام قبلی همان پاسخ cache شده است؛ فقط اطلاع کوتاه داده می‌شود
+        if query:
+            await query.answer("⏳ Too many taps, please wait a few seconds.")
+        elif rejections == 1:
+            await message.reply_text("⏳ You're sending commands too fast. Please wait a moment.")
+        raise ApplicationHandlerStop
+    
+    def get_stats(self) -> dict:
+        """آمار rate limit و ادغام خواندن‌ها"""
+        stats = {
+            "rate_limit": self.limiter.stats(),
+            "coalesced_reads": self.reads.stats(),
+        }
+        if self.app.bot.rate_limiter is not None:
+            stats["send_queue"] = self.app.bot.rate_limiter.stats()
+        return stats
+    
+    async def load_user(self, telegram_id: int):
+        return await self.reads.do(("user", telegram_id), lambda: async_db.get_user_by_telegram_id(telegram_id))
+    
+    async def load_referral_stats(self, user_id: int):
+        return await self.reads.do(("referral_stats", user_id), lambda: async_db.get_referral_stats(user_id))
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """دستور شروع ربات"""
         user = update.effective_user
@@ -44,196 +127,212 @@ class LastForEndBot:
         # ثبت کاربر در دیتابیس
         invited_by = None
         if referral_code:
-            referrer = db.get_user_by_referral_code(referral_code)
+            referrer = await async_db.get_user_by_referral_code(referral_code)
             if referrer:
                 invited_by = referrer['id']
         
-        user_id = db.register_user(user.id, user.username, invited_by)
-        
-        # ایجاد منوی اصلی
-        keyboard = [
-            [InlineKeyboardButton("💰 START EARNING", callback_data="earn")],
-            [InlineKeyboardButton("📊 MY WALLET", callback_data="wallet")],
-            [InlineKeyboardButton("👥 INVITE FRIENDS", callback_data="invite")],
-            [InlineKeyboardButton("📋 AVAILABLE TASKS", callback_data="tasks")],
-            [InlineKeyboardButton("👤 MY PROFILE", callback_data="profile")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        welcome_text = f"""
-🚀 **Welcome to LastForEnd, {user.first_name}!**
-
-Your final opportunity for financial freedom begins here.
-
-🔹 **Earn LFE tokens effortlessly**
-🔹 **Invite friends for bonus rewards**  
-🔹 **Connect your wallet securely**
-
-Start your journey to financial independence today!
-        """
+        user_id = await async_db.register_user(user.id, user.username, invited_by)
         
+        welcome_text = templates.WELCOME.render(first_name=user.first_name)
         if referral_code and invited_by:
-            welcome_text += f"\n\n🎉 You were invited by a friend! +25 LFE bonus!"
+            welcome_text += templates.INVITED_BONUS
         
-        await update.message.reply_text(welcome_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await update.effective_message.reply_text(welcome_text, reply_markup=templates.MAIN_MENU_KEYBOARD,
+                                                  parse_mode='Markdown')
     
     async def wallet_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """نمایش کیف پول کاربر"""
         user = update.effective_user
-        user_data = db.get_user_by_telegram_id(user.id)
+        user_data = await self.load_user(user.id)
         
         if not user_data:
-            await update.message.reply_text("❌ User not found. Please use /start first.")
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
             return
         
-        wallet_text = f"""
-💼 **Your LastForEnd Wallet**
-
-💰 **Balance:** `{user_data['total_tokens']} LFE`
-🌐 **Network:** Ethereum ERC-20
-
-"""
-        
-        if user_data['wallet_address']:
-            wallet_text += f"🔗 **Connected Wallet:** `{user_data['wallet_address'][:10]}...{user_data['wallet_address'][-8:]}`"
-        else:
-            wallet_text += "🔗 **Wallet Status:** Not connected"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔗 Connect Wallet", callback_data="connect_wallet")],
-            [InlineKeyboardButton("💳 Withdraw Tokens", callback_data="withdraw")],
-            [InlineKeyboardButton("📊 Transaction History", callback_data="transactions")],
-            [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_wallet")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(wallet_text, reply_markup=reply_markup, parse_mode='Markdown')
+        onchain = None
+        if user_data['wallet_address'] and Config.WEB3_PROVIDER_URI:
+            # هر فشار /wallet یک RPC نیست؛ درخواست‌های همزمان batch و تا بلاک بعدی cache می‌شوند
+            try:
+                onchain = await asyncio.wait_for(wallet_manager.get_wallet_balance(user_data['wallet_address']),
+                                                 Config.BALANCE_LOOKUP_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"On-chain balance unavailable: {e}")
+        
+        await update.effective_message.reply_text(templates.render_wallet(user_data, onchain),
+                                                  reply_markup=templates.WALLET_KEYBOARD, parse_mode='Markdown')
     
     async def tasks_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """نمایش ماموریت‌های available"""
         user = update.effective_user
-        user_data = db.get_user_by_telegram_id(user.id)
+        user_data = await self.load_user(user.id)
         
         if not user_data:
-            await update.message.reply_text("❌ User not found. Please use /start first.")
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
             return
         
-        tasks = db.get_available_tasks(user_data['id'])
+        tasks = await self.reads.do(("tasks", user_data['id']), lambda: async_db.get_available_tasks(user_data['id']))
         
         if not tasks:
-            await update.message.reply_text("📭 No tasks available at the moment.")
+            await update.effective_message.reply_text("📭 No tasks available at the moment.")
             return
         
-        tasks_text = "📋 **Available Tasks**\n\n"
-        
-        for task in tasks:
-            status = "✅" if task['completed'] else "⭕"
-            tasks_text += f"{status} **{task['name']}**\n"
-            tasks_text += f"📝 {task['description']}\n"
-            tasks_text += f"💰 Reward: `{task['reward_tokens']} LFE`\n"
-            
-            if not task['completed']:
-                tasks_text += f"🆔 Complete with: `/complete_{task['id']}`\n"
-            
-            tasks_text += "\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔄 Refresh Tasks", callback_data="refresh_tasks")],
-            [InlineKeyboardButton("📊 My Progress", callback_data="task_progress")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(tasks_text, reply_markup=reply_markup, parse_mode='Markdown')
+        # برای کاربرانی با ماموریت‌های زیاد متن به چند پیام زیر 4096 کاراکتر تقسیم می‌شود
+        await self.send_pages(update, templates.render_tasks(tasks), templates.TASKS_KEYBOARD)
+        await self.prefetch_membership(user.id, tasks)
+    
+    async def prefetch_membership(self, telegram_id: int, tasks: list):
+        """بررسی عضویت کانال در worker قبل از /complete تا پاداش منتظر getChatMember نماند"""
+        channels = {task_manager.channel_for_task(task) for task in tasks if not task['completed']} - {None}
+        for channel in channels:
+            if self.prefetched.get((channel, telegram_id)):
+                continue
+            self.prefetched.set((channel, telegram_id), True)
+            await async_db.run(job_queue.enqueue, "prefetch_membership",
+                               {"telegram_id": telegram_id, "channel": channel},
+                               dedup_key=f"membership:{channel}:{telegram_id}")
     
-    async def invite_command(self, Update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def complete_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """ثبت درخواست بررسی ماموریت؛ بررسی در worker انجام و همین پیام با نتیجه ویرایش می‌شود"""
+        user = update.effective_user
+        task_id = int(context.matches[0].group(1))
+        user_data = await self.load_user(user.id)
+        
+        if not user_data:
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
+            return
+        
+        status = await update.effective_message.reply_text("⏳ Verifying your task, this may take a few seconds...")
+        _, created = await async_db.run(
+            job_queue.enqueue, "verify_task", {"telegram_id": user.id, "task_id": task_id},
+            dedup_key=f"verify_task:{user.id}:{task_id}", chat_id=status.chat_id, message_id=status.message_id
+        )
+        if not created:
+            await status.edit_text("⏳ This task is already being verified. You'll get the result shortly.")
+    
+    async def withdraw_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """درخواست برداشت توکن؛ موجودی رزرو و برداشت در دسته‌ی بعدی روی زنجیره ارسال می‌شود"""
+        user = update.effective_user
+        user_data = await self.load_user(user.id)
+        
+        if not user_data:
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
+            return
+        if not user_data['wallet_address']:
+            await update.effective_message.reply_text("🔗 Connect a wallet first: `/connect_wallet 0xYourWalletAddress`",
+                                                      parse_mode='Markdown')
+            return
+        if not context.args or not context.args[0].isdigit() or int(context.args[0]) <= 0:
+            await update.effective_message.reply_text(templates.WITHDRAW_USAGE, parse_mode='Markdown')
+            return
+        
+        amount = int(context.args[0])
+        if amount > user_data['total_tokens']:
+            await update.effective_message.reply_text(
+                f"❌ Insufficient balance: you have `{user_data['total_tokens']} LFE`.", parse_mode='Markdown')
+            return
+        
+        result = await async_db.run(withdrawals.request_withdrawal, user_data['id'], amount,
+                                    user_data['wallet_address'])
+        if not result['success']:
+            await update.effective_message.reply_text(f"❌ {result['error']}")
+            return
+        await update.effective_message.reply_text(
+            f"💳 Withdrawal #{result['withdrawal_id']} queued: `{amount} {Config.TOKEN_SYMBOL}` to `{result['to']}`\n"
+            f"It will be sent in the next on-chain batch.", parse_mode='Markdown')
+    
+    async def connect_wallet_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """شروع اتصال کیف پول؛ کاربر باید پیام یکبار مصرف را با کیف پولش امضا کند"""
+        user = update.effective_user
+        user_data = await self.load_user(user.id)
+        
+        if not user_data:
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
+            return
+        if not context.args or not wallet_manager.validate_wallet_address(context.args[0]):
+            await update.effective_message.reply_text(templates.CONNECT_WALLET_USAGE, parse_mode='Markdown')
+            return
+        
+        message = await async_db.run(wallet_manager.create_wallet_challenge, user_data['id'], user.id, context.args[0])
+        if message is None:
+            await update.effective_message.reply_text("❌ Could not start wallet connection. Please try again.")
+            return
+        await update.effective_message.reply_text(
+            f"✍️ Sign this message with your wallet (personal_sign):\n\n`{message}`\n\n"
+            f"Then send `/verify_wallet 0xSignature` within {int(Config.WALLET_NONCE_TTL // 60)} minutes.",
+            parse_mode='Markdown')
+    
+    async def verify_wallet_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """بررسی امضا (در process pool، بدون قفل کردن event loop) و ثبت کیف پول"""
+        user = update.effective_user
+        user_data = await self.load_user(user.id)
+        
+        if not user_data:
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
+            return
+        if not context.args:
+            await update.effective_message.reply_text("✍️ Send your signature: `/verify_wallet 0xSignature`",
+                                                      parse_mode='Markdown')
+            return
+        
+        result = await wallet_manager.connect_wallet(user_data['id'], user.id, context.args[0])
+        if not result['success']:
+            await update.effective_message.reply_text(
+                f"❌ {result['error']}\nStart again with `/connect_wallet 0xYourWalletAddress`.", parse_mode='Markdown')
+            return
+        await update.effective_message.reply_text(f"✅ Wallet connected: `{result['wallet_address']}`",
+                                                  parse_mode='Markdown')
+    
+    async def invite_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """سیستم دعوت دوستان"""
         user = update.effective_user
-        user_data = db.get_user_by_telegram_id(user.id)
+        user_data = await self.load_user(user.id)
         
         if not user_data:
-            await update.message.reply_text("❌ User not found. Please use /start first.")
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
             return
         
-        referral_stats = db.get_referral_stats(user_data['id'])
-        referral_code = user_data['referral_code']
+        referral_stats = await self.load_referral_stats(user_data['id'])
+        invite_text = templates.INVITE.render(referral_code=user_data['referral_code'], **referral_stats)
         
-        invite_text = f"""
-👥 **Invite Friends & Earn**
-
-Invite your friends to join LastForEnd and earn bonus tokens!
-
-🔗 **Your Referral Link:**
-`https://t.me/LastForEndBot?start={referral_code}`
-
-📊 **Your Referral Stats:**
-👥 Total Referrals: `{referral_stats['total_referrals']}`
-💰 Total Earned: `{referral_stats['total_earned']} LFE`
-
-🎁 **Rewards:**
-• 25 LFE for each successful referral
-• 10% of your friend's earnings
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("📤 Share Link", callback_data="share_link")],
-            [InlineKeyboardButton("📊 Referral Stats", callback_data="referral_stats")],
-            [InlineKeyboardButton("🏆 Leaderboard", callback_data="leaderboard")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(invite_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await update.effective_message.reply_text(invite_text, reply_markup=templates.INVITE_KEYBOARD,
+                                                  parse_mode='Markdown')
     
     async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """پروفایل کاربر"""
         user = update.effective_user
-        user_data = db.get_user_by_telegram_id(user.id)
+        user_data = await self.load_user(user.id)
         
         if not user_data:
-            await update.message.reply_text("❌ User not found. Please use /start first.")
+            await update.effective_message.reply_text("❌ User not found. Please use /start first.")
             return
         
-        referral_stats = db.get_referral_stats(user_data['id'])
-        
-        profile_text = f"""
-👤 **Your Profile**
-
-🆔 **User ID:** `{user.id}`
-📛 **Username:** @{user.username if user.username else 'N/A'}
-💰 **Total Balance:** `{user_data['total_tokens']} LFE`
-👥 **Referrals:** `{referral_stats['total_referrals']}`
-📊 **Tasks Completed:** `{user_data['completed_tasks_count']}`
-📅 **Member Since:** `{user_data['created_at'][:10]}`
-
-🌐 **API Key:** `{user_data['api_key']}`
-🔗 **Referral Code:** `{user_data['referral_code']}`
-        """
+        referral_stats = await self.load_referral_stats(user_data['id'])
         
-        keyboard = [
-            [InlineKeyboardButton("🔄 Refresh", callback_data="refresh_profile")],
-            [InlineKeyboardButton("📊 Transactions", callback_data="transactions")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        profile_text = templates.render_profile(user, user_data, referral_stats)
         
-        await update.message.reply_text(profile_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await update.effective_message.reply_text(profile_text, reply_markup=templates.PROFILE_KEYBOARD,
+                                                  parse_mode='Markdown')
     
-    async def leaderboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def leaderboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0):
         """لیدربرد بهترین referralها"""
-        leaderboard = db.get_referral_leaderboard(10)
-        
-        if not leaderboard:
-            await update.message.reply_text("📊 No leaderboard data available yet.")
+        page_size = 10
+        # لیدربرد در حافظه نگه داشته می‌شود و نیازی به کوئری ندارد
+        leaderboard = db.get_referral_leaderboard(page_size + 1, page * page_size)
+        has_next = len(leaderboard) > page_size
+        leaderboard = leaderboard[:page_size]
+        
+        if not leaderboard and page == 0:
+            await update.effective_message.reply_text("📊 No leaderboard data available yet.")
             return
         
-        leaderboard_text = "🏆 **Referral Leaderboard**\n\n"
-        
-        for i, user in enumerate(leaderboard, 1):
-            username = user['username'] or f"User{user['telegram_id']}"
-            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-            
-            leaderboard_text += f"{medal} **{username}**\n"
-            leaderboard_text += f"   👥 Referrals: `{user['referral_count']}` | 💰 Balance: `{user['total_tokens']} LFE`\n\n"
+        my_rank = db.get_leaderboard_rank(update.effective_user.id)
+        leaderboard_text = templates.render_leaderboard(leaderboard, my_rank)
+        reply_markup = templates.leaderboard_keyboard(page, has_next)
         
-        await update.message.reply_text(leaderboard_text, parse_mode='Markdown')
+        if update.callback_query and update.callback_query.data.startswith("leaderboard:"):
+            await update.callback_query.edit_message_text(leaderboard_text, reply_markup=reply_markup, parse_mode='Markdown')
+        else:
+            await update.effective_message.reply_text(leaderboard_text, reply_markup=reply_markup, parse_mode='Markdown')
     
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """مدیریت کلیک روی دکمه‌ها"""
@@ -254,6 +353,8 @@ Invite your friends to join LastForEnd and earn bonus tokens!
             await self.profile_command(update, context)
         elif data == "leaderboard":
             await self.leaderboard_command(update, context)
+        elif data.startswith("leaderboard:"):
+            await self.leaderboard_command(update, context, page=int(data.split(":", 1)[1]))
         elif data == "refresh_tasks":
             await query.edit_message_text("🔄 Refreshing tasks...")
             await self.tasks_command(update, context)
@@ -270,50 +371,78 @@ Invite your friends to join LastForEnd and earn bonus tokens!
                 "Or send your wallet address in this format:\n"
                 "`/connect_wallet 0xYourWalletAddress`"
             )
+        elif data == "withdraw":
+            await query.edit_message_text(templates.WITHDRAW_USAGE, parse_mode='Markdown')
         elif data == "transactions":
             await self.show_transactions(update, context)
+        elif data.startswith(("txo:", "txn:")):
+            prefix, tx_id, created_at = data.split(":", 2)
+            direction = "older" if prefix == "txo" else "newer"
+            await self.show_transactions(update, context, (created_at, int(tx_id)), direction)
         elif data == "share_link":
-            user_data = db.get_user_by_telegram_id(query.from_user.id)
+            user_data = await async_db.get_user_by_telegram_id(query.from_user.id)
             if user_data:
-                referral_link = f"https://t.me/LastForEndBot?start={user_data['referral_code']}"
-                await query.edit_message_text(
-                    f"📤 **Share this link with your friends:**\n\n"
-                    f"`{referral_link}`\n\n"
-                    f"Each friend who joins through this link earns you 25 LFE!"
-                )
+                await query.edit_message_text(templates.SHARE_LINK.render(referral_code=user_data['referral_code']))
     
-    async def show_transactions(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """نمایش تراکنش‌های کاربر"""
+    async def show_transactions(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                cursor: tuple = None, direction: str = "older"):
+        """نمایش تراکنش‌های کاربر (صفحه‌بندی cursor-based)"""
         query = update.callback_query
         user = query.from_user
-        user_data = db.get_user_by_telegram_id(user.id)
+        user_data = await async_db.get_user_by_telegram_id(user.id)
         
         if not user_data:
             await query.edit_message_text("❌ User not found.")
             return
         
-        transactions = db.get_user_transactions(user_data['id'], 10)
+        page = await async_db.get_transactions_page(user_data['id'], cursor, direction, 10)
+        transactions = page['transactions']
         
         if not transactions:
             await query.edit_message_text("📭 No transactions found.")
             return
         
-        transactions_text = "📊 **Recent Transactions**\n\n"
-        
-        for tx in transactions:
-            emoji = "🟢" if tx['amount'] > 0 else "🔴"
-            date = tx['created_at'][:16]
-            transactions_text += f"{emoji} **{tx['transaction_type'].replace('_', ' ').title()}**\n"
-            transactions_text += f"   Amount: `{tx['amount']} LFE`\n"
-            transactions_text += f"   Date: `{date}`\n"
-            transactions_text += f"   Desc: {tx['description']}\n\n"
-        
-        await query.edit_message_text(transactions_text, parse_mode='Markdown')
+        reply_markup = templates.transactions_keyboard(page['newer'], page['older'])
+        await self.send_pages(update, templates.render_transactions(transactions), reply_markup, edit=True)
+    
+    async def send_pages(self, update: Update, pages: list, reply_markup=None, edit: bool = False):
+        """ارسال متن چند صفحه‌ای؛ کیبورد فقط روی صفحه‌ی آخر"""
+        last = len(pages) - 1
+        for i, page_text in enumerate(pages):
+            markup = reply_markup if i == last else None
+            if edit and i == 0:
+                await update.callback_query.edit_message_text(page_text, reply_markup=markup, parse_mode='Markdown')
+            else:
+                await update.effective_message.reply_text(page_text, reply_markup=markup, parse_mode='Markdown')
+    
+    def create_webhook_server(self) -> WebhookServer:
+        """سرور webhook با pool محدود و ترتیب‌دار برای هر کاربر"""
+        return WebhookServer(
+            self.app,
+            secret_token=Config.WEBHOOK_SECRET,
+            path=Config.WEBHOOK_PATH,
+            workers=Config.UPDATE_WORKERS,
+            max_pending=Config.UPDATE_MAX_PENDING,
+            max_per_user=Config.UPDATE_MAX_PER_USER,
+            shed_watermark=Config.UPDATE_SHED_WATERMARK,
+            extra_stats=self.get_stats
+        )
     
     def run(self):
-        """اجرای ربات"""
+        """اجرای ربات (webhook اگر WEBHOOK_URL تنظیم شده باشد، وگرنه polling)"""
         print("🚀 LastForEnd Bot is running...")
-        self.app.run_polling()
+        if not Config.WEBHOOK_URL:
+            self.app.run_polling()
+            return
+        
+        server = self.create_webhook_server()
+        try:
+            asyncio.run(server.serve_forever(
+                Config.WEBHOOK_LISTEN, Config.WEBHOOK_PORT,
+                Config.WEBHOOK_URL, Config.WEBHOOK_MAX_CONNECTIONS
+            ))
+        except KeyboardInterrupt:
+            pass
 
 # اجرای ربات
 if __name__ == '__main__':
@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import Forbidden, RetryAfter
+
+from .config import Config
+from .database import DatabaseManager
+from .send_queue import BULK
+
+logger = logging.getLogger(__name__)
+
+
+class SendPacer:
+    """شکل‌دهی ارسال‌ها وقتی bot بدون SendScheduler ساخته شده: سقف هم‌زمانی و فاصله‌ی ثابت بین شروع ارسال‌ها"""
+
+    def __init__(self, rate: float, concurrency: int):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._next = 0.0
+
+    def pause(self, seconds: float):
+        """بعد از RetryAfter هیچ ارسالی تا پایان مهلت شروع نمی‌شود"""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.semaphore:
+            now = time.monotonic()
+            start = max(now, self._next)
+            # زمان شروع قبل از sleep رزرو می‌شود تا ارسال‌های هم‌زمان پشت سر هم قرار بگیرند
+            self._next = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+class BroadcastEngine:
+    """ارسال پیام همگانی و airdrop به همه‌ی کاربران با checkpoint برای ادامه بعد از crash
+
+    کاربران به ترتیب id در دسته‌های chunk_size خوانده می‌شوند (keyset، بدون OFFSET).
+    اعتبار هر دسته همراه با credited_through در یک تراکنش ثبت می‌شود، پس هیچ کاربری دو بار
+    airdrop نمی‌گیرد؛ اعلان‌ها حداقل یک بار ارسال می‌شوند (در crash حداکثر یک دسته تکرار می‌شود).
+    """
+
+    def __init__(self, manager: DatabaseManager):
+        self.manager = manager
+
+    def create_job(self, name: str, message: Optional[str], amount: int = 0) -> Optional[int]:
+        """ساخت job جدید؛ اگر job با همین نام وجود داشته باشد همان برگردانده می‌شود (resume)"""
+        def op(cursor):
+            cursor.execute('''
+                INSERT INTO broadcast_jobs (name, message, amount)
+                VALUES (?, ?, ?)
+                ON CONFLICT(name) DO NOTHING
+            ''', (name, message, amount))
+            cursor.execute('SELECT id FROM broadcast_jobs WHERE name = ?', (name,))
+            return cursor.fetchone()[0]
+
+        try:
+            return self.manager.run_write(op)
+        except Exception as e:
+            logger.error(f"Error creating broadcast job: {e}")
+            return None
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """وضعیت و checkpointهای یک job"""
+        with self.manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, name, message, amount, status, credited_through, notified_through,
+                       credited, notified, failed_notifications, created_at, completed_at
+                FROM broadcast_jobs WHERE id = ?
+            ''', (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            columns = [column[0] for column in cursor.description]
+            return dict(zip(columns, row))
+
+    def _fetch_chunk(self, after_id: int, limit: int) -> List[Tuple[int, int]]:
+        """دسته‌ی بعدی کاربران بعد از after_id (با index کلید اصلی)"""
+        with self.manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, telegram_id FROM users WHERE id > ? ORDER BY id LIMIT ?
+            ''', (after_id, limit))
+            return cursor.fetchall()
+
+    def _credit_chunk(self, job: Dict, chunk: List[Tuple[int, int]]) -> int:
+        """اعتبار airdrop برای کاربرانی از دسته که هنوز نگرفته‌اند؛ تعداد کاربران اعتبار گرفته"""
+        last_id = chunk[-1][0]
+        description = f"Airdrop: {job['name']}"
+
+        def op(cursor):
+            # checkpoint داخل همین تراکنش خوانده می‌شود تا دو اجرای هم‌زمان دوباره اعتبار ندهند
+            cursor.execute('SELECT credited_through FROM broadcast_jobs WHERE id = ?', (job['id'],))
+            credited_through = cursor.fetchone()[0]
+            user_ids = [user_id for user_id, _ in chunk if user_id > credited_through]
+            if not user_ids:
+                return []
+
+            cursor.executemany('''
+                UPDATE users SET total_tokens = total_tokens + ? WHERE id = ?
+            ''', [(job['amount'], user_id) for user_id in user_ids])
+            cursor.executemany('''
+                INSERT INTO transactions (user_id, transaction_type, amount, description)
+                VALUES (?, 'airdrop', ?, ?)
+            ''', [(user_id, job['amount'], description) for user_id in user_ids])
+            cursor.execute('''
+                UPDATE broadcast_jobs
+                SET credited_through = ?, credited = credited + ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (last_id, len(user_ids), job['id']))
+            return user_ids
+
+        user_ids = set(self.manager.run_write(op))
+        for user_id, telegram_id in chunk:
+            if user_id in user_ids:
+                self.manager.invalidate_user(telegram_id, user_id)
+        return len(user_ids)
+
+    def _checkpoint_notified(self, job_id: int, last_id: int, sent: int, failed: int):
+        self.manager.run_write(lambda cursor: cursor.execute('''
+            UPDATE broadcast_jobs
+            SET notified_through = MAX(notified_through, ?),
+                notified = notified + ?,
+                failed_notifications = failed_notifications + ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (last_id, sent, failed, job_id)))
+
+    def _set_status(self, job_id: int, status: str):
+        self.manager.run_write(lambda cursor: cursor.execute('''
+            UPDATE broadcast_jobs
+            SET status = ?, updated_at = CURRENT_TIMESTAMP,
+                completed_at = CASE WHEN ? = 'completed' THEN CURRENT_TIMESTAMP ELSE completed_at END
+            WHERE id = ?
+        ''', (status, status, job_id)))
+
+    async def _notify_chunk(self, bot, job: Dict, chunk: List[Tuple[int, int]], report: Dict,
+                            pacer: Optional[SendPacer] = None):
+        """ارسال اعلان به یک دسته با اولویت BULK (پاسخ‌های تعاملی ربات جلوتر می‌روند)
+
+        بدون rate_limiter روی bot (SEND_SCHEDULER_ENABLED=0) ارسال‌ها با pacer شکل داده می‌شوند؛
+        ExtBot بدون rate_limiter با rate_limit_args خطای ValueError می‌دهد.
+        """
+        kwargs = {"rate_limit_args": {"priority": BULK}} if pacer is None else {}
+
+        async def send(telegram_id):
+            for attempt in range(Config.SEND_MAX_RETRIES + 1):
+                try:
+                    if pacer is None:
+                        await bot.send_message(telegram_id, job['message'], **kwargs)
+                    else:
+                        async with pacer.slot():
+                            await bot.send_message(telegram_id, job['message'])
+                    return True
+                except RetryAfter as e:
+                    # SendScheduler خودش retry می‌کند؛ این‌جا فقط مسیر pacer به آن می‌رسد
+                    if pacer is None or attempt == Config.SEND_MAX_RETRIES:
+                        logger.error(f"Error sending broadcast to {telegram_id}: {e}")
+                        return False
+                    pacer.pause(e.retry_after + 0.1)
+                except Forbidden:
+                    # کاربر ربات را بلاک کرده است
+                    return False
+                except Exception as e:
+                    logger.error(f"Error sending broadcast to {telegram_id}: {e}")
+                    return False
+            return False
+
+        targets = [(user_id, telegram_id) for user_id, telegram_id in chunk if user_id > job['notified_through']]
+        results = await asyncio.gather(*(send(telegram_id) for _, telegram_id in targets))
+        sent = sum(results)
+        await asyncio.to_thread(self._checkpoint_notified, job['id'], chunk[-1][0], sent, len(results) - sent)
+        report['notified'] += sent
+        report['failed_notifications'] += len(results) - sent
+
+    async def run(self, job_id: int, bot=None, chunk_size: int = None) -> Dict:
+        """اجرای job از آخرین checkpoint؛ بدون bot فقط اعتبار airdrop ثبت می‌شود"""
+        chunk_size = chunk_size or Config.BROADCAST_CHUNK_SIZE
+        job = await asyncio.to_thread(self.get_job, job_id)
+        if job is None:
+            raise ValueError(f"Broadcast job {job_id} not found")
+
+        notify = bot is not None and bool(job['message'])
+        credit = job['amount'] > 0
+        after_id = job['credited_through'] if credit else job['notified_through']
+        if notify and credit:
+            after_id = min(after_id, job['notified_through'])
+
+        report = {'job_id': job_id, 'scanned': 0, 'credited': 0, 'notified': 0, 'failed_notifications': 0}
+        await asyncio.to_thread(self._set_status, job_id, 'running')
+        started = time.perf_counter()
+        notifying = None
+        pacer = None
+        if notify and getattr(bot, "rate_limiter", None) is None:
+            pacer = SendPacer(Config.SEND_GLOBAL_RATE, Config.BROADCAST_CONCURRENCY)
+
+        try:
+            while True:
+                chunk = await asyncio.to_thread(self._fetch_chunk, after_id, chunk_size)
+                if not chunk:
+                    break
+                after_id = chunk[-1][0]
+                report['scanned'] += len(chunk)
+
+                if credit and after_id > job['credited_through']:
+                    report['credited'] += await asyncio.to_thread(self._credit_chunk, job, chunk)
+
+                if notify:
+                    # اعلان‌های دسته‌ی قبلی هم‌زمان با خواندن و اعتبار دادن این دسته ارسال شده‌اند
+                    if notifying is not None:
+                        await notifying
+                    notifying = asyncio.create_task(self._notify_chunk(bot, job, chunk, report, pacer))
+                self._log_progress(report, started)
+
+            if notifying is not None:
+                await notifying
+        except BaseException:
+            if notifying is not None and not notifying.done():
+                notifying.cancel()
+            await asyncio.to_thread(self._set_status, job_id, 'interrupted')
+            raise
+
+        await asyncio.to_thread(self._set_status, job_id, 'completed')
+        if report['credited']:
+            # موجودی‌ها تغییر کرده است
+            await asyncio.to_thread(self.manager.rebuild_leaderboard)
+
+        report['elapsed'] = time.perf_counter() - started
+        report['users_per_sec'] = report['scanned'] / report['elapsed'] if report['elapsed'] else 0.0
+        self._log_progress(report, started)
+        return report
+
+    @staticmethod
+    def _log_progress(report: Dict, started: float):
+        elapsed = time.perf_counter() - started
+        rate = report['scanned'] / elapsed if elapsed else 0.0
+        logger.info(f"Broadcast job {report['job_id']}: scanned={report['scanned']} credited={report['credited']} "
+                    f"notified={report['notified']} failed={report['failed_notifications']} ({rate:.0f} users/sec)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from telegram.ext import ExtBot
+
+    from .send_queue import SendScheduler
+
+    parser = argparse.ArgumentParser(description="LastForEnd broadcast / airdrop")
+    parser.add_argument("--name", required=True, help="job name; re-running the same name resumes it")
+    parser.add_argument("--message", help="notification text (omit for a silent airdrop)")
+    parser.add_argument("--amount", type=int, default=0, help=f"{Config.TOKEN_SYMBOL} credited to every user")
+    parser.add_argument("--no-notify", action="store_true", help="only credit balances")
+    parser.add_argument("--chunk-size", type=int, default=Config.BROADCAST_CHUNK_SIZE)
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="database path")
+    parser.add_argument("--background", action="store_true",
+                        help="enqueue the job for the background workers (python -m src.job_queue)")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    async def main():
+        engine = BroadcastEngine(DatabaseManager(args.db))
+        job_id = engine.create_job(args.name, args.message, args.amount)
+        if job_id is None:
+            raise SystemExit(1)
+
+        if args.background:
+            from .job_queue import JobQueue
+
+            queue_id, created = JobQueue(engine.manager).enqueue(
+                "broadcast", {"job_id": job_id, "chunk_size": args.chunk_size, "notify": not args.no_notify},
+                dedup_key=f"broadcast:{job_id}")
+            print(f"{'✅ Enqueued' if created else '⏳ Already queued'} broadcast job {job_id} (queue job {queue_id})")
+            return
+
+        bot = None
+        if args.message and not args.no_notify:
+            bot = ExtBot(Config.BOT_TOKEN, rate_limiter=SendScheduler.from_config())
+            await bot.initialize()
+        try:
+            report = await engine.run(job_id, bot, args.chunk_size)
+        finally:
+            if bot is not None:
+                await bot.shutdown()
+        print(f"✅ Job {job_id} done: {report['scanned']} users in {report['elapsed']:.1f}s "
+              f"({report['users_per_sec']:.0f} users/sec), credited={report['credited']}, "
+              f"notified={report['notified']}, failed={report['failed_notifications']}")
+
+    asyncio.run(main())
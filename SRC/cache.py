@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """cache محدود LRU با TTL و آمار hit/miss/eviction"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled and maxsize > 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """خواندن از cache (مقدار منقضی شده miss حساب می‌شود)"""
+        if not self.enabled:
+            self.misses += 1
+            return default
+
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """ذخیره در cache و حذف قدیمی‌ترین آیتم در صورت پر بودن"""
+        if not self.enabled:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """حذف یک کلید از cache"""
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+                return True
+            return False
+
+    def clear(self):
+        """خالی کردن کامل cache"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        """آمار cache برای مانیتورینگ"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
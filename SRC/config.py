@@ -9,10 +9,140 @@ class Config:
     
     # تنظیمات دیتابیس
     DATABASE_PATH = "data/airdrop.db"
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    # بقیه‌ی PRAGMAها در connection_pool.DEFAULT_PRAGMAS
+    DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+    DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", DB_POOL_SIZE))
+    DB_EXECUTOR_MAX_PENDING = int(os.getenv("DB_EXECUTOR_MAX_PENDING", 256))
+    
+    # group commit برای نوشتن‌های ledger (پاداش‌ها و تغییر موجودی)
+    LEDGER_GROUP_COMMIT = os.getenv("LEDGER_GROUP_COMMIT", "0") == "1"
+    LEDGER_FLUSH_INTERVAL_MS = float(os.getenv("LEDGER_FLUSH_INTERVAL_MS", 5))
+    LEDGER_FLUSH_MAX_OPS = int(os.getenv("LEDGER_FLUSH_MAX_OPS", 256))
+    
+    # تنظیمات cache (برای دیباگ با USER_CACHE_ENABLED=0 خاموش می‌شود)
+    USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "1") == "1"
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 50000))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+    TASK_CATALOG_TTL = float(os.getenv("TASK_CATALOG_TTL", 300))
+    TASK_COMPLETIONS_CACHE_SIZE = int(os.getenv("TASK_COMPLETIONS_CACHE_SIZE", 50000))
+    TASK_COMPLETIONS_CACHE_TTL = float(os.getenv("TASK_COMPLETIONS_CACHE_TTL", 60))
+    # انتشار تغییر کاربران بین پروسه‌ها (ربات، API، worker، indexer)؛ 0 یعنی خاموش
+    USER_CHANGES_SYNC_INTERVAL = float(os.getenv("USER_CHANGES_SYNC_INTERVAL", 1))
+    USER_CHANGES_RETENTION = float(os.getenv("USER_CHANGES_RETENTION", 3600))
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 100000))
+    IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 3600))
     
     # تنظیمات API
     API_HOST = "0.0.0.0"
     API_PORT = 5000
+    API_CORS_ORIGIN = os.getenv("API_CORS_ORIGIN", "*")
+    API_KEEPALIVE_TIMEOUT = float(os.getenv("API_KEEPALIVE_TIMEOUT", 75))
+    # توکن مانیتورینگ برای /metrics (هدر Authorization: Bearer)؛ خالی یعنی /metrics خاموش است
+    API_METRICS_TOKEN = os.getenv("API_METRICS_TOKEN", "")
+    
+    # حالت webhook (اگر WEBHOOK_URL خالی باشد ربات با polling اجرا می‌شود)
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    # در حالت webhook الزامی است (هدر X-Telegram-Bot-Api-Secret-Token)
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+    BOT_CONNECTION_POOL_SIZE = int(os.getenv("BOT_CONNECTION_POOL_SIZE", 16))
+    UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 32))
+    UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", 10000))
+    UPDATE_MAX_PER_USER = int(os.getenv("UPDATE_MAX_PER_USER", 50))
+    UPDATE_SHED_WATERMARK = float(os.getenv("UPDATE_SHED_WATERMARK", 0.8))
+    
+    # صف ارسال پیام‌ها (محدودیت‌های flood تلگرام)
+    SEND_SCHEDULER_ENABLED = os.getenv("SEND_SCHEDULER_ENABLED", "1") == "1"
+    SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))
+    SEND_CHAT_INTERVAL = float(os.getenv("SEND_CHAT_INTERVAL", 1.0))
+    SEND_GROUP_INTERVAL = float(os.getenv("SEND_GROUP_INTERVAL", 3.0))
+    SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", 3))
+    SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 3))
+    SEND_MAX_BULK_PENDING = int(os.getenv("SEND_MAX_BULK_PENDING", 1000))
+    BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", 500))
+    # فقط وقتی bot بدون SendScheduler ساخته شده (SEND_SCHEDULER_ENABLED=0)؛ سرعت همان SEND_GLOBAL_RATE است
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 8))
+    
+    # صف کارهای پس‌زمینه (بررسی ماموریت‌ها، برداشت، broadcast)
+    JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", 2))
+    JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", 16))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+    JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", 2))
+    JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", 300))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.05))
+    
+    # کانال و حساب‌هایی که ماموریت‌های اجتماعی بررسی می‌کنند
+    TELEGRAM_CHANNEL = os.getenv("TELEGRAM_CHANNEL", "@LastForEnd")
+    ANNOUNCEMENT_CHANNEL = os.getenv("ANNOUNCEMENT_CHANNEL", "@LastForEndNews")
+    TWITTER_USERNAME = os.getenv("TWITTER_USERNAME", "LastForEnd")
+    
+    # بررسی عضویت کانال با getChatMember (نتیجه‌ی منفی کوتاه‌تر cache می‌شود تا عضویت جدید زود دیده شود)
+    MEMBERSHIP_POSITIVE_TTL = float(os.getenv("MEMBERSHIP_POSITIVE_TTL", 3600))
+    MEMBERSHIP_NEGATIVE_TTL = float(os.getenv("MEMBERSHIP_NEGATIVE_TTL", 30))
+    MEMBERSHIP_CONCURRENCY = int(os.getenv("MEMBERSHIP_CONCURRENCY", 10))
+    MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", 100000))
+    MEMBERSHIP_SWEEP_INTERVAL = float(os.getenv("MEMBERSHIP_SWEEP_INTERVAL", 300))
+    MEMBERSHIP_SWEEP_BATCH = int(os.getenv("MEMBERSHIP_SWEEP_BATCH", 500))
+    MEMBERSHIP_REFRESH_RATIO = float(os.getenv("MEMBERSHIP_REFRESH_RATIO", 0.8))
+    
+    # اتصال کیف پول با امضای EIP-191 (بازیابی امضا در process pool انجام می‌شود)
+    WALLET_NONCE_TTL = float(os.getenv("WALLET_NONCE_TTL", 600))
+    SIGNATURE_WORKERS = int(os.getenv("SIGNATURE_WORKERS", os.cpu_count() or 1))
+    SIGNATURE_BATCH_CHUNK = int(os.getenv("SIGNATURE_BATCH_CHUNK", 64))
+    ADDRESS_CACHE_SIZE = int(os.getenv("ADDRESS_CACHE_SIZE", 10000))
+    
+    # شبکه و قراردادهای LFE (SRC/contracts)
+    WEB3_PROVIDER_URI = os.getenv("WEB3_PROVIDER_URI", "")
+    WEB3_REQUEST_TIMEOUT = float(os.getenv("WEB3_REQUEST_TIMEOUT", 10))
+    LFE_TOKEN_ADDRESS = os.getenv("LFE_TOKEN_ADDRESS", "")
+    DISPERSE_ADDRESS = os.getenv("DISPERSE_ADDRESS", "")
+    HOT_WALLET_PRIVATE_KEY = os.getenv("HOT_WALLET_PRIVATE_KEY", "")
+    USDT_TOKEN_ADDRESS = os.getenv("USDT_TOKEN_ADDRESS", "")
+    USDT_DECIMALS = int(os.getenv("USDT_DECIMALS", 6))
+    BALANCE_CHECKER_ADDRESS = os.getenv("BALANCE_CHECKER_ADDRESS", "")
+    
+    # موجودی روی زنجیره برای /wallet (JSON-RPC batch، cache تا بلاک بعدی)
+    RPC_MAX_BATCH = int(os.getenv("RPC_MAX_BATCH", 100))
+    RPC_CONNECTIONS = int(os.getenv("RPC_CONNECTIONS", 20))
+    BALANCE_BATCH_WINDOW = float(os.getenv("BALANCE_BATCH_WINDOW", 0.01))
+    BALANCE_MAX_BATCH = int(os.getenv("BALANCE_MAX_BATCH", 200))
+    BALANCE_HEAD_TTL = float(os.getenv("BALANCE_HEAD_TTL", 2))
+    BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", 50000))
+    BALANCE_LOOKUP_TIMEOUT = float(os.getenv("BALANCE_LOOKUP_TIMEOUT", 3))
+    
+    # واریزهای LFE به DEPOSIT_ADDRESS از روی رویدادهای Transfer (python -m src.event_indexer)
+    DEPOSIT_ADDRESS = os.getenv("DEPOSIT_ADDRESS", "")
+    INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", 0))
+    INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", 12))
+    INDEXER_BLOCK_RANGE = int(os.getenv("INDEXER_BLOCK_RANGE", 1000))
+    INDEXER_MAX_BLOCK_RANGE = int(os.getenv("INDEXER_MAX_BLOCK_RANGE", 10000))
+    INDEXER_TARGET_LOGS = int(os.getenv("INDEXER_TARGET_LOGS", 2000))
+    INDEXER_POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", 6))
+    
+    # برداشت‌ها در یک تراکنش Disperse دسته‌بندی می‌شوند (python -m src.withdrawals)
+    WITHDRAWAL_MIN_AMOUNT = int(os.getenv("WITHDRAWAL_MIN_AMOUNT", 10))
+    WITHDRAWAL_BATCH_SIZE = int(os.getenv("WITHDRAWAL_BATCH_SIZE", 200))
+    WITHDRAWAL_BATCH_INTERVAL = float(os.getenv("WITHDRAWAL_BATCH_INTERVAL", 60))
+    WITHDRAWAL_POLL_INTERVAL = float(os.getenv("WITHDRAWAL_POLL_INTERVAL", 5))
+    WITHDRAWAL_CONFIRMATIONS = int(os.getenv("WITHDRAWAL_CONFIRMATIONS", 3))
+    WITHDRAWAL_REBROADCAST_AFTER = float(os.getenv("WITHDRAWAL_REBROADCAST_AFTER", 120))
+    # دسته‌ای که این مدت بعد از امضا mine نشده با همان nonce و کارمزد بیشتر دوباره امضا می‌شود
+    WITHDRAWAL_FEE_BUMP_AFTER = float(os.getenv("WITHDRAWAL_FEE_BUMP_AFTER", 600))
+    WITHDRAWAL_FEE_BUMP = float(os.getenv("WITHDRAWAL_FEE_BUMP", 1.125))
+    WITHDRAWAL_MAX_FEE_GWEI = float(os.getenv("WITHDRAWAL_MAX_FEE_GWEI", 500))
+    
+    # rate limit برای هر کاربر و دستور (token bucket)
+    RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", 1))
+    RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 5))
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+    REFRESH_RATE = float(os.getenv("REFRESH_RATE", 0.2))
+    REFRESH_BURST = int(os.getenv("REFRESH_BURST", 2))
     
     # تنظیمات توکن
     TOKEN_NAME = "LFE"
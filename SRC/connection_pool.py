@@ -0,0 +1,156 @@
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAهای پیش‌فرض که یک بار روی هر اتصال اعمال می‌شوند
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,  # حدود 16MB page cache برای هر اتصال
+    "mmap_size": 134217728,
+    "busy_timeout": 5000,
+}
+
+
+class PoolTimeout(Exception):
+    """خطای تمام شدن زمان انتظار برای اتصال آزاد"""
+
+
+class ConnectionPool:
+    def __init__(self, db_path: str, size: int = 8, timeout: float = 30.0,
+                 pragmas: Optional[Dict] = None):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+
+        self._idle = deque()
+        self._created = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+
+        # شمارنده‌ها برای مانیتورینگ
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """ایجاد اتصال جدید و اعمال PRAGMAها"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """گرفتن اتصال از pool (اتصال هر thread دوباره استفاده می‌شود)"""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            with self._cond:
+                self.hits += 1
+            return held
+
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("Connection pool is closed")
+
+            started = None
+            while not self._idle and self._created >= self.size:
+                if started is None:
+                    started = time.monotonic()
+                    self.waits += 1
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._created >= self.size:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No free connection after {self.timeout}s")
+            if started is not None:
+                self.wait_time += time.monotonic() - started
+
+            if self._idle:
+                conn = self._idle.pop()
+                self.hits += 1
+            else:
+                self._created += 1
+                self.misses += 1
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """برگرداندن اتصال به pool"""
+        if getattr(self._local, "conn", None) is not conn:
+            raise ValueError("Connection is not held by this thread")
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+
+        self._local.conn = None
+        if conn.in_transaction:
+            # تراکنش نیمه‌کاره نباید به درخواست بعدی منتقل شود
+            conn.rollback()
+
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._created -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """context manager برای گرفتن و آزاد کردن اتصال"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """بستن همه اتصال‌های آزاد"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """آمار pool برای مانیتورینگ"""
+        with self._cond:
+            idle = len(self._idle)
+            created = self._created
+            return {
+                "size": self.size,
+                "open": created,
+                "idle": idle,
+                "in_use": created - idle,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 6),
+                "timeouts": self.timeouts,
+            }
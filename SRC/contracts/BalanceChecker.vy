@@ -0,0 +1,25 @@
+# @version 0.3.10
+"""
+@title BalanceChecker
+@notice Reads ETH and ERC-20 balances of many owners in one eth_call.
+@dev An empty token address stands for the native ETH balance. Results are ordered
+     owner by owner, one value per token.
+"""
+from vyper.interfaces import ERC20
+
+MAX_OWNERS: constant(uint256) = 200
+MAX_TOKENS: constant(uint256) = 4
+
+
+@view
+@external
+def balances(_owners: DynArray[address, MAX_OWNERS],
+             _tokens: DynArray[address, MAX_TOKENS]) -> DynArray[uint256, 800]:
+    result: DynArray[uint256, 800] = []
+    for owner in _owners:
+        for token in _tokens:
+            if token == empty(address):
+                result.append(owner.balance)
+            else:
+                result.append(ERC20(token).balanceOf(owner))
+    return result
@@ -0,0 +1,25 @@
+# @version 0.3.10
+"""
+@title Disperse
+@notice Pays many token withdrawals in one transaction (multisend).
+@dev The sender approves this contract once; each call pulls the batch total with a
+     single transferFrom and then transfers to every recipient, so the allowance is
+     written once per batch instead of once per recipient.
+"""
+from vyper.interfaces import ERC20
+
+MAX_RECIPIENTS: constant(uint256) = 500
+
+
+@external
+def disperseToken(_token: address, _recipients: DynArray[address, MAX_RECIPIENTS],
+                  _values: DynArray[uint256, MAX_RECIPIENTS]):
+    assert len(_recipients) == len(_values), "length mismatch"
+    total: uint256 = 0
+    for value in _values:
+        total += value
+    assert ERC20(_token).transferFrom(msg.sender, self, total, default_return_value=True)
+    for i in range(MAX_RECIPIENTS):
+        if i >= len(_recipients):
+            break
+        assert ERC20(_token).transfer(_recipients[i], _values[i], default_return_value=True)
@@ -0,0 +1,60 @@
+# @version 0.3.10
+"""
+@title LFE Token
+@notice Minimal ERC-20 used for the LastForEnd airdrop; the whole supply is minted to the deployer.
+"""
+from vyper.interfaces import ERC20
+
+implements: ERC20
+
+event Transfer:
+    sender: indexed(address)
+    receiver: indexed(address)
+    value: uint256
+
+event Approval:
+    owner: indexed(address)
+    spender: indexed(address)
+    value: uint256
+
+name: public(String[32])
+symbol: public(String[8])
+decimals: public(uint8)
+totalSupply: public(uint256)
+balanceOf: public(HashMap[address, uint256])
+allowance: public(HashMap[address, HashMap[address, uint256]])
+
+
+@external
+def __init__(_name: String[32], _symbol: String[8], _decimals: uint8, _supply: uint256):
+    self.name = _name
+    self.symbol = _symbol
+    self.decimals = _decimals
+    self.totalSupply = _supply
+    self.balanceOf[msg.sender] = _supply
+    log Transfer(empty(address), msg.sender, _supply)
+
+
+@external
+def transfer(_to: address, _value: uint256) -> bool:
+    self.balanceOf[msg.sender] -= _value
+    self.balanceOf[_to] += _value
+    log Transfer(msg.sender, _to, _value)
+    return True
+
+
+@external
+def transferFrom(_from: address, _to: address, _value: uint256) -> bool:
+    if self.allowance[_from][msg.sender] != max_value(uint256):
+        self.allowance[_from][msg.sender] -= _value
+    self.balanceOf[_from] -= _value
+    self.balanceOf[_to] += _value
+    log Transfer(_from, _to, _value)
+    return True
+
+
+@external
+def approve(_spender: address, _value: uint256) -> bool:
+    self.allowance[msg.sender][_spender] = _value
+    log Approval(msg.sender, _spender, _value)
+    return True
@@ -0,0 +1,40 @@
+"""
+قراردادهای LFE روی زنجیره
+
+سورس‌ها Vyper هستند و خروجی کامپایل (abi و bytecode) در build/ نگه داشته می‌شود:
+
+    vyper -f abi,bytecode Disperse.vy
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict
+
+from web3 import Web3
+
+from ..config import Config
+
+BUILD_DIR = os.path.join(os.path.dirname(__file__), "build")
+
+
+@lru_cache(maxsize=None)
+def load_artifact(name: str) -> Dict:
+    """abi و bytecode قرارداد از build/<name>.json"""
+    with open(os.path.join(BUILD_DIR, f"{name}.json")) as f:
+        return json.load(f)
+
+
+def connect(provider_uri: str = None) -> Web3:
+    """اتصال HTTP به node (WEB3_PROVIDER_URI)"""
+    uri = provider_uri or Config.WEB3_PROVIDER_URI
+    if not uri:
+        raise RuntimeError("WEB3_PROVIDER_URI is not configured")
+    return Web3(Web3.HTTPProvider(uri, request_kwargs={"timeout": Config.WEB3_REQUEST_TIMEOUT}))
+
+
+def get_contract(w3: Web3, name: str, address: str = None):
+    """نمونه‌ی قرارداد؛ بدون address فقط برای deploy قابل استفاده است"""
+    artifact = load_artifact(name)
+    if address is None:
+        return w3.eth.contract(abi=artifact["abi"], bytecode=artifact["bytecode"])
+    return w3.eth.contract(address=Web3.to_checksum_address(address), abi=artifact["abi"])
@@ -1,427 +1,1065 @@
+import hashlib
+import json
 import sqlite3
 import logging
+import time
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cache import LRUCache
+from .config import Config
+from .connection_pool import DEFAULT_PRAGMAS, ConnectionPool
+from .leaderboard import ReferralLeaderboard
+from .ledger import LedgerWriter
+from .migrations import check_query_plans, get_schema_version, run_migrations
+from .models import TRANSACTION_COLUMNS, Transaction, TransactionStatus
+from .task_catalog import TaskCatalogCache
+from .user_changes import UserChangeFeed
 
 logger = logging.getLogger(__name__)
 
+# ستون‌های SELECT و INSERT از همان TRANSACTION_COLUMNS ساخته می‌شوند تا با from_row/to_row هم‌ترتیب بمانند
+TRANSACTION_SELECT = ", ".join(TRANSACTION_COLUMNS)
+_INSERT_COLUMNS = [column for column in TRANSACTION_COLUMNS if column not in ("id", "created_at")]
+TRANSACTION_INSERT = (f'INSERT INTO transactions ({", ".join(_INSERT_COLUMNS)}) '
+                      f'VALUES ({", ".join("?" * len(_INSERT_COLUMNS))})')
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "data/airdrop.db"):
+    def __init__(self, db_path: str = "data/airdrop.db", pool_size: int = None):
         self.db_path = db_path
+        self.pool = ConnectionPool(
+            db_path,
+            size=pool_size or Config.DB_POOL_SIZE,
+            timeout=Config.DB_POOL_TIMEOUT,
+            pragmas={**DEFAULT_PRAGMAS, "synchronous": Config.DB_SYNCHRONOUS}
+        )
+        self.ledger = LedgerWriter(
+            self.pool,
+            flush_interval_ms=Config.LEDGER_FLUSH_INTERVAL_MS,
+            max_batch=Config.LEDGER_FLUSH_MAX_OPS
+        ) if Config.LEDGER_GROUP_COMMIT else None
+        self.leaderboard = ReferralLeaderboard()
+        self.user_cache = LRUCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL, Config.USER_CACHE_ENABLED)
+        self.referral_stats_cache = LRUCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL, Config.USER_CACHE_ENABLED)
+        # api_key هیچ‌وقت تغییر نمی‌کند؛ TTL فقط برای محدود کردن حافظه است
+        self.api_key_cache = LRUCache(Config.USER_CACHE_SIZE, 3600, Config.USER_CACHE_ENABLED)
+        self.idempotency_cache = LRUCache(Config.IDEMPOTENCY_CACHE_SIZE, Config.IDEMPOTENCY_TTL)
+        self.task_catalog = TaskCatalogCache(
+            catalog_ttl=Config.TASK_CATALOG_TTL,
+            completions_size=Config.TASK_COMPLETIONS_CACHE_SIZE,
+            completions_ttl=Config.TASK_COMPLETIONS_CACHE_TTL,
+            enabled=Config.USER_CACHE_ENABLED
+        )
         self.init_database()
+        self.rebuild_leaderboard()
+        self.changes = UserChangeFeed(
+            self.pool,
+            self.apply_user_changes,
+            interval=Config.USER_CHANGES_SYNC_INTERVAL,
+            retention=Config.USER_CHANGES_RETENTION
+        ) if Config.USER_CHANGES_SYNC_INTERVAL > 0 else None
     
     def get_connection(self):
-        """ایجاد اتصال به دیتابیس"""
-        return sqlite3.connect(self.db_path)
+        """گرفتن اتصال از connection pool (به صورت context manager)"""
+        return self.pool.connection()
     
-    def init_database(self):
-        """ایجاد جداول دیتابیس"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def run_write(self, op: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """اجرای عملیات نوشتنی؛ در حالت group commit از طریق LedgerWriter وگرنه در یک تراکنش BEGIN IMMEDIATE"""
+        if self.ledger is not None:
+            return self.ledger.execute(op)
         
-        try:
-            # جدول کاربران
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER UNIQUE,
-                    username TEXT,
-                    referral_code TEXT UNIQUE,
-                    invited_by INTEGER,
-                    wallet_address TEXT,
-                    total_tokens INTEGER DEFAULT 0,
-                    is_verified BOOLEAN DEFAULT FALSE,
-                    api_key TEXT UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # جدول ماموریت‌ها
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT,
-                    description TEXT,
-                    reward_tokens INTEGER,
-                    task_type TEXT,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # جدول ماموریت‌های انجام شده
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS completed_tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    task_id INTEGER,
-                    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (task_id) REFERENCES tasks (id),
-                    UNIQUE(user_id, task_id)
-                )
-            ''')
-            
-            # جدول دعوت‌ها
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS referrals (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    inviter_id INTEGER,
-                    invited_id INTEGER,
-                    tokens_earned INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (inviter_id) REFERENCES users (id),
-                    FOREIGN KEY (invited_id) REFERENCES users (id),
-                    UNIQUE(invited_id)
-                )
-            ''')
-            
-            # جدول تراکنش‌ها
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    transaction_type TEXT, -- 'task_reward', 'referral_bonus', 'withdrawal'
-                    amount INTEGER,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-            
-            # اضافه کردن ماموریت‌های پیش‌فرض
-            self._add_default_tasks(cursor)
-            
-            conn.commit()
-            logger.info("Database initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Error initializing database: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
-    
-    def _add_default_tasks(self, cursor):
-        """اضافه کردن ماموریت‌های پیش‌فرض"""
-        default_tasks = [
-            ("Join Telegram Channel", "Join our official Telegram channel", 50, "social"),
-            ("Follow Twitter", "Follow our Twitter account", 30, "social"),
-            ("Retweet Post", "Retweet our latest post", 20, "social"),
-            ("Invite 1 Friend", "Invite one friend to join", 25, "referral"),
-            ("Invite 5 Friends", "Invite five friends to join", 150, "referral"),
-            ("Join Announcement Channel", "Join our announcement channel", 40, "social")
-        ]
-        
-        cursor.executemany('''
-            INSERT OR IGNORE INTO tasks (name, description, reward_tokens, task_type)
-            VALUES (?, ?, ?, ?)
-        ''', default_tasks)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = op(cursor)
+                conn.commit()
+                return result
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def get_ledger_stats(self) -> Optional[Dict]:
+        """آمار group commit (None اگر غیرفعال باشد)"""
+        return self.ledger.stats() if self.ledger is not None else None
+    
+    def get_pool_stats(self) -> Dict:
+        """آمار connection pool"""
+        return self.pool.stats()
+    
+    def get_cache_stats(self) -> Dict:
+        """آمار cacheهای پروفایل کاربر"""
+        return {
+            'users': self.user_cache.stats(),
+            'referral_stats': self.referral_stats_cache.stats(),
+            'api_keys': self.api_key_cache.stats(),
+            'tasks': self.task_catalog.stats(),
+            'changes': self.changes.stats() if self.changes is not None else None
+        }
+    
+    def invalidate_user(self, telegram_id: int = None, user_id: int = None):
+        """حذف داده‌های cache شده‌ی کاربر بعد از هر تغییر (در این پروسه و با user_changes در بقیه)"""
+        if telegram_id is not None:
+            self.user_cache.invalidate(telegram_id)
+        if user_id is not None:
+            self.referral_stats_cache.invalidate(user_id)
+        if self.changes is not None:
+            self.changes.publish(telegram_id, user_id)
+    
+    def apply_user_changes(self, changes: List[Tuple[Optional[int], Optional[int]]]):
+        """تغییرهای پروسه‌های دیگر: حذف cacheهای کاربر و بروزرسانی لیدربرد از دیتابیس"""
+        telegram_ids = list({telegram_id for telegram_id, _ in changes if telegram_id is not None})
+        user_ids = list({user_id for _, user_id in changes if user_id is not None})
+        rows = []
+        with self.get_connection() as conn:
+            for column, values in (('telegram_id', telegram_ids), ('id', user_ids)):
+                for i in range(0, len(values), 500):
+                    chunk = values[i:i + 500]
+                    rows += conn.execute(f'''
+                        SELECT id, username, telegram_id, referral_count, total_tokens FROM users
+                        WHERE {column} IN ({",".join("?" * len(chunk))})
+                    ''', chunk).fetchall()
+        for user_id, username, telegram_id, referral_count, total_tokens in rows:
+            self.user_cache.invalidate(telegram_id)
+            self.referral_stats_cache.invalidate(user_id)
+            self.task_catalog.completions.invalidate(user_id)
+            self.leaderboard.update(user_id, username, telegram_id, referral_count, total_tokens)
+    
+    def close(self):
+        """flush کردن ledger و بستن اتصال‌های pool"""
+        if self.changes is not None:
+            self.changes.close()
+        if self.ledger is not None:
+            self.ledger.close()
+        self.pool.close_all()
+    
+    def init_database(self):
+        """اجرای migrationهای دیتابیس"""
+        with self.get_connection() as conn:
+            try:
+                version = run_migrations(conn)
+                logger.info(f"Database initialized successfully (schema v{version})")
+                
+            except Exception as e:
+                logger.error(f"Error initializing database: {e}")
+    
+    def get_schema_version(self) -> int:
+        """نسخه schema دیتابیس"""
+        with self.get_connection() as conn:
+            return get_schema_version(conn)
+    
+    def check_query_plans(self) -> List[str]:
+        """بررسی اینکه کوئری‌های پرتکرار از ایندکس استفاده می‌کنند"""
+        with self.get_connection() as conn:
+            return check_query_plans(conn)
     
     # ===== USER MANAGEMENT =====
     
     def register_user(self, telegram_id: int, username: str, invited_by: int = None) -> Optional[int]:
-        """ثبت کاربر جدید"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        """ثبت کاربر جدید و پاداش referral در یک تراکنش"""
         try:
+            # /start تکراری رایج‌ترین حالت است و نیازی به قفل نوشتن ندارد
+            with self.get_connection() as conn:
+                existing = conn.execute('SELECT id FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
+            if existing:
+                return existing[0]
+            
             referral_code = f"LFE{telegram_id}"
             api_key = f"LFE_API_{telegram_id}_{datetime.now().strftime('%Y%m%d')}"
             
-            cursor.execute('''
-                INSERT OR IGNORE INTO users 
-                (telegram_id, username, referral_code, invited_by, api_key)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (telegram_id, username, referral_code, invited_by, api_key))
-            
-            conn.commit()
+            def op(cursor):
+                cursor.execute('''
+                    INSERT INTO users 
+                    (telegram_id, username, referral_code, invited_by, api_key)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
+                    RETURNING id
+                ''', (telegram_id, username, referral_code, invited_by, api_key))
+                inserted = cursor.fetchone()
+                if inserted is None:
+                    return None, None
+                
+                # اگر کاربر توسط referral آمده باشد
+                inviter = None
+                if invited_by and invited_by != inserted[0]:
+                    inviter = self._handle_referral_bonus(cursor, invited_by, inserted[0])
+                return inserted[0], inviter
             
-            # اگر کاربر توسط referral آمده باشد
-            if invited_by:
-                self._handle_referral_bonus(invited_by, telegram_id)
+            user_id, inviter = self.run_write(op)
             
-            cursor.execute('SELECT id FROM users WHERE telegram_id = ?', (telegram_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+            if user_id is None:
+                # همزمان توسط درخواست دیگری ثبت شده؛ referral دوباره پرداخت نمی‌شود
+                with self.get_connection() as conn:
+                    result = conn.execute('SELECT id FROM users WHERE telegram_id = ?', (telegram_id,)).fetchone()
+                return result[0] if result else None
             
+            if invited_by:
+                self._after_referral(invited_by, inviter)
+            return user_id
+        
         except Exception as e:
             logger.error(f"Error registering user: {e}")
             return None
-        finally:
-            conn.close()
     
-    def _handle_referral_bonus(self, inviter_id: int, invited_id: int):
-        """پرداخت پاداش referral"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def bulk_register_users(self, users: Iterable[Tuple], award_referral_bonus: bool = False,
+                            chunk_size: int = 500) -> Dict:
+        """ثبت گروهی کاربران (import از کمپین‌های دیگر)؛ users شامل (telegram_id, username, inviter_telegram_id)"""
+        report = {'inserted': 0, 'skipped': 0, 'referrals': 0}
+        chunk = []
         
-        try:
-            # ثبت referral
-            cursor.execute('''
-                INSERT INTO referrals (inviter_id, invited_id)
-                VALUES (?, ?)
-            ''', (inviter_id, invited_id))
-            
-            # اضافه کردن پاداش به inviter
-            referral_bonus = 25
-            cursor.execute('''
-                UPDATE users 
-                SET total_tokens = total_tokens + ? 
-                WHERE id = ?
-            ''', (referral_bonus, inviter_id))
-            
-            # ثبت تراکنش
-            cursor.execute('''
-                INSERT INTO transactions (user_id, transaction_type, amount, description)
-                VALUES (?, 'referral_bonus', ?, 'Referral bonus for inviting friend')
-            ''', (inviter_id, referral_bonus))
-            
-            conn.commit()
+        for user in users:
+            chunk.append(user)
+            if len(chunk) >= chunk_size:
+                self._bulk_register_chunk(chunk, award_referral_bonus, report)
+                chunk = []
+        if chunk:
+            self._bulk_register_chunk(chunk, award_referral_bonus, report)
+        
+        # شمارنده‌ها و موجودی inviterها تغییر کرده است
+        self.user_cache.clear()
+        self.referral_stats_cache.clear()
+        self.rebuild_leaderboard()
+        return report
+    
+    def _bulk_register_chunk(self, chunk: List[Tuple], award_referral_bonus: bool, report: Dict):
+        """ثبت یک دسته از کاربران در یک تراکنش"""
+        today = datetime.now().strftime('%Y%m%d')
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                telegram_ids = [user[0] for user in chunk]
+                placeholders = ','.join('?' * len(telegram_ids))
+                cursor.execute(f'SELECT telegram_id FROM users WHERE telegram_id IN ({placeholders})', telegram_ids)
+                existing = {row[0] for row in cursor}
+                
+                new_users = []
+                for telegram_id, username, inviter_telegram_id in chunk:
+                    if telegram_id in existing:
+                        continue
+                    existing.add(telegram_id)
+                    new_users.append((telegram_id, username, inviter_telegram_id))
+                
+                cursor.executemany('''
+                    INSERT INTO users (telegram_id, username, referral_code, api_key)
+                    VALUES (?, ?, ?, ?)
+                ''', [(telegram_id, username, f"LFE{telegram_id}", f"LFE_API_{telegram_id}_{today}")
+                      for telegram_id, username, _ in new_users])
+                
+                # نگاشت telegram_id به id برای کاربران جدید و inviterها
+                lookup = list({t for user in new_users for t in (user[0], user[2]) if t})
+                ids = {}
+                for start in range(0, len(lookup), 900):
+                    part = lookup[start:start + 900]
+                    cursor.execute(f'''
+                        SELECT telegram_id, id FROM users
+                        WHERE telegram_id IN ({','.join('?' * len(part))})
+                    ''', part)
+                    ids.update(cursor.fetchall())
+                
+                referrals = [(ids[inviter], ids[telegram_id]) for telegram_id, _, inviter in new_users
+                             if inviter and inviter in ids and inviter != telegram_id]
+                bonus = Config.REFERRAL_BONUS if award_referral_bonus else 0
+                
+                cursor.executemany('''
+                    UPDATE users SET invited_by = ? WHERE id = ?
+                ''', referrals)
+                cursor.executemany('''
+                    INSERT INTO referrals (inviter_id, invited_id, tokens_earned)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT DO NOTHING
+                ''', [(inviter_id, invited_id, bonus) for inviter_id, invited_id in referrals])
+                
+                per_inviter = {}
+                for inviter_id, _ in referrals:
+                    per_inviter[inviter_id] = per_inviter.get(inviter_id, 0) + 1
+                cursor.executemany('''
+                    UPDATE users
+                    SET referral_count = referral_count + ?,
+                        total_tokens = total_tokens + ?
+                    WHERE id = ?
+                ''', [(count, count * bonus, inviter_id) for inviter_id, count in per_inviter.items()])
+                
+                if bonus:
+                    cursor.executemany('''
+                        INSERT INTO transactions (user_id, transaction_type, amount, description, related_referral_id)
+                        VALUES (?, 'referral_bonus', ?, 'Referral bonus for inviting friend',
+                                (SELECT id FROM referrals WHERE invited_id = ?))
+                    ''', [(inviter_id, bonus, invited_id) for inviter_id, invited_id in referrals])
+                
+                conn.commit()
+                report['inserted'] += len(new_users)
+                report['skipped'] += len(chunk) - len(new_users)
+                report['referrals'] += len(referrals)
             
-        except Exception as e:
-            logger.error(f"Error handling referral bonus: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
+            except Exception as e:
+                logger.error(f"Error bulk registering users: {e}")
+                conn.rollback()
+                raise
+    
+    def _handle_referral_bonus(self, cursor: sqlite3.Cursor, inviter_id: int, invited_id: int) -> Optional[Tuple]:
+        """پرداخت پاداش referral داخل تراکنش ثبت‌نام (commit با فراخواننده است)"""
+        referral_bonus = Config.REFERRAL_BONUS
+        
+        # اضافه کردن پاداش به inviter (اگر inviter وجود نداشته باشد referral ثبت نمی‌شود)
+        cursor.execute('''
+            UPDATE users 
+            SET total_tokens = total_tokens + ?,
+                referral_count = referral_count + 1
+            WHERE id = ?
+            RETURNING username, telegram_id, referral_count, total_tokens
+        ''', (referral_bonus, inviter_id))
+        inviter = cursor.fetchone()
+        if inviter is None:
+            return None
+        
+        # ثبت referral
+        cursor.execute('''
+            INSERT INTO referrals (inviter_id, invited_id, tokens_earned)
+            VALUES (?, ?, ?)
+        ''', (inviter_id, invited_id, referral_bonus))
+        
+        # ثبت تراکنش
+        cursor.execute('''
+            INSERT INTO transactions (user_id, transaction_type, amount, description, related_referral_id)
+            VALUES (?, 'referral_bonus', ?, 'Referral bonus for inviting friend', ?)
+        ''', (inviter_id, referral_bonus, cursor.lastrowid))
+        
+        return inviter
+    
+    def _after_referral(self, inviter_id: int, inviter: Optional[Tuple]):
+        """بروزرسانی cache و لیدربرد بعد از commit شدن referral"""
+        self.invalidate_user(inviter[1] if inviter else None, inviter_id)
+        if inviter:
+            self.leaderboard.update(inviter_id, *inviter)
     
     def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict]:
-        """دریافت اطلاعات کاربر"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """دریافت اطلاعات کاربر (read-through cache)"""
+        cached = self.user_cache.get(telegram_id)
+        if cached is not None:
+            return dict(cached)
         
-        try:
-            cursor.execute('''
-                SELECT u.*, 
-                       COUNT(DISTINCT r.invited_id) as referral_count,
-                       COUNT(DISTINCT ct.id) as completed_tasks_count
-                FROM users u
-                LEFT JOIN referrals r ON r.inviter_id = u.id
-                LEFT JOIN completed_tasks ct ON ct.user_id = u.id
-                WHERE u.telegram_id = ?
-                GROUP BY u.id
-            ''', (telegram_id,))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                # referral_count و completed_tasks_count ستون‌های شمارنده روی users هستند
+                cursor.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,))
             
-            result = cursor.fetchone()
-            if not result:
-                return None
+                result = cursor.fetchone()
+                if not result:
+                    return None
             
-            columns = [desc[0] for desc in cursor.description]
-            user_data = dict(zip(columns, result))
+                columns = [desc[0] for desc in cursor.description]
+                user_data = dict(zip(columns, result))
+                self.user_cache.set(telegram_id, user_data)
             
-            return user_data
+                return dict(user_data)
             
-        except Exception as e:
-            logger.error(f"Error getting user: {e}")
-            return None
-        finally:
-            conn.close()
+            except Exception as e:
+                logger.error(f"Error getting user: {e}")
+                return None
+    
+    def get_user_by_api_key(self, api_key: str) -> Optional[Dict]:
+        """دریافت کاربر بر اساس api_key (نگاشت api_key به telegram_id cache می‌شود)"""
+        telegram_id = self.api_key_cache.get(api_key)
+        if telegram_id is None:
+            with self.get_connection() as conn:
+                result = conn.execute('SELECT telegram_id FROM users WHERE api_key = ?', (api_key,)).fetchone()
+            if not result:
+                return None
+            telegram_id = result[0]
+            self.api_key_cache.set(api_key, telegram_id)
+        
+        return self.get_user_by_telegram_id(telegram_id)
     
     def get_user_by_referral_code(self, referral_code: str) -> Optional[Dict]:
         """دریافت کاربر بر اساس کد referral"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            cursor.execute('SELECT * FROM users WHERE referral_code = ?', (referral_code,))
-            result = cursor.fetchone()
+            try:
+                cursor.execute('SELECT * FROM users WHERE referral_code = ?', (referral_code,))
+                result = cursor.fetchone()
             
-            if not result:
-                return None
+                if not result:
+                    return None
             
-            columns = [desc[0] for desc in cursor.description]
-            return dict(zip(columns, result))
+                columns = [desc[0] for desc in cursor.description]
+                return dict(zip(columns, result))
             
-        except Exception as e:
-            logger.error(f"Error getting user by referral code: {e}")
-            return None
-        finally:
-            conn.close()
+            except Exception as e:
+                logger.error(f"Error getting user by referral code: {e}")
+                return None
     
     # ===== TASK MANAGEMENT =====
     
-    def get_available_tasks(self, user_id: int) -> List[Dict]:
-        """دریافت ماموریت‌های available برای کاربر"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_active_tasks(self) -> List[Dict]:
+        """کاتالوگ ماموریت‌های فعال (از cache داخل حافظه)"""
+        tasks = self.task_catalog.get_tasks()
+        if tasks is not None:
+            return tasks
         
-        try:
-            cursor.execute('''
-                SELECT t.*, 
-                       CASE WHEN ct.id IS NOT NULL THEN 1 ELSE 0 END as completed
-                FROM tasks t
-                LEFT JOIN completed_tasks ct ON ct.task_id = t.id AND ct.user_id = ?
-                WHERE t.is_active = TRUE
-                ORDER BY t.created_at
-            ''', (user_id,))
-            
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('''
+                    SELECT * FROM tasks
+                    WHERE is_active = TRUE
+                    ORDER BY created_at
+                ''')
             
-            return [dict(zip(columns, row)) for row in results]
+                columns = [desc[0] for desc in cursor.description]
+                tasks = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                self.task_catalog.set_tasks(tasks)
+                return tasks
             
+            except Exception as e:
+                logger.error(f"Error getting active tasks: {e}")
+                return []
+    
+    def get_completed_task_bits(self, user_id: int) -> int:
+        """bitset ماموریت‌های انجام شده‌ی کاربر"""
+        bits = self.task_catalog.get_completed(user_id)
+        if bits is not None:
+            return bits
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT task_id FROM completed_tasks WHERE user_id = ?', (user_id,))
+            bits = self.task_catalog.to_bits(row[0] for row in cursor)
+        
+        self.task_catalog.set_completed(user_id, bits)
+        return bits
+    
+    def get_available_tasks(self, user_id: int) -> List[Dict]:
+        """دریافت ماموریت‌های available برای کاربر"""
+        try:
+            tasks = self.get_active_tasks()
+            if not tasks:
+                return []
+            return self.task_catalog.build_user_tasks(tasks, self.get_completed_task_bits(user_id))
+        
         except Exception as e:
             logger.error(f"Error getting available tasks: {e}")
             return []
-        finally:
-            conn.close()
     
-    def complete_task(self, user_id: int, task_id: int) -> bool:
-        """اتمام ماموریت و پرداخت پاداش"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def add_task(self, name: str, description: str, reward_tokens: int, task_type: str,
+                 channel: str = None) -> Optional[int]:
+        """اضافه کردن ماموریت جدید (channel: کانالی که عضویت در آن ماموریت social را تایید می‌کند)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            # بررسی اینکه کاربر قبلاً این ماموریت را انجام داده
-            cursor.execute('''
-                SELECT 1 FROM completed_tasks 
-                WHERE user_id = ? AND task_id = ?
-            ''', (user_id, task_id))
-            
-            if cursor.fetchone():
-                return False  # قبلاً انجام شده
+            try:
+                cursor.execute('''
+                    INSERT INTO tasks (name, description, reward_tokens, task_type, channel)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (name, description, reward_tokens, task_type, channel))
             
-            # دریافت اطلاعات ماموریت
-            cursor.execute('SELECT reward_tokens, name FROM tasks WHERE id = ?', (task_id,))
-            task = cursor.fetchone()
+                conn.commit()
+                self.task_catalog.invalidate_catalog()
+                return cursor.lastrowid
             
-            if not task:
-                return False
+            except Exception as e:
+                logger.error(f"Error adding task: {e}")
+                conn.rollback()
+                return None
+    
+    def set_task_active(self, task_id: int, is_active: bool) -> bool:
+        """فعال/غیرفعال کردن ماموریت"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('UPDATE tasks SET is_active = ? WHERE id = ?', (is_active, task_id))
             
-            reward_tokens, task_name = task
+                conn.commit()
+                self.task_catalog.invalidate_catalog()
+                return cursor.rowcount > 0
             
-            # ثبت ماموریت انجام شده
+            except Exception as e:
+                logger.error(f"Error updating task: {e}")
+                conn.rollback()
+                return False
+    
+    def get_task(self, task_id: int) -> Optional[Dict]:
+        """دریافت یک ماموریت (اول از کاتالوگ cache شده)"""
+        for task in self.get_active_tasks():
+            if task['id'] == task_id:
+                return task
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
+            result = cursor.fetchone()
+            if not result:
+                return None
+            columns = [desc[0] for desc in cursor.description]
+            return dict(zip(columns, result))
+    
+    def _replay_completion(self, user_id: int, task_id: int, idempotency_key: Optional[str]) -> bool:
+        """نتیجه برای ماموریتی که قبلاً ثبت شده (فقط خواندن)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO completed_tasks (user_id, task_id)
-                VALUES (?, ?)
+                SELECT idempotency_key FROM completed_tasks
+                WHERE user_id = ? AND task_id = ?
             ''', (user_id, task_id))
+            existing = cursor.fetchone()
+        
+        if existing:
+            self.task_catalog.mark_completed(user_id, task_id)
+        
+        # تکرار همان کلید نتیجه‌ی اولین اجرا را می‌گیرد؛ بقیه‌ی تکراری‌ها False
+        result = bool(existing) and idempotency_key is not None and existing[0] == idempotency_key
+        if idempotency_key is not None:
+            self.idempotency_cache.set((idempotency_key, user_id, task_id), result)
+        return result
+    
+    def complete_task(self, user_id: int, task_id: int, idempotency_key: str = None) -> bool:
+        """اتمام ماموریت و پرداخت پاداش (یک تراکنش نوشتنی، idempotent)"""
+        # شناسه‌ی منفی در bitset خطای shift می‌دهد و ماموریتی با آن وجود ندارد
+        if task_id < 0:
+            return False
+        
+        # تکرار یک callback با همان کلید هیچ نوشتنی ندارد
+        cache_key = (idempotency_key, user_id, task_id)
+        if idempotency_key is not None:
+            cached = self.idempotency_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        # تکراری‌ها با bitset (معمولاً از حافظه) و بدون گرفتن قفل نوشتن رد می‌شوند
+        if self.get_completed_task_bits(user_id) >> task_id & 1:
+            if idempotency_key is None:
+                return False
+            return self._replay_completion(user_id, task_id, idempotency_key)
+        
+        task = self.get_task(task_id)
+        if not task:
+            return False
+        
+        def op(cursor):
+            # ثبت ماموریت انجام شده؛ تکراری بودن با rowcount مشخص می‌شود نه با exception
+            cursor.execute('''
+                INSERT INTO completed_tasks (user_id, task_id, idempotency_key)
+                VALUES (?, ?, ?)
+                ON CONFLICT DO NOTHING
+            ''', (user_id, task_id, idempotency_key))
+            if cursor.rowcount == 0:
+                return False, None
             
             # اضافه کردن توکن به کاربر
             cursor.execute('''
                 UPDATE users 
-                SET total_tokens = total_tokens + ? 
+                SET total_tokens = total_tokens + ?,
+                    completed_tasks_count = completed_tasks_count + 1
                 WHERE id = ?
-            ''', (reward_tokens, user_id))
+                RETURNING total_tokens, telegram_id
+            ''', (task['reward_tokens'], user_id))
+            updated = cursor.fetchone()
             
             # ثبت تراکنش
             cursor.execute('''
-                INSERT INTO transactions (user_id, transaction_type, amount, description)
-                VALUES (?, 'task_reward', ?, ?)
-            ''', (user_id, reward_tokens, f"Task completed: {task_name}"))
-            
-            conn.commit()
-            return True
-            
+                INSERT INTO transactions (user_id, transaction_type, amount, description, related_task_id)
+                VALUES (?, 'task_reward', ?, ?, ?)
+            ''', (user_id, task['reward_tokens'], f"Task completed: {task['name']}", task_id))
+            return True, updated
+        
+        try:
+            inserted, updated = self.run_write(op)
         except Exception as e:
             logger.error(f"Error completing task: {e}")
-            conn.rollback()
             return False
-        finally:
-            conn.close()
+        
+        if not inserted:
+            return self._replay_completion(user_id, task_id, idempotency_key)
+        
+        self.task_catalog.mark_completed(user_id, task_id)
+        if idempotency_key is not None:
+            self.idempotency_cache.set(cache_key, True)
+        if updated:
+            self.invalidate_user(updated[1])
+            self.leaderboard.update_tokens(user_id, updated[0])
+        return True
     
     # ===== WALLET MANAGEMENT =====
     
     def update_wallet_address(self, user_id: int, wallet_address: str) -> bool:
-        """بروزرسانی آدرس کیف پول کاربر"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """بروزرسانی آدرس کیف پول کاربر؛ کیف پول از کاربر دیگری که قبلا به آن وصل بود جدا می‌شود"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            cursor.execute('''
-                UPDATE users 
-                SET wallet_address = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (wallet_address, user_id))
+            try:
+                # هر کیف پول فقط به یک کاربر (UNIQUE idx_users_wallet)؛ آخرین امضای معتبر برنده است
+                cursor.execute('''
+                    UPDATE users
+                    SET wallet_address = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE lower(wallet_address) = lower(?) AND id != ?
+                    RETURNING id, telegram_id
+                ''', (wallet_address, user_id))
+                unlinked = cursor.fetchall()
+                cursor.execute('''
+                    UPDATE users 
+                    SET wallet_address = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    RETURNING telegram_id
+                ''', (wallet_address, user_id))
+                updated = cursor.fetchone()
             
-            conn.commit()
-            return cursor.rowcount > 0
+                if not updated:
+                    conn.rollback()
+                    return False
+                conn.commit()
+                for other_id, telegram_id in unlinked:
+                    logger.warning(f"Wallet {wallet_address} moved from user {other_id} to user {user_id}")
+                    self.invalidate_user(telegram_id)
+                self.invalidate_user(updated[0])
+                return True
             
+            except Exception as e:
+                logger.error(f"Error updating wallet address: {e}")
+                return False
+    
+    def create_wallet_nonce(self, user_id: int, nonce: str, wallet_address: str, ttl: float) -> bool:
+        """ثبت challenge اتصال کیف پول؛ challenge قبلی کاربر باطل می‌شود"""
+        try:
+            self.run_write(lambda cursor: cursor.execute('''
+                INSERT INTO wallet_nonces (user_id, nonce, wallet_address, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE
+                SET nonce = excluded.nonce, wallet_address = excluded.wallet_address,
+                    expires_at = excluded.expires_at
+            ''', (user_id, nonce, wallet_address, time.time() + ttl)))
+            return True
         except Exception as e:
-            logger.error(f"Error updating wallet address: {e}")
+            logger.error(f"Error creating wallet nonce: {e}")
             return False
-        finally:
-            conn.close()
+    
+    def consume_wallet_nonce(self, user_id: int) -> Optional[Dict]:
+        """برداشتن challenge باز کاربر (فقط یک بار قابل استفاده)؛ None اگر نبود یا منقضی شده بود"""
+        try:
+            row = self.run_write(lambda cursor: cursor.execute('''
+                DELETE FROM wallet_nonces WHERE user_id = ?
+                RETURNING nonce, wallet_address, expires_at
+            ''', (user_id,)).fetchone())
+        except Exception as e:
+            logger.error(f"Error consuming wallet nonce: {e}")
+            return None
+        if row is None or row[2] < time.time():
+            return None
+        return {'nonce': row[0], 'wallet_address': row[1]}
     
     def get_user_transactions(self, user_id: int, limit: int = 10) -> List[Dict]:
         """دریافت تاریخچه تراکنش‌های کاربر"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                SELECT transaction_type, amount, description, created_at
+        return self.get_transactions_page(user_id, limit=limit)['transactions']
+    
+    def _fetch_transactions(self, user_id: int, cursor: Optional[Tuple[str, int]], direction: str,
+                            limit: int) -> List[Tuple]:
+        """یک صفحه keyset روی ایندکس (user_id, created_at) که rowid را هم در بر دارد"""
+        with self.get_connection() as conn:
+            if cursor is None:
+                return conn.execute('''
+                    SELECT id, transaction_type, amount, description, created_at
+                    FROM transactions
+                    WHERE user_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, limit)).fetchall()
+            
+            if direction == 'newer':
+                rows = conn.execute('''
+                    SELECT id, transaction_type, amount, description, created_at
+                    FROM transactions
+                    WHERE user_id = ? AND (created_at, id) > (?, ?)
+                    ORDER BY created_at ASC, id ASC
+                    LIMIT ?
+                ''', (user_id, cursor[0], cursor[1], limit)).fetchall()
+                rows.reverse()
+                return rows
+            
+            return conn.execute('''
+                SELECT id, transaction_type, amount, description, created_at
                 FROM transactions
-                WHERE user_id = ?
-                ORDER BY created_at DESC
+                WHERE user_id = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
                 LIMIT ?
-            ''', (user_id, limit))
+            ''', (user_id, cursor[0], cursor[1], limit)).fetchall()
+    
+    @staticmethod
+    def _transaction_row(row: Tuple) -> Dict:
+        return {
+            'id': row[0],
+            'transaction_type': row[1],
+            'amount': row[2],
+            'description': row[3],
+            'created_at': row[4]
+        }
+    
+    def get_transactions_page(self, user_id: int, cursor: Optional[Tuple[str, int]] = None,
+                              direction: str = 'older', limit: int = 10) -> Dict:
+        """صفحه‌بندی cursor-based با (created_at, id)؛ هزینه هر صفحه O(limit) است"""
+        try:
+            rows = self._fetch_transactions(user_id, cursor, direction, limit + 1)
             
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
+            # ردیف اضافه فقط برای فهمیدن وجود صفحه‌ی بعد در همان جهت است
+            has_more = len(rows) > limit
+            if has_more:
+                rows = rows[1:] if direction == 'newer' and cursor is not None else rows[:limit]
             
-            return [dict(zip(columns, row)) for row in results]
+            if not rows:
+                return {'transactions': [], 'older': None, 'newer': None}
             
+            first, last = rows[0], rows[-1]
+            if cursor is None:
+                has_older, has_newer = has_more, False
+            elif direction == 'newer':
+                has_older, has_newer = True, has_more
+            else:
+                has_older, has_newer = has_more, True
+            
+            return {
+                'transactions': [self._transaction_row(row) for row in rows],
+                'older': (last[4], last[0]) if has_older else None,
+                'newer': (first[4], first[0]) if has_newer else None
+            }
+        
         except Exception as e:
             logger.error(f"Error getting transactions: {e}")
+            return {'transactions': [], 'older': None, 'newer': None}
+    
+    def iter_user_transactions(self, user_id: int, cursor: Optional[Tuple[str, int]] = None,
+                               direction: str = 'older', batch_size: int = 200) -> Iterator[Dict]:
+        """generator روی کل تاریخچه (older: جدید به قدیم، newer: قدیم به جدید)؛ اتصال فقط هنگام خواندن هر دسته گرفته می‌شود"""
+        while True:
+            rows = self._fetch_transactions(user_id, cursor, direction, batch_size)
+            for row in (reversed(rows) if direction == 'newer' else rows):
+                yield self._transaction_row(row)
+            
+            if len(rows) < batch_size:
+                return
+            
+            # ادامه از آخرین ردیف در همان جهت
+            edge = rows[0] if direction == 'newer' else rows[-1]
+            cursor = (edge[4], edge[0])
+    
+    # ===== LEDGER MODELS =====
+    
+    def add_transactions(self, transactions: Iterable[Transaction]) -> int:
+        """ثبت گروهی مدل‌های Transaction (بدون تغییر موجودی کاربر) با یک executemany"""
+        rows = [transaction.to_row() for transaction in transactions]
+        try:
+            self.run_write(lambda cursor: cursor.executemany(TRANSACTION_INSERT, rows))
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error adding transactions: {e}")
+            return 0
+    
+    def get_transaction(self, transaction_id: int) -> Optional[Transaction]:
+        with self.get_connection() as conn:
+            row = conn.execute(f'''
+                SELECT {TRANSACTION_SELECT}
+                FROM transactions
+                WHERE id = ?
+            ''', (transaction_id,)).fetchone()
+        return Transaction.from_row(row) if row else None
+    
+    def get_transactions_by_status(self, status: TransactionStatus, after_id: int = 0,
+                                   limit: int = 100) -> List[Transaction]:
+        """صفحه‌ای از تراکنش‌های یک وضعیت روی ایندکس (status, id)؛ صفحه‌ی بعد با after_id آخرین ردیف"""
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT {TRANSACTION_SELECT}
+                    FROM transactions
+                    WHERE status = ? AND id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (status.value, after_id, limit)).fetchall()
+            return [Transaction.from_row(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting {status.value} transactions: {e}")
+            return []
+    
+    def get_user_transactions_by_status(self, user_id: int, status: TransactionStatus,
+                                        limit: int = 10) -> List[Transaction]:
+        """آخرین تراکنش‌های کاربر با یک وضعیت (مثلا برداشت‌های pending)"""
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT {TRANSACTION_SELECT}
+                    FROM transactions
+                    WHERE user_id = ? AND status = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, status.value, limit)).fetchall()
+            return [Transaction.from_row(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting user transactions: {e}")
             return []
-        finally:
-            conn.close()
+    
+    def count_transactions_by_status(self) -> Dict[str, int]:
+        """تعداد تراکنش‌ها در هر وضعیت (فقط از روی ایندکس)"""
+        with self.get_connection() as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM transactions GROUP BY status').fetchall())
+    
+    def update_transactions_status(self, transaction_ids: Iterable[int], status: TransactionStatus,
+                                   transaction_hash: str = None, expected: TransactionStatus = None,
+                                   chunk_size: int = 900) -> int:
+        """تغییر گروهی وضعیت (UPDATE ... IN در یک تراکنش)؛ با expected فقط ردیف‌هایی که هنوز در آن وضعیت‌اند"""
+        ids = list(transaction_ids)
+        condition = ' AND status = ?' if expected is not None else ''
+        
+        def op(cursor):
+            changed = 0
+            for start in range(0, len(ids), chunk_size):
+                part = ids[start:start + chunk_size]
+                cursor.execute(f'''
+                    UPDATE transactions
+                    SET status = ?, transaction_hash = COALESCE(?, transaction_hash)
+                    WHERE id IN ({','.join('?' * len(part))}){condition}
+                ''', [status.value, transaction_hash, *part] + ([expected.value] if expected is not None else []))
+                changed += cursor.rowcount
+            return changed
+        
+        try:
+            return self.run_write(op)
+        except Exception as e:
+            logger.error(f"Error updating transaction status: {e}")
+            return 0
     
     # ===== REFERRAL SYSTEM =====
     
     def get_referral_stats(self, user_id: int) -> Dict:
-        """دریافت آمار referral کاربر"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """دریافت آمار referral کاربر (read-through cache)"""
+        cached = self.referral_stats_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
         
-        try:
-            cursor.execute('''
-                SELECT COUNT(*) as total_referrals,
-                       COALESCE(SUM(tokens_earned), 0) as total_earned
-                FROM referrals
-                WHERE inviter_id = ?
-            ''', (user_id,))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('''
+                    SELECT COUNT(*) as total_referrals,
+                           COALESCE(SUM(tokens_earned), 0) as total_earned
+                    FROM referrals
+                    WHERE inviter_id = ?
+                ''', (user_id,))
             
-            result = cursor.fetchone()
+                result = cursor.fetchone()
             
-            return {
-                'total_referrals': result[0] if result else 0,
-                'total_earned': result[1] if result else 0
-            }
+                stats = {
+                    'total_referrals': result[0] if result else 0,
+                    'total_earned': result[1] if result else 0
+                }
+                self.referral_stats_cache.set(user_id, stats)
+                return dict(stats)
             
-        except Exception as e:
-            logger.error(f"Error getting referral stats: {e}")
-            return {'total_referrals': 0, 'total_earned': 0}
-        finally:
-            conn.close()
+            except Exception as e:
+                logger.error(f"Error getting referral stats: {e}")
+                return {'total_referrals': 0, 'total_earned': 0}
     
-    def get_referral_leaderboard(self, limit: int = 10) -> List[Dict]:
-        """دریافت لیدربرد referrals"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_referral_leaderboard(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """دریافت لیدربرد referrals از ایندکس داخل حافظه (O(K))"""
+        return self.leaderboard.top(limit, offset)
+    
+    def get_leaderboard_rank(self, telegram_id: int) -> Optional[Dict]:
+        """رتبه‌ی کاربر در لیدربرد referral"""
+        return self.leaderboard.rank_of(telegram_id)
+    
+    def rebuild_leaderboard(self):
+        """بازسازی لیدربرد از دیتابیس (هنگام راه‌اندازی)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
         
-        try:
-            cursor.execute('''
-                SELECT u.username, u.telegram_id,
-                       COUNT(r.invited_id) as referral_count,
-                       u.total_tokens
-                FROM users u
-                LEFT JOIN referrals r ON r.inviter_id = u.id
-                GROUP BY u.id
-                ORDER BY referral_count DESC, u.total_tokens DESC
-                LIMIT ?
-            ''', (limit,))
+            try:
+                cursor.execute('''
+                    SELECT id, username, telegram_id, referral_count, total_tokens
+                    FROM users
+                    WHERE referral_count > 0
+                    ORDER BY referral_count DESC, total_tokens DESC
+                ''')
+                self.leaderboard.rebuild(cursor)
+                logger.info(f"Referral leaderboard rebuilt with {len(self.leaderboard)} users")
             
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
+            except Exception as e:
+                logger.error(f"Error rebuilding referral leaderboard: {e}")
+
+    # ===== DASHBOARD =====
+
+    def get_dashboard_snapshot(self, telegram_id: int, transactions_limit: int = 10) -> Optional[Dict]:
+        """همه‌ی داده‌های داشبورد mini app در یک تراکنش خواندنی روی یک connection، همراه با etag"""
+        tasks = self.get_active_tasks()
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            try:
+                # snapshot ثابت WAL: همه‌ی کوئری‌ها یک نسخه از دیتابیس را می‌بینند
+                cursor.execute('BEGIN')
+                cursor.execute('SELECT * FROM users WHERE telegram_id = ?', (telegram_id,))
+                result = cursor.fetchone()
+                if not result:
+                    return None
+
+                columns = [desc[0] for desc in cursor.description]
+                user_data = dict(zip(columns, result))
+                user_id = user_data['id']
+
+                cursor.execute('SELECT task_id FROM completed_tasks WHERE user_id = ?', (user_id,))
+                bits = self.task_catalog.to_bits(row[0] for row in cursor)
+
+                cursor.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(tokens_earned), 0)
+                    FROM referrals
+                    WHERE inviter_id = ?
+                ''', (user_id,))
+                total_referrals, total_earned = cursor.fetchone()
+
+                rows = cursor.execute('''
+                    SELECT id, transaction_type, amount, description, created_at
+                    FROM transactions
+                    WHERE user_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, transactions_limit + 1)).fetchall()
+                conn.commit()
+
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error getting dashboard snapshot: {e}")
+                return None
+
+        # گرم کردن cacheها با همین داده‌ها
+        referral_stats = {'total_referrals': total_referrals, 'total_earned': total_earned}
+        self.user_cache.set(telegram_id, user_data)
+        self.task_catalog.set_completed(user_id, bits)
+        self.referral_stats_cache.set(user_id, referral_stats)
+
+        has_older = len(rows) > transactions_limit
+        rows = rows[:transactions_limit]
+        snapshot = {
+            'user': {
+                'telegram_id': telegram_id,
+                'username': user_data['username'],
+                'balance': user_data['total_tokens'],
+                'symbol': Config.TOKEN_SYMBOL,
+                'wallet_address': user_data['wallet_address'],
+                'referral_code': user_data['referral_code'],
+                'completed_tasks_count': user_data['completed_tasks_count'],
+            },
+            'tasks': self.task_catalog.build_user_tasks(tasks, bits),
+            'referrals': dict(referral_stats, rank=self.leaderboard.rank_of(telegram_id)),
+            'transactions': {
+                'items': [self._transaction_row(row) for row in rows],
+                'older': (rows[-1][4], rows[-1][0]) if has_older else None,
+            },
+        }
+
+        # etag از محتوای snapshot؛ با تغییر هر بخش عوض می‌شود
+        payload = json.dumps(snapshot, sort_keys=True, separators=(',', ':'), default=str)
+        snapshot['etag'] = hashlib.blake2b(payload.encode(), digest_size=12).hexdigest()
+        return snapshot
+
+    # ===== MAINTENANCE =====
+    
+    def reconcile_counters(self, fix: bool = True) -> Dict:
+        """بازسازی شمارنده‌های referral_count و completed_tasks_count و گزارش اختلاف"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+        
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute('''
+                    SELECT u.id, u.referral_count, COALESCE(r.cnt, 0),
+                           u.completed_tasks_count, COALESCE(c.cnt, 0), u.telegram_id
+                    FROM users u
+                    LEFT JOIN (
+                        SELECT inviter_id, COUNT(*) AS cnt FROM referrals GROUP BY inviter_id
+                    ) r ON r.inviter_id = u.id
+                    LEFT JOIN (
+                        SELECT user_id, COUNT(*) AS cnt FROM completed_tasks GROUP BY user_id
+                    ) c ON c.user_id = u.id
+                    WHERE u.referral_count != COALESCE(r.cnt, 0)
+                       OR u.completed_tasks_count != COALESCE(c.cnt, 0)
+                ''')
+                drifted = cursor.fetchall()
             
-            return [dict(zip(columns, row)) for row in results]
+                if fix and drifted:
+                    cursor.executemany('''
+                        UPDATE users
+                        SET referral_count = ?, completed_tasks_count = ?
+                        WHERE id = ?
+                    ''', [(refs, done, user_id) for user_id, _, refs, _, done, _ in drifted])
             
-        except Exception as e:
-            logger.error(f"Error getting referral leaderboard: {e}")
-            return []
-        finally:
-            conn.close()
+                conn.commit()
+                if fix and drifted:
+                    # cache این پروسه و (با user_changes) پروسه‌های دیگر شمارنده‌های قدیمی را نگه داشته‌اند
+                    for user_id, _, _, _, _, telegram_id in drifted:
+                        self.invalidate_user(telegram_id=telegram_id, user_id=user_id)
+                    if any(stored != refs for _, stored, refs, _, _, _ in drifted):
+                        self.rebuild_leaderboard()
+            
+                return {
+                    'drifted_users': len(drifted),
+                    'referral_drift': sum(abs(refs - stored) for _, stored, refs, _, _, _ in drifted),
+                    'completed_tasks_drift': sum(abs(done - stored) for _, _, _, stored, done, _ in drifted),
+                    'fixed': fix,
+                    'samples': [
+                        {'user_id': row[0], 'referral_count': (row[1], row[2]),
+                         'completed_tasks_count': (row[3], row[4])}
+                        for row in drifted[:10]
+                    ]
+                }
+            
+            except Exception as e:
+                logger.error(f"Error reconciling counters: {e}")
+                conn.rollback()
+                raise
 
 # نمونه global برای استفاده در سایر فایل‌ها
 db = DatabaseManager()
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="LastForEnd database tools")
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="database path")
+    parser.add_argument("--setup", action="store_true", help="apply pending migrations")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="fail if a hot query falls back to a full scan")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="rebuild per-user counters and report drift")
+    parser.add_argument("--dry-run", action="store_true", help="with --reconcile: only report drift")
+    args = parser.parse_args()
+    
+    manager = DatabaseManager(args.db)
+    print(f"Schema version: {manager.get_schema_version()}")
+    
+    if args.check_plans:
+        problems = manager.check_query_plans()
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ All hot queries use indexes")
+    
+    if args.reconcile:
+        report = manager.reconcile_counters(fix=not args.dry_run)
+        print(f"Users with drift: {report['drifted_users']}")
+        print(f"Referral count drift: {report['referral_drift']}")
+        print(f"Completed tasks drift: {report['completed_tasks_drift']}")
+        for sample in report['samples']:
+            print(f"  user {sample['user_id']}: referrals (stored, actual)={sample['referral_count']}, "
+                  f"tasks (stored, actual)={sample['completed_tasks_count']}")
+        if report['drifted_users'] and not args.dry_run:
+            print("✅ Counters rebuilt")
+    
+    # تغییرهای منتشر نشده در user_changes نوشته می‌شوند
+    manager.close()
@@ -0,0 +1,364 @@
+import json
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from eth_account import Account
+from web3 import Web3
+
+from .config import Config
+from .contracts import connect
+from .database import DatabaseManager, db
+from .models import TransactionStatus, TransactionType
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+CHECKPOINT = "lfe_deposits"
+
+# (tx_hash, log_index, block_number, from_address, to_address, value)
+Transfer = Tuple[str, int, int, str, str, str]
+
+
+def _address_topic(address: str) -> str:
+    return "0x" + "00" * 12 + address[2:].lower()
+
+
+def decode_transfer(log) -> Transfer:
+    """خواندن مستقیم topicها و data؛ بسیار سریع‌تر از contract.events.Transfer().process_log"""
+    topics = log["topics"]
+    return (Web3.to_hex(log["transactionHash"]), log["logIndex"], log["blockNumber"],
+            "0x" + bytes(topics[1])[-20:].hex(), "0x" + bytes(topics[2])[-20:].hex(),
+            str(int.from_bytes(bytes(log["data"]), "big")))
+
+
+def _get_remainder(cursor, user_id: int) -> int:
+    row = cursor.execute('SELECT remainder FROM deposit_remainders WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def _set_remainder(cursor, user_id: int, remainder: int):
+    cursor.execute('''
+        INSERT INTO deposit_remainders (user_id, remainder) VALUES (?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET remainder = excluded.remainder
+    ''', (user_id, remainder))
+
+
+def credit_transfers(cursor, transfers: List[Tuple], unit: int) -> Tuple[List[Tuple[int, int, int]], int]:
+    """اعتبار واریزهای (id, tx_hash, log_index, block_number, from_address, value) به کاربر صاحب کیف پول
+
+    مقدار دقیق (wei) جمع می‌شود و فقط توکن‌های کامل اعتبار می‌گیرند؛ کسر باقی‌مانده در deposit_remainders
+    تا واریز بعدی همان کاربر می‌ماند. واریز کیف پول ناشناس بدون user_id می‌ماند تا بعد از اتصال کیف پول
+    اعتبار بگیرد. خروجی: (user_id, telegram_id, total_tokens) کاربران تغییر کرده و تعداد واریزهای وصل شده.
+    """
+    senders = list({row[4] for row in transfers})
+    # idx_users_wallet یکتاست، پس هر آدرس حداکثر به یک کاربر می‌رسد
+    users = {}
+    for i in range(0, len(senders), 500):
+        chunk = senders[i:i + 500]
+        for user_id, telegram_id, wallet in cursor.execute(f'''
+            SELECT id, telegram_id, lower(wallet_address) FROM users
+            WHERE lower(wallet_address) IN ({",".join("?" * len(chunk))})
+        ''', chunk):
+            users[wallet] = (user_id, telegram_id)
+
+    remainders: Dict[int, int] = {}
+    credits: Dict[int, int] = {}
+    linked = []
+    for transfer_id, tx_hash, log_index, block_number, sender, value in transfers:
+        user = users.get(sender)
+        if user is None:
+            continue
+        user_id = user[0]
+        if user_id not in remainders:
+            remainders[user_id] = _get_remainder(cursor, user_id)
+        amount, remainders[user_id] = divmod(remainders[user_id] + int(value), unit)
+        transaction_id = None
+        if amount > 0:
+            cursor.execute('''
+                INSERT INTO transactions
+                (user_id, transaction_type, amount, description, wallet_address, transaction_hash, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, TransactionType.DEPOSIT.value, amount, f"Deposit #{transfer_id}", sender, tx_hash,
+                  json.dumps({"block": block_number, "log_index": log_index, "value": value})))
+            transaction_id = cursor.lastrowid
+            credits[user_id] = credits.get(user_id, 0) + amount
+        linked.append((user_id, transaction_id, transfer_id))
+    cursor.executemany('UPDATE chain_transfers SET user_id = ?, transaction_id = ? WHERE id = ?', linked)
+    for user_id, remainder in remainders.items():
+        _set_remainder(cursor, user_id, remainder)
+
+    updated = []
+    for user_id, amount in credits.items():
+        cursor.execute('''
+            UPDATE users SET total_tokens = total_tokens + ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            RETURNING id, telegram_id, total_tokens
+        ''', (amount, user_id))
+        updated.append(cursor.fetchone())
+    return updated, len(linked)
+
+
+def credit_wallet_deposits(manager: DatabaseManager, wallet_address: str) -> int:
+    """اعتبار واریزهای قبلی کیف پولی که تازه به کاربر وصل شده؛ تعداد واریزهای وصل شده"""
+    def op(cursor):
+        uncredited = cursor.execute('''
+            SELECT id, tx_hash, log_index, block_number, from_address, value FROM chain_transfers
+            WHERE from_address = ? AND user_id IS NULL
+        ''', (wallet_address.lower(),)).fetchall()
+        return credit_transfers(cursor, uncredited, 10 ** Config.TOKEN_DECIMALS)
+
+    updated, linked = manager.run_write(op)
+    for user_id, telegram_id, total_tokens in updated:
+        manager.invalidate_user(telegram_id, user_id)
+        manager.leaderboard.update_tokens(user_id, total_tokens)
+    return linked
+
+
+class TransferIndexer:
+    """واریزهای LFE: رویدادهای Transfer به DEPOSIT_ADDRESS خوانده و به حساب کاربری با همان کیف پول اضافه می‌شوند
+
+    فقط بلاک‌هایی با حداقل confirmations تایید خوانده می‌شوند و هر بازه‌ی بلاک (logها، اعتبار کاربران و
+    checkpoint) در یک تراکنش ثبت می‌شود. اندازه‌ی بازه با تعداد logها و خطاهای node تنظیم می‌شود.
+    """
+
+    def __init__(self, manager: DatabaseManager, w3: Web3 = None, token_address: str = None,
+                 deposit_address: str = None, confirmations: int = None, start_block: int = None,
+                 block_range: int = None, max_block_range: int = None, target_logs: int = None,
+                 name: str = CHECKPOINT):
+        self.manager = manager
+        self.w3 = w3
+        self.token_address = token_address or Config.LFE_TOKEN_ADDRESS
+        if deposit_address is None:
+            deposit_address = Config.DEPOSIT_ADDRESS or (
+                Account.from_key(Config.HOT_WALLET_PRIVATE_KEY).address if Config.HOT_WALLET_PRIVATE_KEY else "")
+        self.deposit_address = deposit_address
+        self.confirmations = confirmations if confirmations is not None else Config.INDEXER_CONFIRMATIONS
+        self.start_block = start_block if start_block is not None else Config.INDEXER_START_BLOCK
+        self.block_range = block_range or Config.INDEXER_BLOCK_RANGE
+        self.max_block_range = max_block_range or Config.INDEXER_MAX_BLOCK_RANGE
+        self.target_logs = target_logs or Config.INDEXER_TARGET_LOGS
+        self.name = name
+        self.unit = 10 ** Config.TOKEN_DECIMALS
+
+        self.requests = 0
+        self.logs = 0
+        self.credited = 0
+        self.reversed = 0
+        self.reorgs = 0
+        self._swept = False
+
+    def _connect(self):
+        if self.w3 is None:
+            self.w3 = connect()
+
+    # ===== CHECKPOINT =====
+
+    def checkpoint(self) -> Optional[Tuple[int, str]]:
+        """آخرین بلاک پردازش شده و hash آن"""
+        with self.manager.get_connection() as conn:
+            return conn.execute('SELECT block_number, block_hash FROM indexer_checkpoints WHERE name = ?',
+                                (self.name,)).fetchone()
+
+    def _next_block(self) -> int:
+        """بلاک بعد از checkpoint؛ اگر hash آن عوض شده باشد (reorg عمیق‌تر از confirmations) عقب می‌رود"""
+        checkpoint = self.checkpoint()
+        if checkpoint is None:
+            return self.start_block
+        number, block_hash = checkpoint
+        if Web3.to_hex(self.w3.eth.get_block(number)["hash"]) == block_hash:
+            return number + 1
+        self.reorgs += 1
+        rewind = max(self.start_block, number - max(self.confirmations, 1))
+        # اعتبار واریزهای بعد از rewind در همان تراکنش برگردانده می‌شود؛ واریزهایی که در زنجیره‌ی جدید
+        # هم هستند با خواندن دوباره اعتبار می‌گیرند
+        before = self.reversed
+        self._apply(lambda cursor: self._reverse(cursor, rewind))
+        logger.error(f"Block {number} was reorganized past {self.confirmations} confirmations; "
+                     f"reversed {self.reversed - before} transfers from block {rewind} and rescanning")
+        return rewind
+
+    # ===== FETCH =====
+
+    def _get_logs(self, from_block: int, to_block: int) -> List:
+        self.requests += 1
+        return self.w3.eth.get_logs({
+            "address": self.token_address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [TRANSFER_TOPIC, None, _address_topic(self.deposit_address)],
+        })
+
+    def _fetch(self, from_block: int, last_block: int) -> Tuple[int, List]:
+        """logهای یک بازه؛ با خطای node (حجم زیاد یا timeout) بازه نصف و دوباره امتحان می‌شود"""
+        while True:
+            to_block = min(last_block, from_block + self.block_range - 1)
+            try:
+                logs = self._get_logs(from_block, to_block)
+            except Exception as e:
+                if to_block == from_block:
+                    raise
+                self.block_range = max(1, self.block_range // 2)
+                logger.warning(f"eth_getLogs {from_block}-{to_block} failed ({e}); range -> {self.block_range}")
+                continue
+
+            # بازه‌ی بعدی طوری که تعداد logها نزدیک target_logs بماند
+            if len(logs) > self.target_logs:
+                self.block_range = max(1, self.block_range // 2)
+            elif len(logs) < self.target_logs // 4 and to_block - from_block + 1 == self.block_range:
+                self.block_range = min(self.max_block_range, self.block_range * 2)
+            return to_block, logs
+
+    # ===== STORE =====
+
+    def _store(self, cursor, transfers: List[Transfer], from_block: int, to_block: int,
+               block_hash: str) -> List[Tuple[int, int, int]]:
+        """ثبت logها، اعتبار واریزهای جدید و checkpoint در یک تراکنش؛ (user_id, telegram_id, total_tokens)"""
+        cursor.executemany('''
+            INSERT OR IGNORE INTO chain_transfers
+            (tx_hash, log_index, block_number, from_address, to_address, value)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', transfers)
+        cursor.execute('''
+            INSERT INTO indexer_checkpoints (name, block_number, block_hash)
+            VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE
+            SET block_number = excluded.block_number, block_hash = excluded.block_hash,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (self.name, to_block, block_hash))
+        if not transfers:
+            return []
+
+        uncredited = cursor.execute('''
+            SELECT id, tx_hash, log_index, block_number, from_address, value FROM chain_transfers
+            WHERE block_number BETWEEN ? AND ? AND user_id IS NULL
+        ''', (from_block, to_block)).fetchall()
+        updated, linked = credit_transfers(cursor, uncredited, self.unit)
+        self.credited += linked
+        return updated
+
+    def _reverse(self, cursor, from_block: int) -> List[Tuple[int, int, int]]:
+        """برگرداندن اعتبار واریزهای بلاک from_block به بعد و حذف آن‌ها تا از زنجیره‌ی فعلی دوباره خوانده شوند"""
+        rows = cursor.execute('''
+            SELECT id, user_id, transaction_id, value FROM chain_transfers WHERE block_number >= ?
+        ''', (from_block,)).fetchall()
+        values: Dict[int, int] = {}
+        transfer_ids: Dict[int, List[int]] = {}
+        for transfer_id, user_id, _, value in rows:
+            if user_id is not None:
+                values[user_id] = values.get(user_id, 0) + int(value)
+                transfer_ids.setdefault(user_id, []).append(transfer_id)
+        # مثل بازپرداخت برداشت: ردیف واریز cancelled می‌شود و یک ردیف جبرانی منفی ثبت می‌شود
+        cursor.executemany('UPDATE transactions SET status = ? WHERE id = ?',
+                           [(TransactionStatus.CANCELLED.value, row[2]) for row in rows if row[2] is not None])
+
+        updated = []
+        for user_id, value in values.items():
+            remainder = _get_remainder(cursor, user_id) - value
+            # کسر منفی شده با کم کردن توکن‌های کامل از موجودی جبران می‌شود
+            debit = max(0, -(remainder // self.unit))
+            _set_remainder(cursor, user_id, remainder + debit * self.unit)
+            if not debit:
+                continue
+            cursor.execute('''
+                INSERT INTO transactions (user_id, transaction_type, amount, description, metadata)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, TransactionType.DEPOSIT.value, -debit, "Deposit reversed by chain reorg",
+                  json.dumps({"reorg_from_block": from_block, "transfers": transfer_ids[user_id]})))
+            cursor.execute('''
+                UPDATE users SET total_tokens = total_tokens - ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                RETURNING id, telegram_id, total_tokens
+            ''', (debit, user_id))
+            updated.append(cursor.fetchone())
+        cursor.execute('DELETE FROM chain_transfers WHERE block_number >= ?', (from_block,))
+        self.reversed += len(rows)
+        return updated
+
+    def _credit_linked(self, cursor) -> List[Tuple[int, int, int]]:
+        """واریزهای قبلی کیف پول‌هایی که بعد از واریز وصل شده‌اند (یک بار هنگام شروع پروسه)"""
+        uncredited = cursor.execute('''
+            SELECT c.id, c.tx_hash, c.log_index, c.block_number, c.from_address, c.value FROM chain_transfers c
+            WHERE c.user_id IS NULL
+              AND EXISTS (SELECT 1 FROM users u WHERE lower(u.wallet_address) = c.from_address)
+        ''').fetchall()
+        updated, linked = credit_transfers(cursor, uncredited, self.unit)
+        self.credited += linked
+        return updated
+
+    def _apply(self, op: Callable) -> List[Tuple[int, int, int]]:
+        """اجرای op در یک تراکنش و بروزرسانی cache و leaderboard کاربرانی که موجودی‌شان عوض شده"""
+        updated = self.manager.run_write(op)
+        for user_id, telegram_id, total_tokens in updated:
+            self.manager.invalidate_user(telegram_id, user_id)
+            self.manager.leaderboard.update_tokens(user_id, total_tokens)
+        return updated
+
+    # ===== SYNC =====
+
+    def sync(self, max_ranges: int = None) -> Dict:
+        """پردازش بلاک‌های تایید شده تا head (یا حداکثر max_ranges بازه)"""
+        self._connect()
+        if not self._swept:
+            self._apply(self._credit_linked)
+            self._swept = True
+        head = self.w3.eth.block_number
+        last_block = head - max(self.confirmations - 1, 0)
+        from_block = self._next_block()
+        ranges = logs = 0
+        while from_block <= last_block and (max_ranges is None or ranges < max_ranges):
+            to_block, raw_logs = self._fetch(from_block, last_block)
+            transfers = [decode_transfer(log) for log in raw_logs if not log.get("removed")]
+            block_hash = Web3.to_hex(self.w3.eth.get_block(to_block)["hash"])
+            self._apply(lambda cursor: self._store(cursor, transfers, from_block, to_block, block_hash))
+            ranges += 1
+            logs += len(transfers)
+            from_block = to_block + 1
+        self.logs += logs
+        return {"head": head, "indexed_to": from_block - 1, "lag": head - (from_block - 1),
+                "ranges": ranges, "logs": logs}
+
+    def run(self, stop: threading.Event = None, poll_interval: float = None):
+        """تا head جلو می‌رود و بعد هر poll_interval بلاک‌های جدید را می‌خواند"""
+        stop = stop or threading.Event()
+        poll_interval = poll_interval or Config.INDEXER_POLL_INTERVAL
+        while not stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Error indexing transfers: {e}")
+            stop.wait(poll_interval)
+
+    def stats(self) -> Dict:
+        checkpoint = self.checkpoint()
+        with self.manager.get_connection() as conn:
+            transfers, credited = conn.execute(
+                'SELECT COUNT(*), COUNT(transaction_id) FROM chain_transfers').fetchone()
+        return {"checkpoint": checkpoint[0] if checkpoint else None, "transfers": transfers,
+                "credited": credited, "block_range": self.block_range, "get_logs_requests": self.requests,
+                "reorgs": self.reorgs, "reversed": self.reversed}
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="LastForEnd deposit indexer")
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="database path")
+    parser.add_argument("--once", action="store_true", help="index up to the confirmed head and exit")
+    parser.add_argument("--stats", action="store_true", help="print indexer state and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    indexer = TransferIndexer(db if args.db == db.db_path else DatabaseManager(args.db))
+
+    if args.stats:
+        print(indexer.stats())
+    elif args.once:
+        print(indexer.sync())
+    else:
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        indexer.run(stop)
+    indexer.manager.close()
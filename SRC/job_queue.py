@@ -0,0 +1,407 @@
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import Config
+from .database import DatabaseManager, db
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JobSpec:
+    """تعریف یک نوع job: تابع اجرا و متن پیام نتیجه برای کاربر"""
+    handler: Callable
+    max_attempts: int
+    on_result: Optional[Callable[[Dict], str]] = None
+    on_failure: Optional[Callable[[str], str]] = None
+
+
+# kind -> JobSpec؛ ماژول‌های حاوی jobها (مثل src.jobs) هنگام import ثبت می‌شوند
+HANDLERS: Dict[str, JobSpec] = {}
+# توابع async که هنگام شروع و پایان worker با خود worker صدا زده می‌شوند
+STARTUP_HOOKS: List[Callable] = []
+SHUTDOWN_HOOKS: List[Callable] = []
+
+
+def task(kind: str, max_attempts: int = None, on_result: Callable[[Dict], str] = None,
+         on_failure: Callable[[str], str] = None):
+    """ثبت تابع اجرای یک نوع job؛ تابع (payload, worker) می‌گیرد و dict نتیجه برمی‌گرداند"""
+    def decorator(handler):
+        HANDLERS[kind] = JobSpec(handler, max_attempts or Config.JOB_MAX_ATTEMPTS, on_result, on_failure)
+        return handler
+    return decorator
+
+
+def on_startup(hook):
+    STARTUP_HOOKS.append(hook)
+    return hook
+
+
+def on_shutdown(hook):
+    SHUTDOWN_HOOKS.append(hook)
+    return hook
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: Dict
+    attempts: int
+    max_attempts: int
+    chat_id: Optional[int]
+    message_id: Optional[int]
+
+
+class JobQueue:
+    """صف کارهای پس‌زمینه روی جدول jobs (broker محلی به جای Celery)
+
+    claim با BEGIN IMMEDIATE اتمیک است، پس چند پروسه‌ی worker روی یک دیتابیس کار تکراری برنمی‌دارند.
+    jobهایی که lease آن‌ها تمام شده (worker مرده) دوباره در صف قرار می‌گیرند، مگر این‌که تلاش‌هایشان تمام شده باشد.
+    """
+
+    def __init__(self, manager: DatabaseManager, lease_seconds: float = None):
+        self.manager = manager
+        self.lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+
+    def enqueue(self, kind: str, payload: Dict = None, dedup_key: str = None, chat_id: int = None,
+                message_id: int = None, max_attempts: int = None, delay: float = 0) -> Tuple[int, bool]:
+        """اضافه کردن job؛ (job_id, created) - اگر job فعالی با همین dedup_key باشد همان برگردانده می‌شود"""
+        spec = HANDLERS.get(kind)
+        max_attempts = max_attempts or (spec.max_attempts if spec else Config.JOB_MAX_ATTEMPTS)
+
+        def op(cursor):
+            cursor.execute('''
+                INSERT INTO jobs (kind, payload, dedup_key, max_attempts, run_at, chat_id, message_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dedup_key) WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running')
+                DO NOTHING
+            ''', (kind, json.dumps(payload or {}), dedup_key, max_attempts, time.time() + delay,
+                  chat_id, message_id))
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            cursor.execute('''
+                SELECT id FROM jobs
+                WHERE dedup_key = ? AND status IN ('queued', 'running')
+            ''', (dedup_key,))
+            return cursor.fetchone()[0], False
+
+        return self.manager.run_write(op)
+
+    def claim(self, worker_id: str, limit: int = 1) -> List[Job]:
+        """برداشتن حداکثر limit job آماده و قفل کردن آن‌ها برای این worker"""
+        now = time.time()
+
+        def op(cursor):
+            # worker مرده: lease تمام شده و job دوباره آماده‌ی اجراست؛ jobهایی که تلاش دیگری ندارند
+            # در expire_leases شکست می‌خورند
+            cursor.execute('''
+                UPDATE jobs SET status = 'queued', locked_by = NULL
+                WHERE status = 'running' AND locked_until < ? AND attempts < max_attempts
+            ''', (now,))
+            cursor.execute('''
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_at <= ?
+                    ORDER BY run_at
+                    LIMIT ?
+                )
+                RETURNING id, kind, payload, attempts, max_attempts, chat_id, message_id
+            ''', (worker_id, now + self.lease_seconds, now, limit))
+            return cursor.fetchall()
+
+        return [Job(row[0], row[1], json.loads(row[2]), *row[3:]) for row in self.manager.run_write(op)]
+
+    def expire_leases(self) -> List[Job]:
+        """شکست jobهایی که lease آن‌ها تمام شده و تلاش دیگری ندارند (worker در اجرای آن‌ها crash یا hang کرده)"""
+        def op(cursor):
+            cursor.execute('''
+                UPDATE jobs
+                SET status = 'failed', error = 'lease expired', locked_by = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND locked_until < ? AND attempts >= max_attempts
+                RETURNING id, kind, payload, attempts, max_attempts, chat_id, message_id
+            ''', (time.time(),))
+            return cursor.fetchall()
+
+        return [Job(row[0], row[1], json.loads(row[2]), *row[3:]) for row in self.manager.run_write(op)]
+
+    def extend_lease(self, job_ids: List[int], worker_id: str):
+        """تمدید lease jobهای در حال اجرا (برای jobهای طولانی مثل broadcast)"""
+        if not job_ids:
+            return
+        locked_until = time.time() + self.lease_seconds
+        self.manager.run_write(lambda cursor: cursor.executemany('''
+            UPDATE jobs SET locked_until = ? WHERE id = ? AND locked_by = ? AND status = 'running'
+        ''', [(locked_until, job_id, worker_id) for job_id in job_ids]))
+
+    def complete(self, job_id: int, result: Dict):
+        self.manager.run_write(lambda cursor: cursor.execute('''
+            UPDATE jobs
+            SET status = 'done', result = ?, locked_by = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (json.dumps(result), job_id)))
+
+    def fail(self, job: Job, error: str) -> bool:
+        """ثبت خطا؛ True اگر job با backoff نمایی دوباره در صف قرار گرفت"""
+        retry = job.attempts < job.max_attempts
+        # jitter تا retryهای همزمان پشت سر هم به سرویس خارجی نخورند
+        delay = min(Config.JOB_RETRY_MAX_DELAY, Config.JOB_RETRY_BASE_DELAY * 2 ** (job.attempts - 1))
+        delay *= random.uniform(0.5, 1.0)
+
+        self.manager.run_write(lambda cursor: cursor.execute('''
+            UPDATE jobs
+            SET status = ?, error = ?, run_at = ?, locked_by = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', ('queued' if retry else 'failed', error, time.time() + delay, job.id)))
+        return retry
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        with self.manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, kind, payload, dedup_key, status, attempts, max_attempts, result, error
+                FROM jobs WHERE id = ?
+            ''', (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+            for key in ('payload', 'result'):
+                job[key] = json.loads(job[key]) if job[key] else None
+            return job
+
+    def stats(self) -> Dict:
+        """تعداد jobها در هر وضعیت"""
+        with self.manager.get_connection() as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')}
+
+    def prune(self, older_than_days: float = 7) -> int:
+        """حذف jobهای تمام شده‌ی قدیمی"""
+        return self.manager.run_write(lambda cursor: cursor.execute('''
+            DELETE FROM jobs
+            WHERE status IN ('done', 'failed') AND updated_at < datetime('now', ?)
+        ''', (f"-{older_than_days} days",)).rowcount)
+
+
+class Worker:
+    """اجرای jobها با concurrency محدود؛ نتیجه با ویرایش پیام کاربر اطلاع داده می‌شود"""
+
+    def __init__(self, queue: JobQueue, bot=None, concurrency: int = None, worker_id: str = None):
+        self.queue = queue
+        self.bot = bot
+        self.concurrency = concurrency or Config.JOB_WORKER_CONCURRENCY
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._running: Dict[int, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def run(self, stop: asyncio.Event = None):
+        """حلقه‌ی اصلی: claim، اجرا و تمدید lease تا وقتی stop ست شود"""
+        stop = stop or asyncio.Event()
+        for hook in STARTUP_HOOKS:
+            await hook(self)
+        self._wakeup = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat(stop))
+        watcher = asyncio.create_task(self._watch_stop(stop))
+        idle = Config.JOB_POLL_INTERVAL
+
+        try:
+            while not stop.is_set():
+                free = self.concurrency - len(self._running)
+                jobs = await asyncio.to_thread(self.queue.claim, self.worker_id, free) if free else []
+                for job in jobs:
+                    task = asyncio.create_task(self._execute(job))
+                    self._running[job.id] = task
+                    task.add_done_callback(lambda _, job_id=job.id: self._job_done(job_id))
+
+                if jobs:
+                    idle = Config.JOB_POLL_INTERVAL
+                    continue
+                # صف خالی: فاصله‌ی poll تا سقف 1 ثانیه بیشتر می‌شود؛ آزاد شدن slot یا wake() زودتر بیدار می‌کند
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=idle if free else None)
+                except asyncio.TimeoutError:
+                    pass
+                idle = min(idle * 2, 1.0)
+        finally:
+            if self._running:
+                await asyncio.gather(*self._running.values(), return_exceptions=True)
+            for helper in (heartbeat, watcher):
+                helper.cancel()
+            await asyncio.gather(heartbeat, watcher, return_exceptions=True)
+            for hook in SHUTDOWN_HOOKS:
+                await hook(self)
+
+    def wake(self):
+        """بیدار کردن حلقه (مثلا بعد از enqueue در همین پروسه)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _job_done(self, job_id: int):
+        self._running.pop(job_id, None)
+        self.wake()
+
+    async def _watch_stop(self, stop: asyncio.Event):
+        await stop.wait()
+        self.wake()
+
+    async def _heartbeat(self, stop: asyncio.Event):
+        while not stop.is_set():
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.queue.extend_lease, list(self._running), self.worker_id)
+                expired = await asyncio.to_thread(self.queue.expire_leases)
+            except Exception as e:
+                logger.error(f"Error extending job leases: {e}")
+                continue
+            for job in expired:
+                logger.error(f"Job {job.id} ({job.kind}) lease expired after {job.attempts}/{job.max_attempts} attempts")
+                self.failed += 1
+                spec = HANDLERS.get(job.kind)
+                if spec is not None and spec.on_failure is not None:
+                    await self._notify(job, spec.on_failure("lease expired"))
+
+    async def _execute(self, job: Job):
+        spec = HANDLERS.get(job.kind)
+        try:
+            if spec is None:
+                raise LookupError(f"No handler registered for job kind {job.kind!r}")
+            if inspect.iscoroutinefunction(spec.handler):
+                result = await spec.handler(job.payload, self)
+            else:
+                result = await asyncio.to_thread(spec.handler, job.payload, self)
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) attempt {job.attempts}/{job.max_attempts} failed: {e}")
+            if await asyncio.to_thread(self.queue.fail, job, repr(e)):
+                self.retried += 1
+                return
+            self.failed += 1
+            if spec is not None and spec.on_failure is not None:
+                await self._notify(job, spec.on_failure(str(e)))
+            return
+
+        result = result if result is not None else {}
+        await asyncio.to_thread(self.queue.complete, job.id, result)
+        self.processed += 1
+        if spec.on_result is not None:
+            await self._notify(job, spec.on_result(result))
+
+    async def _notify(self, job: Job, text: Optional[str]):
+        """ویرایش پیام «در حال بررسی...» کاربر با نتیجه‌ی job"""
+        if not text or self.bot is None or job.chat_id is None:
+            return
+        try:
+            if job.message_id is not None:
+                await self.bot.edit_message_text(text, chat_id=job.chat_id, message_id=job.message_id,
+                                                 parse_mode='Markdown')
+            else:
+                await self.bot.send_message(job.chat_id, text, parse_mode='Markdown')
+        except Exception as e:
+            logger.error(f"Error sending result of job {job.id}: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "worker_id": self.worker_id,
+            "running": len(self._running),
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+async def serve(db_path: str, modules: List[str], concurrency: int, base_url: str = None):
+    """اجرای یک worker تا دریافت SIGINT/SIGTERM"""
+    from telegram.ext import ExtBot
+    from telegram.request import HTTPXRequest
+
+    from .send_queue import SendScheduler
+
+    for module in modules:
+        importlib.import_module(module)
+
+    manager = db if db_path == db.db_path else DatabaseManager(db_path)
+    kwargs = {"request": HTTPXRequest(connection_pool_size=Config.BOT_CONNECTION_POOL_SIZE)}
+    if base_url:
+        kwargs["base_url"] = base_url
+    if Config.SEND_SCHEDULER_ENABLED:
+        kwargs["rate_limiter"] = SendScheduler.from_config()
+    bot = ExtBot(Config.BOT_TOKEN, **kwargs)
+    await bot.initialize()
+    worker = Worker(JobQueue(manager), bot, concurrency)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info(f"Job worker {worker.worker_id} started (kinds: {', '.join(sorted(HANDLERS))})")
+    try:
+        await worker.run(stop)
+    finally:
+        await bot.shutdown()
+        manager.close()
+    logger.info(f"Job worker {worker.worker_id} stopped: {worker.stats()}")
+
+
+def run_worker_process(db_path: str, modules: List[str], concurrency: int, base_url: str = None):
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    asyncio.run(serve(db_path, modules, concurrency, base_url))
+
+
+# نمونه global برای enqueue از هندلرهای ربات
+job_queue = JobQueue(db)
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="LastForEnd background job workers")
+    parser.add_argument("--processes", type=int, default=Config.JOB_WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=Config.JOB_WORKER_CONCURRENCY,
+                        help="jobs in flight per process")
+    parser.add_argument("--modules", default="src.jobs", help="comma separated modules that register jobs")
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="database path")
+    parser.add_argument("--stats", action="store_true", help="print queue counts and exit")
+    parser.add_argument("--prune", type=float, metavar="DAYS", help="delete finished jobs older than DAYS")
+    args = parser.parse_args()
+
+    queue = JobQueue(db if args.db == db.db_path else DatabaseManager(args.db))
+    if args.stats or args.prune is not None:
+        if args.prune is not None:
+            print(f"Pruned {queue.prune(args.prune)} jobs")
+        print(queue.stats())
+        raise SystemExit(0)
+
+    modules = [module for module in args.modules.split(",") if module]
+    if args.processes <= 1:
+        run_worker_process(args.db, modules, args.concurrency)
+    else:
+        # spawn: اتصال‌های SQLite نباید بین پروسه‌ها به اشتراک گذاشته شوند
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=run_worker_process, args=(args.db, modules, args.concurrency))
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import re
+from typing import Dict, Optional
+
+from .broadcast import BroadcastEngine
+from .config import Config
+from .job_queue import on_shutdown, on_startup, task
+from .membership import MembershipVerifier
+from .task_manager import task_manager
+
+logger = logging.getLogger(__name__)
+
+# jobهای پس‌زمینه؛ این ماژول در پروسه‌ی worker import می‌شود (python -m src.job_queue)
+
+
+@on_startup
+async def start_membership_verifier(worker):
+    """بررسی عضویت کانال با bot همین worker و sweep دوره‌ای در پس‌زمینه"""
+    if worker.bot is None:
+        return
+    task_manager.membership = MembershipVerifier(worker.queue.manager, worker.bot)
+    worker.membership_sweeps = asyncio.create_task(task_manager.membership.run_sweeps())
+
+
+@on_shutdown
+async def stop_membership_verifier(worker):
+    sweeps = getattr(worker, "membership_sweeps", None)
+    if sweeps is not None:
+        sweeps.cancel()
+        await asyncio.gather(sweeps, return_exceptions=True)
+
+
+def _required_referrals(task_row: Dict) -> int:
+    """تعداد دعوت لازم برای ماموریت‌های referral (از نام ماموریت، مثل «Invite 5 Friends»)"""
+    match = re.search(r"\d+", task_row['name'])
+    return int(match.group()) if match else 1
+
+
+async def _verify(task_row: Dict, user: Dict) -> Optional[bool]:
+    """بررسی انجام شدن ماموریت با سرویس خارجی مربوط؛ None اگر ماموریت بررسی خودکار ندارد"""
+    if task_row['task_type'] == 'referral':
+        return user['referral_count'] >= _required_referrals(task_row)
+    channel = task_manager.channel_for_task(task_row)
+    if channel:
+        return await task_manager.check_channel_membership(user['telegram_id'], channel)
+    # ماموریت‌های بدون کانال (توئیتر) تا بررسی واقعی پاداش نمی‌گیرند
+    if await asyncio.to_thread(task_manager.verify_twitter_follow, user['telegram_id'], Config.TWITTER_USERNAME):
+        return True
+    return None
+
+
+def _task_result_text(result: Dict) -> str:
+    if result.get('error'):
+        return f"❌ {result['error']}"
+    if result.get('manual'):
+        return (f"⏸ **{result['task']}** can't be verified automatically yet, so no reward was added.\n"
+                f"We'll announce when it can be claimed.")
+    if result['completed']:
+        return f"✅ **{result['task']}** verified!\n💰 +{result['reward']} {Config.TOKEN_SYMBOL} added to your wallet."
+    return (f"⭕ We couldn't verify **{result['task']}** yet.\n"
+            f"Finish the task and send `/complete_{result['task_id']}` again.")
+
+
+@task("verify_task", on_result=_task_result_text,
+      on_failure=lambda error: "⚠️ Verification is temporarily unavailable. Please try again later.")
+async def verify_task(payload: Dict, worker) -> Dict:
+    """بررسی ماموریت و پرداخت پاداش در صورت تایید"""
+    manager = worker.queue.manager
+    user = await asyncio.to_thread(manager.get_user_by_telegram_id, payload['telegram_id'])
+    tasks = {row['id']: row for row in await asyncio.to_thread(manager.get_available_tasks, user['id'])} if user else {}
+    task_row = tasks.get(payload['task_id'])
+    if not task_row:
+        return {'error': "Task not found."}
+    if task_row['completed']:
+        return {'error': f"You have already completed {task_row['name']}."}
+
+    # اگر ثبت پاداش ناموفق باشد retry دوباره وضعیت completed را بررسی می‌کند
+    verified = await _verify(task_row, user)
+    if not verified:
+        return {'completed': False, 'manual': verified is None, 'task': task_row['name'], 'task_id': task_row['id']}
+    if not await asyncio.to_thread(manager.complete_task, user['id'], task_row['id'],
+                                   payload.get('idempotency_key')):
+        raise RuntimeError(f"Could not record completion of task {task_row['id']} for user {user['id']}")
+    return {'completed': True, 'task': task_row['name'], 'task_id': task_row['id'],
+            'reward': task_row['reward_tokens']}
+
+
+@task("prefetch_membership", max_attempts=2)
+async def prefetch_membership(payload: Dict, worker) -> Dict:
+    """گرم کردن cache عضویت قبل از این‌که کاربر درخواست پاداش بدهد"""
+    return {'is_member': await task_manager.check_channel_membership(payload['telegram_id'], payload['channel'])}
+
+
+def _broadcast_text(result: Dict) -> str:
+    return (f"📣 Broadcast job {result['job_id']} finished: {result['scanned']} users "
+            f"({result['users_per_sec']:.0f} users/sec), credited={result['credited']}, "
+            f"notified={result['notified']}, failed={result['failed_notifications']}")
+
+
+@task("broadcast", max_attempts=3, on_result=_broadcast_text)
+async def broadcast(payload: Dict, worker) -> Dict:
+    """اجرای job broadcast/airdrop؛ بعد از retry از آخرین checkpoint ادامه می‌دهد"""
+    engine = BroadcastEngine(worker.queue.manager)
+    bot = worker.bot if payload.get('notify', True) else None
+    return await engine.run(payload['job_id'], bot, payload.get('chunk_size'))
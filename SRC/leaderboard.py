@@ -0,0 +1,89 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ReferralLeaderboard:
+    """لیدربرد referral در حافظه؛ ایندکس مرتب که با هر referral بروز می‌شود"""
+
+    def __init__(self):
+        # کلید مرتب‌سازی: (referral_count DESC, total_tokens DESC, user_id)
+        self._keys: List[Tuple[int, int, int]] = []
+        self._entries: Dict[int, Dict] = {}
+        self._by_telegram_id: Dict[int, int] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(entry: Dict) -> Tuple[int, int, int]:
+        return (-entry['referral_count'], -entry['total_tokens'], entry['user_id'])
+
+    def rebuild(self, rows: Iterable[Tuple]):
+        """بازسازی کامل از دیتابیس؛ rows شامل (user_id, username, telegram_id, referral_count, total_tokens)"""
+        entries = {}
+        for user_id, username, telegram_id, referral_count, total_tokens in rows:
+            if referral_count > 0:
+                entries[user_id] = {
+                    'user_id': user_id,
+                    'username': username,
+                    'telegram_id': telegram_id,
+                    'referral_count': referral_count,
+                    'total_tokens': total_tokens
+                }
+
+        keys = sorted(self._key(entry) for entry in entries.values())
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._by_telegram_id = {e['telegram_id']: e['user_id'] for e in entries.values()}
+
+    def update(self, user_id: int, username: Optional[str], telegram_id: int,
+               referral_count: int, total_tokens: int):
+        """ثبت مقدار جدید یک کاربر (بعد از referral یا تغییر موجودی)"""
+        with self._lock:
+            old = self._entries.get(user_id)
+            if old is not None:
+                index = bisect.bisect_left(self._keys, self._key(old))
+                del self._keys[index]
+                del self._entries[user_id]
+                self._by_telegram_id.pop(old['telegram_id'], None)
+
+            if referral_count <= 0:
+                return
+
+            entry = {
+                'user_id': user_id,
+                'username': username,
+                'telegram_id': telegram_id,
+                'referral_count': referral_count,
+                'total_tokens': total_tokens
+            }
+            bisect.insort(self._keys, self._key(entry))
+            self._entries[user_id] = entry
+            self._by_telegram_id[telegram_id] = user_id
+
+    def update_tokens(self, user_id: int, total_tokens: int):
+        """بروزرسانی موجودی (معیار دوم رتبه‌بندی) فقط برای کاربران داخل لیدربرد"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry['total_tokens'] != total_tokens:
+                self.update(user_id, entry['username'], entry['telegram_id'],
+                            entry['referral_count'], total_tokens)
+
+    def top(self, limit: int = 10, offset: int = 0) -> List[Dict]:
+        """K نفر اول (با offset برای صفحه‌بندی)"""
+        with self._lock:
+            keys = self._keys[offset:offset + limit]
+            return [dict(self._entries[key[2]], rank=offset + i + 1) for i, key in enumerate(keys)]
+
+    def rank_of(self, telegram_id: int) -> Optional[Dict]:
+        """رتبه‌ی یک کاربر؛ None اگر هنوز referral ندارد"""
+        with self._lock:
+            user_id = self._by_telegram_id.get(telegram_id)
+            if user_id is None:
+                return None
+            entry = self._entries[user_id]
+            rank = bisect.bisect_left(self._keys, self._key(entry)) + 1
+            return dict(entry, rank=rank)
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,132 @@
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+from .connection_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LedgerWriter:
+    """group commit: عملیات نوشتنی چند درخواست در یک تراکنش و با یک fsync ثبت می‌شوند"""
+
+    def __init__(self, pool: ConnectionPool, flush_interval_ms: float = 5.0, max_batch: int = 256):
+        self.pool = pool
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._thread.start()
+
+        # آمار برای مانیتورینگ
+        self.batches = 0
+        self.ops = 0
+        self.failed_ops = 0
+        self.max_batch_size = 0
+        self.flush_time = 0.0
+        self.last_flush_time = 0.0
+        self.max_flush_time = 0.0
+
+    def submit(self, op: Callable[[sqlite3.Cursor], Any]) -> Future:
+        """ثبت یک عملیات؛ Future بعد از commit شدن دسته کامل می‌شود"""
+        future = Future()
+        self._queue.put((op, future))
+        return future
+
+    def execute(self, op: Callable[[sqlite3.Cursor], Any], timeout: float = None) -> Any:
+        """ثبت عملیات و انتظار برای تایید durable (بعد از COMMIT)"""
+        return self.submit(op).result(timeout)
+
+    def _collect(self, first) -> list:
+        """جمع کردن دسته تا رسیدن به max_batch یا گذشتن flush_interval"""
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            self._flush(self._collect(first))
+
+    def _flush(self, batch: list):
+        """اجرای یک دسته در یک تراکنش؛ هر عملیات داخل savepoint خودش"""
+        started = time.perf_counter()
+        results = []
+
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    for op, _ in batch:
+                        cursor.execute('SAVEPOINT ledger_op')
+                        try:
+                            results.append((True, op(cursor)))
+                            cursor.execute('RELEASE ledger_op')
+                        except Exception as e:
+                            # فقط همین عملیات برگشت می‌خورد، بقیه‌ی دسته commit می‌شود
+                            cursor.execute('ROLLBACK TO ledger_op')
+                            cursor.execute('RELEASE ledger_op')
+                            results.append((False, e))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            logger.error(f"Ledger batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            self.failed_ops += len(batch)
+            return
+
+        elapsed = time.perf_counter() - started
+        self.batches += 1
+        self.ops += len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.flush_time += elapsed
+        self.last_flush_time = elapsed
+        self.max_flush_time = max(self.max_flush_time, elapsed)
+
+        for (_, future), (ok, value) in zip(batch, results):
+            if ok:
+                future.set_result(value)
+            else:
+                self.failed_ops += 1
+                future.set_exception(value)
+
+    def stats(self) -> Dict:
+        """آمار اندازه دسته و تاخیر flush"""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "ops": self.ops,
+            "failed_ops": self.failed_ops,
+            "avg_batch_size": round(self.ops / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "avg_flush_ms": round(self.flush_time / self.batches * 1000, 3) if self.batches else 0.0,
+            "last_flush_ms": round(self.last_flush_time * 1000, 3),
+            "max_flush_ms": round(self.max_flush_time * 1000, 3),
+        }
+
+    def close(self):
+        """flush کردن باقی‌مانده‌ی صف و توقف thread"""
+        self._queue.put(_STOP)
+        self._thread.join()
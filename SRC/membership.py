@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telegram.constants import ChatMemberStatus
+from telegram.error import BadRequest
+
+from .cache import LRUCache
+from .config import Config
+from .database import DatabaseManager
+from .rate_limit import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+MEMBER_STATUSES = frozenset({ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER})
+
+
+class MembershipVerifier:
+    """بررسی عضویت کانال با getChatMember و cache دو لایه (حافظه + جدول channel_members)
+
+    نتیجه‌ی مثبت positive_ttl و نتیجه‌ی منفی negative_ttl اعتبار دارد. sweep در پس‌زمینه
+    عضوهایی را که اعتبارشان رو به اتمام است دوباره بررسی می‌کند تا درخواست پاداش منتظر API نماند.
+    جدول بین پروسه‌های worker مشترک است.
+    """
+
+    def __init__(self, manager: DatabaseManager, bot, positive_ttl: float = None, negative_ttl: float = None,
+                 concurrency: int = None, cache_size: int = None):
+        self.manager = manager
+        self.bot = bot
+        self.positive_ttl = positive_ttl or Config.MEMBERSHIP_POSITIVE_TTL
+        self.negative_ttl = negative_ttl or Config.MEMBERSHIP_NEGATIVE_TTL
+        self.concurrency = concurrency or Config.MEMBERSHIP_CONCURRENCY
+        self.cache = LRUCache(cache_size or Config.MEMBERSHIP_CACHE_SIZE, self.positive_ttl)
+        self.reads = SingleFlight()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.api_calls = 0
+        self.api_errors = 0
+        self.table_hits = 0
+        self.swept = 0
+
+    def _ttl(self, is_member: bool) -> float:
+        return self.positive_ttl if is_member else self.negative_ttl
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    async def is_member(self, channel: str, telegram_id: int, fresh: bool = False) -> bool:
+        """عضویت کاربر در کانال؛ به ترتیب از حافظه، جدول و در نهایت Bot API"""
+        key = (channel, telegram_id)
+        if not fresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            stored = await asyncio.to_thread(self._load, channel, telegram_id)
+            if stored is not None:
+                self.table_hits += 1
+                is_member, remaining = stored
+                self.cache.set(key, is_member, remaining)
+                return is_member
+
+        results = await self.check_many(channel, [telegram_id])
+        return results[telegram_id]
+
+    async def check_many(self, channel: str, telegram_ids: Iterable[int]) -> Dict[int, bool]:
+        """بررسی گروهی با Bot API (حداکثر concurrency درخواست همزمان) و ذخیره با یک executemany"""
+        telegram_ids = list(dict.fromkeys(telegram_ids))
+        results = await asyncio.gather(*(
+            self.reads.do((channel, telegram_id), lambda telegram_id=telegram_id: self._fetch(channel, telegram_id))
+            for telegram_id in telegram_ids
+        ), return_exceptions=True)
+
+        checked, errors = {}, []
+        for telegram_id, result in zip(telegram_ids, results):
+            if isinstance(result, BaseException):
+                errors.append(result)
+            else:
+                checked[telegram_id] = result
+                self.cache.set((channel, telegram_id), result, self._ttl(result))
+        if checked:
+            await asyncio.to_thread(self._store, channel, checked)
+        if errors:
+            if not checked:
+                raise errors[0]
+            # فقط بخشی از دسته ناموفق بود؛ آن کاربران در نتیجه نیستند
+            logger.error(f"Membership check failed for {len(errors)}/{len(telegram_ids)} users "
+                         f"in {channel}: {errors[0]}")
+        return checked
+
+    async def _fetch(self, channel: str, telegram_id: int) -> bool:
+        async with self._get_slots():
+            self.api_calls += 1
+            try:
+                member = await self.bot.get_chat_member(channel, telegram_id)
+            except BadRequest as e:
+                # کاربری که هرگز ربات یا کانال را ندیده است
+                if "user not found" in e.message.lower() or "participant_id_invalid" in e.message.lower():
+                    return False
+                self.api_errors += 1
+                raise
+            except Exception:
+                self.api_errors += 1
+                raise
+        if member.status == ChatMemberStatus.RESTRICTED:
+            return bool(getattr(member, "is_member", False))
+        return member.status in MEMBER_STATUSES
+
+    def _load(self, channel: str, telegram_id: int) -> Optional[Tuple[bool, float]]:
+        """(is_member، زمان باقی‌مانده) اگر نتیجه‌ی ذخیره شده هنوز معتبر باشد"""
+        with self.manager.get_connection() as conn:
+            row = conn.execute('''
+                SELECT is_member, checked_at FROM channel_members
+                WHERE channel = ? AND telegram_id = ?
+            ''', (channel, telegram_id)).fetchone()
+        if row is None:
+            return None
+        is_member = bool(row[0])
+        remaining = row[1] + self._ttl(is_member) - time.time()
+        return (is_member, remaining) if remaining > 0 else None
+
+    def _store(self, channel: str, results: Dict[int, bool]):
+        now = time.time()
+        self.manager.run_write(lambda cursor: cursor.executemany('''
+            INSERT INTO channel_members (channel, telegram_id, is_member, checked_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (channel, telegram_id) DO UPDATE
+            SET is_member = excluded.is_member, checked_at = excluded.checked_at
+        ''', [(channel, telegram_id, is_member, now) for telegram_id, is_member in results.items()]))
+
+    def _due_for_refresh(self, limit: int) -> List[Tuple[str, int]]:
+        """عضوهایی که بخش زیادی از TTL آن‌ها گذشته است (قدیمی‌ترین اول)"""
+        threshold = time.time() - self.positive_ttl * Config.MEMBERSHIP_REFRESH_RATIO
+        with self.manager.get_connection() as conn:
+            return conn.execute('''
+                SELECT channel, telegram_id FROM channel_members
+                WHERE is_member = 1 AND checked_at < ?
+                ORDER BY checked_at
+                LIMIT ?
+            ''', (threshold, limit)).fetchall()
+
+    async def sweep(self, batch_size: int = None) -> int:
+        """یک دور بررسی دوباره‌ی عضوهای رو به انقضا؛ تعداد کاربران بررسی شده"""
+        due = await asyncio.to_thread(self._due_for_refresh, batch_size or Config.MEMBERSHIP_SWEEP_BATCH)
+        per_channel: Dict[str, List[int]] = {}
+        for channel, telegram_id in due:
+            per_channel.setdefault(channel, []).append(telegram_id)
+
+        checked = 0
+        for channel, telegram_ids in per_channel.items():
+            try:
+                checked += len(await self.check_many(channel, telegram_ids))
+            except Exception as e:
+                logger.error(f"Error sweeping memberships of {channel}: {e}")
+        self.swept += checked
+        return checked
+
+    async def run_sweeps(self, stop: asyncio.Event = None, interval: float = None):
+        """sweep دوره‌ای تا وقتی stop ست شود؛ اگر دسته پر بود بلافاصله دسته‌ی بعدی"""
+        stop = stop or asyncio.Event()
+        interval = interval or Config.MEMBERSHIP_SWEEP_INTERVAL
+        while not stop.is_set():
+            checked = await self.sweep()
+            if checked >= Config.MEMBERSHIP_SWEEP_BATCH:
+                continue
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "cache": self.cache.stats(),
+            "table_hits": self.table_hits,
+            "api_calls": self.api_calls,
+            "api_errors": self.api_errors,
+            "coalesced": self.reads.coalesced,
+            "swept": self.swept,
+        }
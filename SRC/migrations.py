@@ -0,0 +1,556 @@
+import sqlite3
+import logging
+from typing import Callable, List, Tuple, Union
+
+from .config import Config
+from .models import TRANSACTION_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Callable[[sqlite3.Cursor], None]]
+
+
+def _seed_default_tasks(cursor: sqlite3.Cursor):
+    """اضافه کردن ماموریت‌های پیش‌فرض (فقط وقتی جدول خالی است)"""
+    cursor.execute('SELECT 1 FROM tasks LIMIT 1')
+    if cursor.fetchone():
+        return
+
+    default_tasks = [
+        ("Join Telegram Channel", "Join our official Telegram channel", 50, "social"),
+        ("Follow Twitter", "Follow our Twitter account", 30, "social"),
+        ("Retweet Post", "Retweet our latest post", 20, "social"),
+        ("Invite 1 Friend", "Invite one friend to join", 25, "referral"),
+        ("Invite 5 Friends", "Invite five friends to join", 150, "referral"),
+        ("Join Announcement Channel", "Join our announcement channel", 40, "social")
+    ]
+
+    cursor.executemany('''
+        INSERT INTO tasks (name, description, reward_tokens, task_type)
+        VALUES (?, ?, ?, ?)
+    ''', default_tasks)
+
+
+def _unlink_duplicate_wallets(cursor: sqlite3.Cursor):
+    """هر کیف پول فقط به یک کاربر؛ از کاربرانی که یک آدرس مشترک دارند فقط آخرین بروزرسانی شده نگه داشته می‌شود"""
+    cursor.execute('''
+        SELECT lower(wallet_address), group_concat(id) FROM (
+            SELECT id, wallet_address FROM users
+            WHERE wallet_address IS NOT NULL
+            ORDER BY updated_at DESC, id DESC
+        )
+        GROUP BY lower(wallet_address)
+        HAVING COUNT(*) > 1
+    ''')
+    for wallet, user_ids in cursor.fetchall():
+        keep, *unlink = [int(user_id) for user_id in user_ids.split(",")]
+        logger.warning(f"Wallet {wallet} was linked to users {user_ids}; keeping user {keep}")
+        cursor.executemany('UPDATE users SET wallet_address = NULL WHERE id = ?', [(user_id,) for user_id in unlink])
+
+
+def _backfill_deposit_remainders(cursor: sqlite3.Cursor):
+    """کسر کمتر از یک توکن واریزهای قبلی که با تقسیم صحیح دور ریخته شده بود"""
+    unit = 10 ** Config.TOKEN_DECIMALS
+    remainders = {}
+    for user_id, value in cursor.execute('''
+        SELECT user_id, value FROM chain_transfers WHERE transaction_id IS NOT NULL
+    ''').fetchall():
+        remainders[user_id] = remainders.get(user_id, 0) + int(value) % unit
+    # مجموع کسرها ممکن است از یک توکن بیشتر شود؛ با واریز بعدی اعتبار می‌گیرد
+    cursor.executemany('INSERT INTO deposit_remainders (user_id, remainder) VALUES (?, ?)',
+                       [(user_id, remainder) for user_id, remainder in remainders.items() if remainder])
+
+
+def _seed_task_channels(cursor: sqlite3.Cursor):
+    """کانال عضویت ماموریت‌های پیش‌فرض؛ ماموریت‌های توئیتر کانال ندارند و خودکار تایید نمی‌شوند"""
+    cursor.executemany('UPDATE tasks SET channel = ? WHERE name = ? AND channel IS NULL', [
+        (Config.TELEGRAM_CHANNEL, "Join Telegram Channel"),
+        (Config.ANNOUNCEMENT_CHANNEL, "Join Announcement Channel"),
+    ])
+
+
+# لیست migrationها به ترتیب نسخه؛ migrationهای قبلی هرگز ویرایش نمی‌شوند
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "initial schema", [
+        # جدول کاربران
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE,
+            username TEXT,
+            referral_code TEXT UNIQUE,
+            invited_by INTEGER,
+            wallet_address TEXT,
+            total_tokens INTEGER DEFAULT 0,
+            is_verified BOOLEAN DEFAULT FALSE,
+            api_key TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # جدول ماموریت‌ها
+        '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            description TEXT,
+            reward_tokens INTEGER,
+            task_type TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # جدول ماموریت‌های انجام شده
+        '''
+        CREATE TABLE IF NOT EXISTS completed_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            task_id INTEGER,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (task_id) REFERENCES tasks (id),
+            UNIQUE(user_id, task_id)
+        )
+        ''',
+        # جدول دعوت‌ها
+        '''
+        CREATE TABLE IF NOT EXISTS referrals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            inviter_id INTEGER,
+            invited_id INTEGER,
+            tokens_earned INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (inviter_id) REFERENCES users (id),
+            FOREIGN KEY (invited_id) REFERENCES users (id),
+            UNIQUE(invited_id)
+        )
+        ''',
+        # جدول تراکنش‌ها
+        '''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            transaction_type TEXT, -- 'task_reward', 'referral_bonus', 'withdrawal'
+            amount INTEGER,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        _seed_default_tasks,
+    ]),
+    (2, "indexes for hot lookups", [
+        # completed_tasks(user_id, task_id) از قبل با UNIQUE ایندکس دارد
+        'CREATE INDEX IF NOT EXISTS idx_referrals_inviter ON referrals (inviter_id, tokens_earned)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_user_created ON transactions (user_id, created_at)',
+    ]),
+    (3, "denormalized per-user counters", [
+        'ALTER TABLE users ADD COLUMN referral_count INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE users ADD COLUMN completed_tasks_count INTEGER NOT NULL DEFAULT 0',
+        '''
+        UPDATE users SET
+            referral_count = (SELECT COUNT(*) FROM referrals r WHERE r.inviter_id = users.id),
+            completed_tasks_count = (SELECT COUNT(*) FROM completed_tasks ct WHERE ct.user_id = users.id)
+        ''',
+    ]),
+    (4, "leaderboard rank index", [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_users_leaderboard
+        ON users (referral_count DESC, total_tokens DESC)
+        WHERE referral_count > 0
+        ''',
+    ]),
+    (5, "idempotency keys for task completion", [
+        'ALTER TABLE completed_tasks ADD COLUMN idempotency_key TEXT',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_completed_tasks_idempotency
+        ON completed_tasks (idempotency_key)
+        WHERE idempotency_key IS NOT NULL
+        ''',
+    ]),
+    (6, "broadcast / airdrop jobs with checkpoints", [
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            message TEXT,
+            amount INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            credited_through INTEGER NOT NULL DEFAULT 0,
+            notified_through INTEGER NOT NULL DEFAULT 0,
+            credited INTEGER NOT NULL DEFAULT 0,
+            notified INTEGER NOT NULL DEFAULT 0,
+            failed_notifications INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP
+        )
+        ''',
+    ]),
+    (7, "background job queue", [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            dedup_key TEXT,
+            status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'done', 'failed'
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_at REAL NOT NULL,
+            locked_by TEXT,
+            locked_until REAL,
+            chat_id INTEGER,
+            message_id INTEGER,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)',
+        # فقط یک job فعال برای هر dedup_key؛ بعد از پایان job همان کلید دوباره قابل استفاده است
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup
+        ON jobs (dedup_key)
+        WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running')
+        ''',
+    ]),
+    (8, "channel membership checks", [
+        '''
+        CREATE TABLE IF NOT EXISTS channel_members (
+            channel TEXT NOT NULL,
+            telegram_id INTEGER NOT NULL,
+            is_member BOOLEAN NOT NULL,
+            checked_at REAL NOT NULL,
+            PRIMARY KEY (channel, telegram_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_channel_members_sweep ON channel_members (is_member, checked_at)',
+    ]),
+    (9, "wallet connection nonces", [
+        # هر کاربر حداکثر یک challenge باز دارد؛ challenge جدید قبلی را باطل می‌کند
+        '''
+        CREATE TABLE IF NOT EXISTS wallet_nonces (
+            user_id INTEGER PRIMARY KEY,
+            nonce TEXT NOT NULL,
+            wallet_address TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+    (10, "withdrawals and on-chain batches", [
+        # هر دسته یک تراکنش Disperse است؛ تراکنش امضا شده قبل از ارسال ذخیره می‌شود تا بعد از crash
+        # با همان nonce دوباره ارسال شود
+        '''
+        CREATE TABLE IF NOT EXISTS withdrawal_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nonce INTEGER NOT NULL UNIQUE,
+            tx_hash TEXT NOT NULL,
+            raw_transaction BLOB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'signed',
+            size INTEGER NOT NULL,
+            total_amount INTEGER NOT NULL,
+            gas_used INTEGER,
+            block_number INTEGER,
+            sent_at REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_withdrawal_batches_status ON withdrawal_batches (status)',
+        '''
+        CREATE TABLE IF NOT EXISTS withdrawals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            to_address TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            batch_id INTEGER,
+            transaction_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (batch_id) REFERENCES withdrawal_batches (id),
+            FOREIGN KEY (transaction_id) REFERENCES transactions (id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_withdrawals_status ON withdrawals (status, batch_id, id)',
+        'CREATE INDEX IF NOT EXISTS idx_withdrawals_batch ON withdrawals (batch_id)',
+        'CREATE INDEX IF NOT EXISTS idx_withdrawals_user ON withdrawals (user_id, id)',
+    ]),
+    (11, "on-chain transfer indexer", [
+        # هر log یک بار ثبت می‌شود (tx_hash, log_index)؛ مقدار uint256 در INTEGER جا نمی‌شود
+        '''
+        CREATE TABLE IF NOT EXISTS chain_transfers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_hash TEXT NOT NULL,
+            log_index INTEGER NOT NULL,
+            block_number INTEGER NOT NULL,
+            from_address TEXT NOT NULL,
+            to_address TEXT NOT NULL,
+            value TEXT NOT NULL,
+            user_id INTEGER,
+            transaction_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (tx_hash, log_index),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (transaction_id) REFERENCES transactions (id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_chain_transfers_block ON chain_transfers (block_number)',
+        # آدرس‌های log با حروف کوچک مقایسه می‌شوند
+        'CREATE INDEX IF NOT EXISTS idx_users_wallet ON users (lower(wallet_address))',
+        '''
+        CREATE TABLE IF NOT EXISTS indexer_checkpoints (
+            name TEXT PRIMARY KEY,
+            block_number INTEGER NOT NULL,
+            block_hash TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (12, "rich transaction columns", [
+        # ADD COLUMN با مقدار پیش‌فرض ثابت جدول را بازنویسی نمی‌کند
+        "ALTER TABLE transactions ADD COLUMN status TEXT NOT NULL DEFAULT 'completed'",
+        'ALTER TABLE transactions ADD COLUMN related_task_id INTEGER REFERENCES tasks (id)',
+        'ALTER TABLE transactions ADD COLUMN related_referral_id INTEGER REFERENCES referrals (id)',
+        'ALTER TABLE transactions ADD COLUMN wallet_address TEXT',
+        'ALTER TABLE transactions ADD COLUMN transaction_hash TEXT',
+        'ALTER TABLE transactions ADD COLUMN metadata TEXT',
+        # ردیف‌های برداشت وضعیت و آدرس خود را از withdrawals می‌گیرند
+        '''
+        UPDATE transactions
+        SET status = CASE w.status WHEN 'failed' THEN 'failed'
+                                   WHEN 'completed' THEN 'completed' ELSE 'pending' END,
+            wallet_address = w.to_address,
+            transaction_hash = b.tx_hash
+        FROM withdrawals w
+        LEFT JOIN withdrawal_batches b ON b.id = w.batch_id
+        WHERE w.transaction_id = transactions.id
+        ''',
+        '''
+        UPDATE transactions
+        SET wallet_address = c.from_address, transaction_hash = c.tx_hash
+        FROM chain_transfers c
+        WHERE c.transaction_id = transactions.id
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (status, id)',
+    ]),
+    (13, "one user per wallet", [
+        _unlink_duplicate_wallets,
+        'DROP INDEX IF EXISTS idx_users_wallet',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_users_wallet ON users (lower(wallet_address))',
+    ]),
+    (14, "cross-process user change feed", [
+        # AUTOINCREMENT: بعد از prune شدن همه‌ی ردیف‌ها id تکراری (کمتر از cursor خواننده‌ها) ساخته نمی‌شود
+        '''
+        CREATE TABLE IF NOT EXISTS user_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            telegram_id INTEGER,
+            user_id INTEGER,
+            created_at REAL NOT NULL
+        )
+        ''',
+    ]),
+    (15, "withdrawal fee bumping", [
+        # فیلدهای کارمزد تراکنش فعلی (gasPrice یا maxFeePerGas/maxPriorityFeePerGas) به صورت JSON
+        'ALTER TABLE withdrawal_batches ADD COLUMN fees TEXT',
+        'ALTER TABLE withdrawal_batches ADD COLUMN signed_at REAL',
+        # hashهای جایگزین شده با همان nonce؛ هر کدام ممکن است به جای hash فعلی mine شود
+        'ALTER TABLE withdrawal_batches ADD COLUMN replaced_tx_hashes TEXT',
+    ]),
+    (16, "exact deposit crediting", [
+        # کسر کمتر از یک توکن هر کاربر (کمتر از 10**TOKEN_DECIMALS، در INTEGER جا می‌شود) تا واریز بعدی
+        '''
+        CREATE TABLE IF NOT EXISTS deposit_remainders (
+            user_id INTEGER PRIMARY KEY,
+            remainder INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        _backfill_deposit_remainders,
+        # واریزهای اعتبار نگرفته (user_id خالی) برای کیف پولی که بعدا وصل می‌شود
+        'CREATE INDEX IF NOT EXISTS idx_chain_transfers_unlinked ON chain_transfers (from_address) WHERE user_id IS NULL',
+    ]),
+    (17, "per-task membership channel", [
+        # کانال Telegram که عضویت در آن ماموریت را کامل می‌کند (NULL: بررسی خودکار ندارد)
+        'ALTER TABLE tasks ADD COLUMN channel TEXT',
+        _seed_task_channels,
+    ]),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """نسخه فعلی schema ثبت شده در دیتابیس"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn: sqlite3.Connection, migrations=None) -> int:
+    """اجرای migrationهای اعمال نشده؛ هر نسخه در یک تراکنش جدا"""
+    migrations = MIGRATIONS if migrations is None else migrations
+    current = get_schema_version(conn)
+
+    for version, description, steps in migrations:
+        if version <= current:
+            continue
+
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # ممکن است پروسه‌ی دیگری همزمان همین نسخه را اعمال کرده باشد
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+
+            cursor.execute('''
+                INSERT INTO schema_migrations (version, description)
+                VALUES (?, ?)
+            ''', (version, description))
+            conn.commit()
+            logger.info(f"Applied migration {version}: {description}")
+
+        except Exception:
+            conn.rollback()
+            logger.error(f"Migration {version} ({description}) failed")
+            raise
+
+    return get_schema_version(conn)
+
+
+# کوئری‌های پرتکرار که نباید به full scan برگردند (باید با database.py هماهنگ بمانند)
+HOT_QUERIES = {
+    "get_user_by_telegram_id": (
+        'SELECT * FROM users WHERE telegram_id = ?', (1,)
+    ),
+    "get_user_by_api_key": (
+        'SELECT telegram_id FROM users WHERE api_key = ?', ("LFE_API_1",)
+    ),
+    "get_user_by_referral_code": (
+        'SELECT * FROM users WHERE referral_code = ?', ("LFE1",)
+    ),
+    "completed_task_lookup": ('''
+        SELECT 1 FROM completed_tasks
+        WHERE user_id = ? AND task_id = ?
+    ''', (1, 1)),
+    "get_completed_task_bits": (
+        'SELECT task_id FROM completed_tasks WHERE user_id = ?', (1,)
+    ),
+    "get_user_transactions": ('''
+        SELECT id, transaction_type, amount, description, created_at
+        FROM transactions
+        WHERE user_id = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', (1, 10)),
+    "transactions_page_older": ('''
+        SELECT id, transaction_type, amount, description, created_at
+        FROM transactions
+        WHERE user_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', (1, '2030-01-01 00:00:00', 1, 11)),
+    "transactions_page_newer": ('''
+        SELECT id, transaction_type, amount, description, created_at
+        FROM transactions
+        WHERE user_id = ? AND (created_at, id) > (?, ?)
+        ORDER BY created_at ASC, id ASC
+        LIMIT ?
+    ''', (1, '2020-01-01 00:00:00', 1, 11)),
+    "transactions_by_status": (f'''
+        SELECT {", ".join(TRANSACTION_COLUMNS)}
+        FROM transactions
+        WHERE status = ? AND id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', ('pending', 0, 100)),
+    "user_transactions_by_status": (f'''
+        SELECT {", ".join(TRANSACTION_COLUMNS)}
+        FROM transactions
+        WHERE user_id = ? AND status = ?
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', (1, 'pending', 10)),
+    "get_referral_stats": ('''
+        SELECT COUNT(*) as total_referrals,
+               COALESCE(SUM(tokens_earned), 0) as total_earned
+        FROM referrals
+        WHERE inviter_id = ?
+    ''', (1,)),
+    "claim_jobs": ('''
+        SELECT id FROM jobs
+        WHERE status = 'queued' AND run_at <= ?
+        ORDER BY run_at
+        LIMIT ?
+    ''', (0.0, 8)),
+    "membership_sweep": ('''
+        SELECT channel, telegram_id FROM channel_members
+        WHERE is_member = 1 AND checked_at < ?
+        ORDER BY checked_at
+        LIMIT ?
+    ''', (0.0, 500)),
+    "pending_withdrawals": ('''
+        SELECT id, user_id, amount, to_address FROM withdrawals
+        WHERE status = 'pending' AND batch_id IS NULL
+        ORDER BY id
+        LIMIT ?
+    ''', (200,)),
+    "in_flight_withdrawal_batches": ('''
+        SELECT nonce, id, tx_hash, raw_transaction, status, sent_at, signed_at, fees, replaced_tx_hashes
+        FROM withdrawal_batches
+        WHERE status IN ('signed', 'sent')
+    ''', ()),
+    "users_by_wallet": (
+        'SELECT id, telegram_id FROM users WHERE lower(wallet_address) = ?', ("0x" + "00" * 20,)
+    ),
+    "uncredited_transfers": ('''
+        SELECT id, tx_hash, log_index, block_number, from_address, value FROM chain_transfers
+        WHERE block_number BETWEEN ? AND ? AND user_id IS NULL
+    ''', (0, 100)),
+    "wallet_uncredited_transfers": ('''
+        SELECT id, tx_hash, log_index, block_number, from_address, value FROM chain_transfers
+        WHERE from_address = ? AND user_id IS NULL
+    ''', ("0x" + "00" * 20,)),
+    "reorged_transfers": ('''
+        SELECT id, user_id, transaction_id, value FROM chain_transfers WHERE block_number >= ?
+    ''', (100,)),
+    "user_changes_since": (
+        'SELECT id, origin, telegram_id, user_id FROM user_changes WHERE id > ? ORDER BY id LIMIT ?', (0, 1000)
+    ),
+    "broadcast_users_chunk": (
+        'SELECT id, telegram_id FROM users WHERE id > ? ORDER BY id LIMIT ?', (0, 500)
+    ),
+}
+
+
+def check_query_plans(conn: sqlite3.Connection, queries=None) -> List[str]:
+    """بررسی EXPLAIN QUERY PLAN؛ لیست کوئری‌هایی که full scan یا B-tree موقت (sort/group/distinct) دارند"""
+    queries = HOT_QUERIES if queries is None else queries
+    problems = []
+
+    for name, (sql, params) in queries.items():
+        rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        for row in rows:
+            detail = row[-1]
+            if (detail.startswith('SCAN') and detail != 'SCAN CONSTANT ROW') \
+                    or detail.startswith('USE TEMP B-TREE'):
+                problems.append(f"{name}: {detail}")
+
+    return problems
@@ -1,11 +1,13 @@
 from .user import User
 from .task import Task
-from .transaction import Transaction, TransactionType, TransactionStatus
+from .transaction import TRANSACTION_COLUMNS, Transaction, TransactionType, TransactionStatus, transaction_factory
 
 __all__ = [
     'User', 
     'Task', 
     'Transaction', 
     'TransactionType', 
-    'TransactionStatus'
+    'TransactionStatus',
+    'TRANSACTION_COLUMNS',
+    'transaction_factory'
 ]
@@ -1,6 +1,7 @@
+import json
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Sequence
 from enum import Enum
 
 class TransactionType(Enum):
@@ -10,6 +11,7 @@ class TransactionType(Enum):
     WITHDRAWAL = "withdrawal"
     AIRDROP = "airdrop"
     MANUAL_ADJUSTMENT = "manual_adjustment"
+    DEPOSIT = "deposit"
 
 class TransactionStatus(Enum):
     PENDING = "pending"
@@ -17,6 +19,17 @@ class TransactionStatus(Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+# ترتیب ستون‌ها برای Transaction.from_row (همان ترتیب فیلدهای dataclass)
+TRANSACTION_COLUMNS = (
+    "id", "user_id", "transaction_type", "amount", "description", "status", "created_at",
+    "related_task_id", "related_referral_id", "wallet_address", "transaction_hash", "metadata",
+)
+
+# Enum(value) برای هر ردیف کند است؛ جستجوی مستقیم در dict
+_TYPES = {member.value: member for member in TransactionType}
+_STATUSES = {member.value: member for member in TransactionStatus}
+
+
 @dataclass
 class Transaction:
     id: Optional[int]
@@ -34,6 +47,19 @@ class Transaction:
     transaction_hash: Optional[str] = None
     metadata: Optional[dict] = None
     
+    @classmethod
+    def from_row(cls, row: Sequence) -> "Transaction":
+        """ساخت مستقیم از tuple دیتابیس با ترتیب TRANSACTION_COLUMNS (بدون dict میانی)"""
+        return cls(row[0], row[1], _TYPES[row[2]], row[3], row[4], _STATUSES[row[5]],
+                   datetime.fromisoformat(row[6]) if row[6] else None,
+                   row[7], row[8], row[9], row[10], json.loads(row[11]) if row[11] else None)
+    
+    def to_row(self) -> tuple:
+        """مقادیر برای INSERT با ترتیب TRANSACTION_COLUMNS بدون id و created_at"""
+        return (self.user_id, self.transaction_type.value, self.amount, self.description, self.status.value,
+                self.related_task_id, self.related_referral_id, self.wallet_address, self.transaction_hash,
+                json.dumps(self.metadata) if self.metadata else None)
+    
     def to_dict(self):
         """تبدیل به دیکشنری"""
         return {
@@ -63,7 +89,8 @@ class Transaction:
             TransactionType.WELCOME_BONUS: "🎁",
             TransactionType.WITHDRAWAL: "💳",
             TransactionType.AIRDROP: "🎯",
-            TransactionType.MANUAL_ADJUSTMENT: "⚙️"
+            TransactionType.MANUAL_ADJUSTMENT: "⚙️",
+            TransactionType.DEPOSIT: "📥"
         }
         return emoji_map.get(self.transaction_type, "📊")
     
@@ -128,3 +155,8 @@ class Transaction:
     def mark_failed(self):
         """علامت گذاری به عنوان failed"""
         self.status = TransactionStatus.FAILED
+
+
+def transaction_factory(cursor, row) -> Transaction:
+    """row_factory برای cursorهایی که ستون‌های TRANSACTION_COLUMNS را select می‌کنند"""
+    return Transaction.from_row(row)
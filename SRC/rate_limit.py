@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TokenBucketLimiter:
+    """token bucket برای هر کلید (telegram_id, command) با حافظه‌ی محدود (LRU)"""
+
+    def __init__(self, rate: float = 1.0, burst: int = 5, maxsize: int = 100000,
+                 rules: Optional[Dict[str, Tuple[float, int]]] = None):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        # command -> (rate, burst) برای دستورهایی که محدودیت متفاوت دارند
+        self.rules = rules or {}
+        # key -> [tokens, last_refill, rejections]
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def acquire(self, telegram_id: int, command: str) -> Tuple[bool, int]:
+        """مصرف یک token؛ (مجاز بودن، تعداد ردهای پشت سر هم)"""
+        rate, burst = self.rules.get(command, (self.rate, self.burst))
+        key = (telegram_id, command)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now, 0]
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                bucket[2] = 0
+                self.allowed += 1
+                return True, 0
+
+            bucket[2] += 1
+            self.limited += 1
+            return False, bucket[2]
+
+    def stats(self) -> Dict:
+        """آمار محدودکننده برای مانیتورینگ"""
+        return {
+            "keys": len(self._buckets),
+            "maxsize": self.maxsize,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions,
+        }
+
+
+class SingleFlight:
+    """ادغام درخواست‌های یکسان همزمان؛ فقط اولی اجرا می‌شود و بقیه همان نتیجه را می‌گیرند"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.calls += 1
+        future = asyncio.ensure_future(func())
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(key, None)
+            else:
+                # اگر فراخواننده لغو شد بقیه همچنان منتظر نتیجه‌اند
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    def stats(self) -> Dict:
+        return {
+            "inflight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
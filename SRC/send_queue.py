@@ -0,0 +1,284 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# اولویت‌ها: پاسخ به کاربر قبل از ارسال‌های گروهی (اعلان‌ها، airdrop)
+INTERACTIVE = 0
+BULK = 1
+
+EDIT_METHODS = frozenset({"editMessageText", "editMessageReplyMarkup", "editMessageCaption"})
+
+
+def _is_message_method(endpoint: str) -> bool:
+    """فقط ارسال و ویرایش پیام‌ها مشمول محدودیت flood هر چت هستند (نه getChatMember و ...)"""
+    return endpoint.startswith(("send", "copy", "forward")) or endpoint in EDIT_METHODS
+
+
+class _Job:
+    __slots__ = ("args", "kwargs", "callback", "endpoint", "chat_id", "priority", "future",
+                 "enqueued_at", "retries", "edit_key")
+
+    def __init__(self, callback, args, kwargs, endpoint, chat_id, priority, edit_key):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.endpoint = endpoint
+        self.chat_id = chat_id
+        self.priority = priority
+        self.edit_key = edit_key
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.perf_counter()
+        self.retries = 0
+
+
+class SendScheduler(BaseRateLimiter[Dict]):
+    """صف ارسال پیام‌ها با سقف سراسری، فاصله‌ی هر چت، اولویت و رعایت retry_after
+
+    از طریق Application.builder().rate_limiter() همه‌ی درخواست‌های Bot API از آن عبور می‌کنند.
+    برای ارسال گروهی: bot.send_message(..., rate_limit_args={"priority": BULK})
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_interval: float = 1.0, group_interval: float = 3.0,
+                 chat_burst: int = 3, max_retries: int = 3, max_bulk_pending: int = 1000):
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_bulk_pending = max_bulk_pending
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._edits: Dict[tuple, _Job] = {}
+        # chat_id -> [tokens, last_refill]؛ token bucket کوچک برای هر چت (فقط چت‌های اخیر)
+        self._chats: Dict[Any, list] = {}
+        self._next_send = 0.0
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._bulk_slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+        # آمار برای مانیتورینگ
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.latencies = deque(maxlen=10000)
+        self.latency_max = 0.0
+
+    @classmethod
+    def from_config(cls) -> "SendScheduler":
+        """ساخت scheduler با تنظیمات SEND_* از Config"""
+        return cls(
+            global_rate=Config.SEND_GLOBAL_RATE,
+            chat_interval=Config.SEND_CHAT_INTERVAL,
+            group_interval=Config.SEND_GROUP_INTERVAL,
+            chat_burst=Config.SEND_CHAT_BURST,
+            max_retries=Config.SEND_MAX_RETRIES,
+            max_bulk_pending=Config.SEND_MAX_BULK_PENDING
+        )
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._bulk_slots = asyncio.Semaphore(self.max_bulk_pending)
+        self._dispatcher = asyncio.create_task(self._run(), name="send-scheduler")
+
+    async def shutdown(self) -> None:
+        """ارسال باقی‌مانده‌ی صف و توقف dispatcher"""
+        while self._heap or self._inflight:
+            await asyncio.sleep(0.05)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict],
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None or not _is_message_method(endpoint):
+            # getMe، answerCallbackQuery، getChatMember و ... محدودیت پیام ندارند
+            return await self._call_with_retry(callback, args, kwargs)
+
+        priority = (rate_limit_args or {}).get("priority", INTERACTIVE)
+
+        # چند edit پشت سر هم روی یک پیام: فقط آخرین نسخه ارسال می‌شود
+        edit_key = (endpoint, chat_id, data.get("message_id")) if endpoint in EDIT_METHODS else None
+        if edit_key is not None:
+            pending = self._edits.get(edit_key)
+            if pending is not None:
+                pending.args = args
+                pending.kwargs = kwargs
+                self.coalesced += 1
+                return await asyncio.shield(pending.future)
+
+        if priority == BULK:
+            await self._bulk_slots.acquire()
+        job = _Job(callback, args, kwargs, endpoint, chat_id, priority, edit_key)
+        if edit_key is not None:
+            self._edits[edit_key] = job
+        self._push(job)
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            # فراخواننده منصرف شده (مثلا توقف broadcast)؛ کار از صف حذف می‌شود و ارسال نمی‌شود
+            if edit_key is None and not job.future.done():
+                job.future.cancel()
+            raise
+        finally:
+            if priority == BULK:
+                self._bulk_slots.release()
+
+    def _push(self, job: _Job):
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        self._wakeup.set()
+
+    def _interval(self, chat_id) -> float:
+        # گروه‌ها (chat_id منفی) حدود 20 پیام در دقیقه
+        return self.group_interval if str(chat_id).startswith("-") else self.chat_interval
+
+    def _chat_wait(self, chat_id, now: float) -> float:
+        """زمان انتظار تا آزاد شدن یک token برای این چت (0 یعنی آماده)"""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            return 0.0
+        interval = self._interval(chat_id)
+        tokens = min(self.chat_burst, bucket[0] + (now - bucket[1]) / interval)
+        return 0.0 if tokens >= 1.0 else (1.0 - tokens) * interval
+
+    def _take_chat_token(self, chat_id, now: float):
+        bucket = self._chats.get(chat_id)
+        interval = self._interval(chat_id)
+        if bucket is None:
+            self._chats[chat_id] = [self.chat_burst - 1.0, now]
+        else:
+            bucket[0] = min(self.chat_burst, bucket[0] + (now - bucket[1]) / interval) - 1.0
+            bucket[1] = now
+
+        if len(self._chats) > 10000:
+            # چت‌هایی که bucket آن‌ها دوباره پر شده نیازی به نگه‌داری ندارند
+            self._chats = {chat: b for chat, b in self._chats.items()
+                           if b[0] + (now - b[1]) / self._interval(chat) < self.chat_burst}
+
+    def _next_job(self):
+        """انتخاب اولین کار با بالاترین اولویت که چتش آماده است؛ (job, زمان انتظار)"""
+        now = time.monotonic()
+        wait = max(self._paused_until, self._next_send) - now
+        if wait > 0:
+            return None, wait
+        if not self._heap:
+            return None, None
+
+        deferred = []
+        found = None
+        wait = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[2].future.done():
+                continue
+            chat_wait = self._chat_wait(entry[2].chat_id, now)
+            if chat_wait <= 0:
+                found = entry[2]
+                break
+            deferred.append(entry)
+            wait = chat_wait if wait is None else min(wait, chat_wait)
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+
+        if found is not None:
+            self._next_send = now + self.global_interval
+            self._take_chat_token(found.chat_id, now)
+        return found, wait
+
+    async def _run(self):
+        while True:
+            job, wait = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if job.edit_key is not None:
+                self._edits.pop(job.edit_key, None)
+            task = asyncio.create_task(self._send(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, job: _Job):
+        try:
+            result = await job.callback(*job.args, **job.kwargs)
+        except RetryAfter as e:
+            # کل ارسال‌ها تا پایان retry_after متوقف می‌شوند و همین کار دوباره در صف قرار می‌گیرد
+            self.flood_waits += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after + 0.1)
+            if job.retries < self.max_retries:
+                job.retries += 1
+                self.retries += 1
+                self._push(job)
+                return
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+
+        latency = time.perf_counter() - job.enqueued_at
+        self.sent += 1
+        self.latencies.append(latency)
+        self.latency_max = max(self.latency_max, latency)
+        if not job.future.done():
+            job.future.set_result(result)
+
+    async def _call_with_retry(self, callback, args, kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.flood_waits += 1
+                await asyncio.sleep(e.retry_after + 0.1)
+
+    def stats(self) -> Dict:
+        """عمق صف، تعداد ارسال و تاخیر (از ورود به صف تا پاسخ Telegram)"""
+        latencies = sorted(self.latencies)
+        pick = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 3) if latencies else 0.0
+        return {
+            "queue_depth": len(self._heap),
+            "in_flight": len(self._inflight),
+            "pending_edits": len(self._edits),
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced_edits": self.coalesced,
+            "retries": self.retries,
+            "flood_waits": self.flood_waits,
+            "p50_latency_ms": pick(0.50),
+            "p99_latency_ms": pick(0.99),
+            "max_latency_ms": round(self.latency_max * 1000, 3),
+        }
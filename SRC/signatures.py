@@ -0,0 +1,57 @@
+"""بررسی امضای personal_sign (EIP-191) در process pool
+
+این ماژول عمدا فقط eth_account را import می‌کند: workerهای spawn برای unpickle کردن verify_chunk آن را
+import می‌کنند و نباید دیتابیس global، migrationها یا thread تغییر کاربران را دوباره بسازند.
+"""
+import multiprocessing
+import sys
+import types
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+# (address, signature, message)
+SignatureItem = Tuple[str, str, str]
+
+
+def recover_signer(message: str, signature: str) -> Optional[str]:
+    """آدرس امضاکننده‌ی پیام personal_sign (EIP-191)؛ None اگر امضا قابل بازیابی نباشد"""
+    try:
+        return Account.recover_message(encode_defunct(text=message), signature=signature)
+    except Exception:
+        return None
+
+
+def signed_by(address: str, signature: str, message: str) -> bool:
+    recovered = recover_signer(message, signature)
+    return recovered is not None and recovered.lower() == address.lower()
+
+
+def verify_chunk(items: Sequence[SignatureItem]) -> List[bool]:
+    """بررسی یک دسته امضا (در پروسه‌ی pool اجرا می‌شود)"""
+    return [signed_by(address, signature, message) for address, signature, message in items]
+
+
+def start_pool(workers: int) -> ProcessPoolExecutor:
+    """pool با spawn که همه‌ی workerها همین حالا و بدون اجرای دوباره‌ی ماژول اصلی ساخته می‌شوند
+
+    spawn ماژول __main__ (مثلا python -m src.bot) را در هر worker دوباره اجرا می‌کند؛ هنگام ساخت
+    پروسه‌ها یک __main__ خالی جایگزین می‌شود تا worker فقط همین ماژول را import کند. pool پروسه‌ها را
+    تا max_workers فقط هنگام submit می‌سازد، پس بعد از این تابع پروسه‌ی دیگری ساخته نمی‌شود.
+    """
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        futures = [pool.submit(verify_chunk, []) for _ in range(workers)]
+    finally:
+        sys.modules["__main__"] = main
+    try:
+        for future in futures:
+            future.result()
+    except Exception:
+        pool.shutdown()
+        raise
+    return pool
@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from .cache import LRUCache
+
+
+class TaskCatalogCache:
+    """cache کاتالوگ ماموریت‌های فعال و bitset ماموریت‌های انجام شده‌ی هر کاربر"""
+
+    def __init__(self, catalog_ttl: float = 300.0, completions_size: int = 50000,
+                 completions_ttl: float = 60.0, enabled: bool = True):
+        self.catalog_ttl = catalog_ttl
+        self.enabled = enabled
+        self._tasks: Optional[List[Dict]] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        # user_id -> int که بیت task_id آن یعنی ماموریت انجام شده
+        self.completions = LRUCache(completions_size, completions_ttl, enabled)
+
+        self.catalog_loads = 0
+
+    # ===== CATALOG =====
+
+    def get_tasks(self) -> Optional[List[Dict]]:
+        """کاتالوگ cache شده یا None اگر باید دوباره خوانده شود"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._tasks is None or self._expires_at < time.monotonic():
+                return None
+            return self._tasks
+
+    def set_tasks(self, tasks: List[Dict]):
+        """ذخیره کاتالوگ ماموریت‌های فعال"""
+        with self._lock:
+            self._tasks = tasks
+            self._expires_at = time.monotonic() + self.catalog_ttl
+            self.catalog_loads += 1
+
+    def invalidate_catalog(self):
+        """بعد از اضافه یا غیرفعال کردن ماموریت"""
+        with self._lock:
+            self._tasks = None
+
+    # ===== COMPLETIONS =====
+
+    @staticmethod
+    def to_bits(task_ids: Iterable[int]) -> int:
+        bits = 0
+        for task_id in task_ids:
+            bits |= 1 << task_id
+        return bits
+
+    def get_completed(self, user_id: int) -> Optional[int]:
+        return self.completions.get(user_id)
+
+    def set_completed(self, user_id: int, bits: int):
+        self.completions.set(user_id, bits)
+
+    def mark_completed(self, user_id: int, task_id: int):
+        """اضافه کردن بیت ماموریت (فقط اگر bitset کاربر در cache باشد)"""
+        bits = self.completions.get(user_id)
+        if bits is not None:
+            self.completions.set(user_id, bits | (1 << task_id))
+
+    @staticmethod
+    def build_user_tasks(tasks: List[Dict], bits: int) -> List[Dict]:
+        """لیست ماموریت‌ها با فیلد completed برای یک کاربر"""
+        return [dict(task, completed=bits >> task['id'] & 1) for task in tasks]
+
+    def stats(self) -> Dict:
+        return {
+            "catalog_cached": self._tasks is not None,
+            "catalog_size": len(self._tasks or ()),
+            "catalog_loads": self.catalog_loads,
+            "completions": self.completions.stats(),
+        }
@@ -7,6 +7,8 @@ logger = logging.getLogger(__name__)
 class TaskManager:
     def __init__(self):
         self.tasks = Config.TASKS
+        # MembershipVerifier؛ در پروسه‌ی worker که به Bot API دسترسی دارد تنظیم می‌شود
+        self.membership = None
     
     def get_available_tasks_for_user(self, telegram_id: int) -> list:
         """دریافت ماموریت‌های available برای کاربر"""
@@ -26,15 +28,23 @@ class TaskManager:
         # اینجا نیاز به منطق خاص داری
         return True
     
-    def check_channel_membership(self, telegram_id: int, channel_username: str) -> bool:
-        """بررسی عضویت در کانال (شبیه‌سازی)"""
-        # در حالت واقعی از Telegram API استفاده میشه
-        return True
+    def channel_for_task(self, task: dict) -> str:
+        """کانال Telegram که ماموریت به عضویت در آن نیاز دارد (ستون tasks.channel؛ None برای بقیه‌ی ماموریت‌ها)"""
+        if task['task_type'] != 'social':
+            return None
+        return task.get('channel')
+    
+    async def check_channel_membership(self, telegram_id: int, channel_username: str) -> bool:
+        """بررسی عضویت در کانال با getChatMember (نتیجه cache می‌شود)"""
+        if self.membership is None:
+            logger.error("Channel membership check requested but no MembershipVerifier is attached")
+            return False
+        return await self.membership.is_member(channel_username, telegram_id)
     
     def verify_twitter_follow(self, telegram_id: int, twitter_username: str) -> bool:
-        """بررسی فالو توئیتر (شبیه‌سازی)"""
-        # در حالت واقعی از Twitter API استفاده میشه
-        return True
+        """بررسی فالو توئیتر؛ بدون اتصال به Twitter API تایید نمی‌شود (fail closed)"""
+        logger.warning(f"Twitter follow of @{twitter_username} by {telegram_id} cannot be verified without Twitter API")
+        return False
 
 # نمونه global
 task_manager = TaskManager()
@@ -0,0 +1,274 @@
+from functools import lru_cache
+from string import Formatter
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# حداکثر طول پیام Telegram (بر حسب واحد UTF-16)
+MAX_MESSAGE_LENGTH = 4096
+
+
+class Template:
+    """قالب پیام که یک بار parse می‌شود؛ رندر با str.format_map (بدون parse دوباره در Python)"""
+
+    def __init__(self, source: str):
+        self.source = source
+        # parse در زمان import خطای قالب را زود نشان می‌دهد و نام فیلدها را برای بررسی نگه می‌دارد
+        self.fields = [field for _, field, _, _ in Formatter().parse(source) if field is not None]
+        self._render = source.format_map
+
+    def render(self, **values) -> str:
+        return self._render(values)
+
+    def render_row(self, row: Mapping) -> str:
+        return self._render(row)
+
+    def render_many(self, rows: Iterable[Mapping]) -> str:
+        """رندر چند ردیف با یک join (به جای += در حلقه)"""
+        return "".join(map(self._render, rows))
+
+
+def utf16_length(text: str) -> int:
+    """طول متن همان‌طور که Telegram می‌شمارد (emojiها دو واحد)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate(text: str, limit: int) -> str:
+    """بریدن متن به limit واحد UTF-16 (بدون شکستن emoji)"""
+    if utf16_length(text) <= limit:
+        return text
+    encoded = text.encode("utf-16-le")[:max(limit - 1, 0) * 2]
+    return encoded.decode("utf-16-le", errors="ignore") + "…"
+
+
+def paginate(blocks: List[str], header: str = "", footer: str = "",
+             limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """تقسیم بلوک‌های رندر شده به صفحه‌های کوتاه‌تر از limit (بدون شکستن بلوک‌ها)"""
+    text = "".join((header, *blocks, footer))
+    # مسیر سریع: هر کاراکتر حداکثر دو واحد UTF-16 است
+    if len(text) * 2 <= limit or utf16_length(text) <= limit:
+        return [text]
+
+    budget = limit - utf16_length(footer)
+    pages = []
+    parts, size = [header], utf16_length(header)
+
+    for block in blocks:
+        block_size = utf16_length(block)
+        if size + block_size > budget and len(parts) > 1:
+            pages.append("".join(parts))
+            parts, size = [], 0
+        if size + block_size > budget:
+            # یک بلوک به تنهایی از یک پیام بلندتر است
+            block = truncate(block, budget - size)
+            block_size = utf16_length(block)
+        parts.append(block)
+        size += block_size
+
+    parts.append(footer)
+    pages.append("".join(parts))
+    return pages
+
+
+def _keyboard(*rows: Tuple[Tuple[str, str], ...]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(text, callback_data=data) for text, data in row] for row in rows
+    ])
+
+
+# ===== KEYBOARDS =====
+# اشیای InlineKeyboardMarkup در PTB 20 تغییرناپذیرند و بین همه‌ی پاسخ‌ها مشترک‌اند
+
+MAIN_MENU_KEYBOARD = _keyboard(
+    (("💰 START EARNING", "earn"),),
+    (("📊 MY WALLET", "wallet"),),
+    (("👥 INVITE FRIENDS", "invite"),),
+    (("📋 AVAILABLE TASKS", "tasks"),),
+    (("👤 MY PROFILE", "profile"),),
+)
+
+WALLET_KEYBOARD = _keyboard(
+    (("🔗 Connect Wallet", "connect_wallet"),),
+    (("💳 Withdraw Tokens", "withdraw"),),
+    (("📊 Transaction History", "transactions"),),
+    (("🔄 Refresh", "refresh_wallet"),),
+)
+
+TASKS_KEYBOARD = _keyboard(
+    (("🔄 Refresh Tasks", "refresh_tasks"),),
+    (("📊 My Progress", "task_progress"),),
+)
+
+INVITE_KEYBOARD = _keyboard(
+    (("📤 Share Link", "share_link"),),
+    (("📊 Referral Stats", "referral_stats"),),
+    (("🏆 Leaderboard", "leaderboard"),),
+)
+
+PROFILE_KEYBOARD = _keyboard(
+    (("🔄 Refresh", "refresh_profile"),),
+    (("📊 Transactions", "transactions"),),
+)
+
+
+@lru_cache(maxsize=256)
+def leaderboard_keyboard(page: int, has_next: bool) -> Optional[InlineKeyboardMarkup]:
+    """دکمه‌های صفحه‌بندی لیدربرد (cache شده برای هر صفحه)"""
+    navigation = []
+    if page > 0:
+        navigation.append(("⬅️ Previous", f"leaderboard:{page - 1}"))
+    if has_next:
+        navigation.append(("Next ➡️", f"leaderboard:{page + 1}"))
+    return _keyboard(tuple(navigation)) if navigation else None
+
+
+def transactions_keyboard(newer: Optional[Tuple], older: Optional[Tuple]) -> Optional[InlineKeyboardMarkup]:
+    """دکمه‌های صفحه‌بندی تراکنش‌ها؛ cursor به شکل <جهت>:<id>:<created_at>"""
+    navigation = []
+    if newer:
+        navigation.append(("⬅️ Newer", f"txn:{newer[1]}:{newer[0]}"))
+    if older:
+        navigation.append(("Older ➡️", f"txo:{older[1]}:{older[0]}"))
+    return _keyboard(tuple(navigation)) if navigation else None
+
+
+# ===== TEMPLATES =====
+
+WELCOME = Template("""🚀 **Welcome to LastForEnd, {first_name}!**
+
+Your final opportunity for financial freedom begins here.
+
+🔹 **Earn LFE tokens effortlessly**
+🔹 **Invite friends for bonus rewards**
+🔹 **Connect your wallet securely**
+
+Start your journey to financial independence today!""")
+
+INVITED_BONUS = "\n\n🎉 You were invited by a friend! +25 LFE bonus!"
+
+WALLET = Template("""💼 **Your LastForEnd Wallet**
+
+💰 **Balance:** `{total_tokens} LFE`
+🌐 **Network:** Ethereum ERC-20
+
+{wallet_line}""")
+WALLET_CONNECTED = Template("🔗 **Connected Wallet:** `{start}...{end}`")
+WALLET_NOT_CONNECTED = "🔗 **Wallet Status:** Not connected"
+WALLET_ONCHAIN = Template("\n⛓️ **On-chain:** {balances}")
+
+TASKS_HEADER = "📋 **Available Tasks**\n\n"
+TASK_DONE = Template("✅ **{name}**\n📝 {description}\n💰 Reward: `{reward_tokens} LFE`\n\n")
+TASK_OPEN = Template("⭕ **{name}**\n📝 {description}\n💰 Reward: `{reward_tokens} LFE`\n"
+                     "🆔 Complete with: `/complete_{id}`\n\n")
+
+INVITE = Template("""👥 **Invite Friends & Earn**
+
+Invite your friends to join LastForEnd and earn bonus tokens!
+
+🔗 **Your Referral Link:**
+`https://t.me/LastForEndBot?start={referral_code}`
+
+📊 **Your Referral Stats:**
+👥 Total Referrals: `{total_referrals}`
+💰 Total Earned: `{total_earned} LFE`
+
+🎁 **Rewards:**
+• 25 LFE for each successful referral
+• 10% of your friend's earnings""")
+
+PROFILE = Template("""👤 **Your Profile**
+
+🆔 **User ID:** `{telegram_id}`
+📛 **Username:** @{username}
+💰 **Total Balance:** `{total_tokens} LFE`
+👥 **Referrals:** `{total_referrals}`
+📊 **Tasks Completed:** `{completed_tasks_count}`
+📅 **Member Since:** `{member_since}`
+
+🌐 **API Key:** `{api_key}`
+🔗 **Referral Code:** `{referral_code}`""")
+
+LEADERBOARD_HEADER = "🏆 **Referral Leaderboard**\n\n"
+LEADERBOARD_ROW = Template("{medal} **{username}**\n"
+                           "   👥 Referrals: `{referral_count}` | 💰 Balance: `{total_tokens} LFE`\n\n")
+LEADERBOARD_MY_RANK = Template("📍 Your rank: `#{rank}` with `{referral_count}` referrals")
+LEADERBOARD_NO_RANK = "📍 Invite a friend to join the leaderboard!"
+MEDALS = {1: "🥇", 2: "🥈", 3: "🥉"}
+
+TRANSACTIONS_HEADER = "📊 **Recent Transactions**\n\n"
+TRANSACTION_ROW = Template("{emoji} **{title}**\n   Amount: `{amount} LFE`\n   Date: `{date}`\n"
+                           "   Desc: {description}\n\n")
+
+SHARE_LINK = Template("📤 **Share this link with your friends:**\n\n"
+                      "`https://t.me/LastForEndBot?start={referral_code}`\n\n"
+                      "Each friend who joins through this link earns you 25 LFE!")
+
+WITHDRAW_USAGE = ("💳 **Withdraw Tokens**\n\n"
+                  "Send the amount you want to withdraw to your connected wallet:\n"
+                  "`/withdraw 100`")
+
+CONNECT_WALLET_USAGE = ("🔗 **Connect Wallet**\n\n"
+                        "Send your wallet address in this format:\n"
+                        "`/connect_wallet 0xYourWalletAddress`")
+
+
+# ===== RENDERERS =====
+
+def render_wallet(user_data: Dict, onchain: Optional[Dict] = None) -> str:
+    address = user_data['wallet_address']
+    wallet_line = WALLET_CONNECTED.render(start=address[:10], end=address[-8:]) if address else WALLET_NOT_CONNECTED
+    if onchain:
+        wallet_line += WALLET_ONCHAIN.render(
+            balances=" · ".join(f"`{amount.normalize():f} {symbol}`" for symbol, amount in onchain.items()))
+    return WALLET.render(total_tokens=user_data['total_tokens'], wallet_line=wallet_line)
+
+
+def render_tasks(tasks: List[Dict]) -> List[str]:
+    """لیست ماموریت‌ها در یک یا چند صفحه"""
+    blocks = [(TASK_DONE if task['completed'] else TASK_OPEN).render_row(task) for task in tasks]
+    return paginate(blocks, TASKS_HEADER)
+
+
+def render_profile(user, user_data: Dict, referral_stats: Dict) -> str:
+    return PROFILE.render(
+        telegram_id=user.id,
+        username=user.username if user.username else 'N/A',
+        total_tokens=user_data['total_tokens'],
+        total_referrals=referral_stats['total_referrals'],
+        completed_tasks_count=user_data['completed_tasks_count'],
+        member_since=user_data['created_at'][:10],
+        api_key=user_data['api_key'],
+        referral_code=user_data['referral_code'],
+    )
+
+
+def render_leaderboard(entries: List[Dict], my_rank: Optional[Dict]) -> str:
+    rows = LEADERBOARD_ROW.render_many({
+        'medal': MEDALS.get(entry['rank'], f"{entry['rank']}."),
+        'username': entry['username'] or f"User{entry['telegram_id']}",
+        'referral_count': entry['referral_count'],
+        'total_tokens': entry['total_tokens'],
+    } for entry in entries)
+    footer = LEADERBOARD_MY_RANK.render_row(my_rank) if my_rank else LEADERBOARD_NO_RANK
+    return "".join((LEADERBOARD_HEADER, rows, footer))
+
+
+@lru_cache(maxsize=64)
+def _transaction_title(transaction_type: str) -> str:
+    return transaction_type.replace('_', ' ').title()
+
+
+def _transaction_fields(tx: Dict) -> Dict:
+    return {
+        'emoji': "🟢" if tx['amount'] > 0 else "🔴",
+        'title': _transaction_title(tx['transaction_type']),
+        'amount': tx['amount'],
+        'date': tx['created_at'][:16],
+        'description': tx['description'],
+    }
+
+
+def render_transactions(transactions: List[Dict]) -> List[str]:
+    """لیست تراکنش‌ها در یک یا چند صفحه"""
+    blocks = [TRANSACTION_ROW.render_row(_transaction_fields(tx)) for tx in transactions]
+    return paginate(blocks, TRANSACTIONS_HEADER)
@@ -0,0 +1,135 @@
+import logging
+import secrets
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .connection_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# (telegram_id, user_id)؛ هر کدام ممکن است None باشد
+Change = Tuple[Optional[int], Optional[int]]
+
+
+class UserChangeFeed:
+    """انتشار تغییر کاربران بین پروسه‌ها (ربات، API، worker، indexer) با جدول user_changes
+
+    invalidate_user در هر پروسه تغییر را در حافظه جمع می‌کند و thread همین کلاس هر interval آن‌ها را
+    با یک executemany ثبت و تغییرهای پروسه‌های دیگر را می‌خواند؛ cacheهای محلی حداکثر interval ثانیه
+    از نوشتن پروسه‌ی دیگر عقب هستند.
+    """
+
+    def __init__(self, pool: ConnectionPool, apply: Callable[[List[Change]], None], interval: float = 1.0,
+                 retention: float = 3600.0, batch_size: int = 1000):
+        self.pool = pool
+        self.apply = apply
+        self.interval = interval
+        self.retention = retention
+        self.batch_size = batch_size
+        self.origin = secrets.token_hex(8)
+
+        self._pending: Set[Change] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_prune = time.monotonic()
+        # تغییرهای قبل از شروع پروسه مهم نیستند چون cacheها خالی هستند
+        with self.pool.connection() as conn:
+            self.last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM user_changes').fetchone()[0]
+
+        self.published = 0
+        self.received = 0
+        self.syncs = 0
+        self._thread = threading.Thread(target=self._run, name="user-changes", daemon=True)
+        self._thread.start()
+
+    def publish(self, telegram_id: int = None, user_id: int = None):
+        """ثبت تغییر برای پروسه‌های دیگر (در sync بعدی نوشته می‌شود)"""
+        if telegram_id is None and user_id is None:
+            return
+        with self._lock:
+            self._pending.add((telegram_id, user_id))
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        now = time.time()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.executemany('''
+                    INSERT INTO user_changes (origin, telegram_id, user_id, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', [(self.origin, telegram_id, user_id, now) for telegram_id, user_id in pending])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                with self._lock:
+                    self._pending |= pending
+                raise
+        self.published += len(pending)
+
+    def _receive(self) -> int:
+        """خواندن تغییرهای پروسه‌های دیگر از last_id به بعد و اعمال آن‌ها"""
+        received = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute('''
+                    SELECT id, origin, telegram_id, user_id FROM user_changes
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (self.last_id, self.batch_size)).fetchall()
+            if not rows:
+                return received
+            changes = list({(row[2], row[3]) for row in rows if row[1] != self.origin})
+            if changes:
+                self.apply(changes)
+                received += len(changes)
+            self.last_id = rows[-1][0]
+            if len(rows) < self.batch_size:
+                return received
+
+    def _prune(self):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM user_changes WHERE created_at < ?', (time.time() - self.retention,))
+            conn.commit()
+        self._last_prune = time.monotonic()
+
+    def sync(self) -> int:
+        """یک دور: نوشتن تغییرهای این پروسه و اعمال تغییرهای بقیه؛ تعداد تغییرهای دریافتی"""
+        self._flush()
+        received = self._receive()
+        if time.monotonic() - self._last_prune >= self.retention / 10:
+            self._prune()
+        self.received += received
+        self.syncs += 1
+        return received
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing user changes: {e}")
+
+    def close(self):
+        """توقف thread و نوشتن تغییرهای باقی‌مانده"""
+        self._stop.set()
+        self._thread.join()
+        try:
+            self._flush()
+        except Exception as e:
+            logger.error(f"Error flushing user changes: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "published": self.published,
+            "received": self.received,
+            "syncs": self.syncs,
+            "last_id": self.last_id,
+        }
@@ -1,53 +1,142 @@
-import web3
-from web3 import Web3
+import asyncio
 import logging
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from web3 import Web3
+
 from .config import Config
+from .database import DatabaseManager, db
+from .event_indexer import credit_wallet_deposits
+from .signatures import SignatureItem, recover_signer, signed_by, start_pool, verify_chunk
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=Config.ADDRESS_CACHE_SIZE)
+def _is_address(address: str) -> bool:
+    return Web3.is_address(address)
+
+
 class WalletIntegration:
-    def __init__(self):
+    def __init__(self, manager: DatabaseManager = None, workers: int = None):
         self.supported_wallets = Config.SUPPORTED_WALLETS
-    
+        self.db = manager or db
+        self.workers = workers or Config.SIGNATURE_WORKERS
+        # بازیابی ECDSA وابسته به CPU است و event loop ربات را قفل می‌کند؛ در پروسه‌های جدا انجام می‌شود
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
     def validate_wallet_address(self, address: str) -> bool:
-        """اعتبارسنجی آدرس کیف پول"""
+        """اعتبارسنجی آدرس کیف پول (نتیجه cache می‌شود)"""
+        if not isinstance(address, str):
+            return False
         try:
-            return Web3.is_address(address)
-        except:
+            return _is_address(address)
+        except Exception:
             return False
-    
-    def generate_wallet_message(self, telegram_id: int) -> str:
+
+    def generate_wallet_message(self, telegram_id: int, nonce: str = None) -> str:
         """تولید پیام برای امضای کیف پول"""
-        return f"LastForEnd Bot Connection: {telegram_id}"
-    
+        message = f"LastForEnd Bot Connection: {telegram_id}"
+        return f"{message}\nNonce: {nonce}" if nonce else message
+
     def verify_wallet_signature(self, address: str, signature: str, message: str) -> bool:
-        """بررسی امضای کیف پول"""
+        """بررسی امضای personal_sign پیام با آدرس کیف پول"""
+        if not self.validate_wallet_address(address):
+            return False
         try:
-            # اینجا منطق بررسی امضا رو اضافه کن
-            return True
+            return signed_by(address, signature, message)
         except Exception as e:
             logger.error(f"Error verifying signature: {e}")
             return False
-    
-    def get_wallet_balance(self, address: str) -> dict:
-        """دریافت موجودی کیف پول (شبیه‌سازی)"""
-        # در حالت واقعی به بلاکچین متصل میشه
-        return {
-            "LFE": 0,
-            "ETH": 0,
-            "USDT": 0
-        }
-    
-    def prepare_withdrawal(self, telegram_id: int, amount: int, to_address: str) -> dict:
-        """آماده‌سازی برداشت"""
-        return {
-            "success": True,
-            "transaction_hash": "0x" + "0" * 64,  # شبیه‌سازی
-            "amount": amount,
-            "from": "LastForEnd Hot Wallet",
-            "to": to_address,
-            "network_fee": 0.001
-        }
+
+    def create_wallet_challenge(self, user_id: int, telegram_id: int, address: str) -> Optional[str]:
+        """پیام یکبار مصرف (با nonce) که کاربر باید با کیف پولش امضا کند"""
+        if not self.validate_wallet_address(address):
+            return None
+        nonce = secrets.token_hex(16)
+        if not self.db.create_wallet_nonce(user_id, nonce, Web3.to_checksum_address(address),
+                                           Config.WALLET_NONCE_TTL):
+            return None
+        return self.generate_wallet_message(telegram_id, nonce)
+
+    async def connect_wallet(self, user_id: int, telegram_id: int, signature: str) -> Dict:
+        """بررسی امضای challenge و ثبت کیف پول؛ nonce حتی با امضای نادرست مصرف می‌شود (جلوگیری از replay)"""
+        challenge = await asyncio.to_thread(self.db.consume_wallet_nonce, user_id)
+        if challenge is None:
+            return {"success": False, "error": "No pending wallet connection or it has expired."}
+
+        message = self.generate_wallet_message(telegram_id, challenge['nonce'])
+        try:
+            [valid] = await self.verify_signatures_async([(challenge['wallet_address'], signature, message)])
+        except Exception as e:
+            logger.error(f"Error verifying signature: {e}")
+            return {"success": False, "error": "Signature could not be verified. Please try again."}
+        if not valid:
+            return {"success": False, "error": "Signature does not match the wallet address."}
+
+        if not await asyncio.to_thread(self.db.update_wallet_address, user_id, challenge['wallet_address']):
+            return {"success": False, "error": "Could not save the wallet address."}
+        # واریزهایی که قبل از اتصال از همین کیف پول رسیده‌اند (indexer هم هنگام شروع بررسی‌شان می‌کند)
+        try:
+            await asyncio.to_thread(credit_wallet_deposits, self.db, challenge['wallet_address'])
+        except Exception as e:
+            logger.error(f"Error crediting earlier deposits of {challenge['wallet_address']}: {e}")
+        return {"success": True, "wallet_address": challenge['wallet_address']}
+
+    # ===== BATCH VERIFICATION =====
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # spawn: fork کردن پروسه‌ای که threadهای دیتابیس و httpx دارد امن نیست؛ workerها فقط signatures را import می‌کنند
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = start_pool(self.workers)
+            return self._pool
+
+    def _chunks(self, items: List[SignatureItem], chunk_size: int = None) -> List[List[SignatureItem]]:
+        """تقسیم بین workerها؛ دسته‌های کوچک‌تر از SIGNATURE_BATCH_CHUNK تا همه‌ی پروسه‌ها کار داشته باشند"""
+        chunk_size = chunk_size or max(1, min(Config.SIGNATURE_BATCH_CHUNK, -(-len(items) // self.workers)))
+        return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    def verify_signatures(self, items: Iterable[SignatureItem], chunk_size: int = None) -> List[bool]:
+        """بررسی گروهی امضاها در process pool؛ نتیجه به ترتیب ورودی"""
+        items = list(items)
+        if not items:
+            return []
+        results = self._get_pool().map(verify_chunk, self._chunks(items, chunk_size))
+        return [valid for chunk in results for valid in chunk]
+
+    async def verify_signatures_async(self, items: Iterable[SignatureItem], chunk_size: int = None) -> List[bool]:
+        """نسخه‌ی async بررسی گروهی؛ event loop در این مدت آزاد می‌ماند"""
+        items = list(items)
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, verify_chunk, chunk) for chunk in self._chunks(items, chunk_size)
+        ))
+        return [valid for chunk in results for valid in chunk]
+
+    def warm_up(self):
+        """راه‌اندازی پروسه‌های pool از قبل تا اولین بررسی منتظر import نماند"""
+        self._get_pool()
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    async def get_wallet_balance(self, address: str) -> Dict:
+        """موجودی ETH و توکن‌های کیف پول روی زنجیره (batch و cache در balance_service)"""
+        from .balances import balance_service
+
+        return await balance_service.get_balances(address)
+
 
 # نمونه global
 wallet_manager = WalletIntegration()
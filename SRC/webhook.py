@@ -0,0 +1,235 @@
+import asyncio
+import hmac
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+# پاسخ کلیک‌هایی که در بار زیاد کنار گذاشته می‌شوند
+SHED_CALLBACK_TEXT = "⏳ The bot is busy right now, please tap again in a moment."
+
+
+class KeyedWorkerPool:
+    """pool محدود از workerها؛ آیتم‌های یک کلید (کاربر) به ترتیب و کلیدهای مختلف همزمان اجرا می‌شوند"""
+
+    def __init__(self, handler: Callable[[Any], Awaitable[None]], workers: int = 32,
+                 max_pending: int = 10000, max_per_key: int = 50):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_per_key = max_per_key
+
+        # key -> صف آیتم‌های منتظر؛ هر کلید حداکثر یک بار در ready است یا در حال اجرا
+        self._queues: Dict[Hashable, deque] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._idle: Optional[asyncio.Event] = None
+        self.pending = 0
+
+        # آمار برای مانیتورینگ
+        self.accepted = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latencies = deque(maxlen=10000)
+
+    def start(self):
+        """ساخت workerها روی event loop جاری"""
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"update-worker-{n}")
+                       for n in range(self.workers)]
+
+    def submit(self, key: Hashable, item: Any) -> bool:
+        """افزودن آیتم؛ False یعنی صف کل یا صف همین کلید پر است"""
+        queue = self._queues.get(key)
+        if self.pending >= self.max_pending or (queue is not None and len(queue) >= self.max_per_key):
+            self.rejected += 1
+            return False
+
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((item, time.perf_counter()))
+        self.pending += 1
+        self.accepted += 1
+        self._idle.clear()
+        return True
+
+    def load(self) -> float:
+        """نسبت پر بودن صف (برای shedding)"""
+        return self.pending / self.max_pending if self.max_pending else 0.0
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            item, enqueued_at = queue.popleft()
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error processing update for {key}: {e}")
+
+            latency = time.perf_counter() - enqueued_at
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.latencies.append(latency)
+            self.pending -= 1
+
+            # کلید دوباره به انتهای ready می‌رود تا کاربران دیگر هم نوبت بگیرند
+            if queue:
+                self._ready.put_nowait(key)
+            else:
+                del self._queues[key]
+                if not self.pending:
+                    self._idle.set()
+
+    async def join(self):
+        """انتظار تا خالی شدن همه‌ی صف‌ها"""
+        await self._idle.wait()
+
+    async def stop(self, drain: bool = True):
+        """توقف workerها (به صورت پیش‌فرض بعد از پردازش آیتم‌های باقی‌مانده)"""
+        if drain and self._idle is not None:
+            await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict:
+        """آمار صف، throughput و تاخیر"""
+        done = self.processed + self.failed
+        latencies = sorted(self.latencies)
+        pick = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 3) if latencies else 0.0
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "active_keys": len(self._queues),
+            "accepted": self.accepted,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_latency_ms": round(self.latency_total / done * 1000, 3) if done else 0.0,
+            "p50_latency_ms": pick(0.50),
+            "p99_latency_ms": pick(0.99),
+            "max_latency_ms": round(self.latency_max * 1000, 3),
+        }
+
+
+class WebhookServer:
+    """دریافت updateها از Telegram با webhook و پردازش همزمان با KeyedWorkerPool"""
+
+    def __init__(self, application: Application, secret_token: str, path: str = "/webhook",
+                 workers: int = 32, max_pending: int = 10000, max_per_user: int = 50,
+                 shed_watermark: float = 0.8, extra_stats: Callable[[], Dict] = None):
+        # بدون secret هر POST به این مسیر به عنوان update واقعی در صف قرار می‌گرفت
+        if not secret_token:
+            raise ValueError("Webhook mode requires a secret token (set WEBHOOK_SECRET)")
+        self.application = application
+        self.secret_token = secret_token
+        self.path = path
+        self.shed_watermark = shed_watermark
+        self.extra_stats = extra_stats
+        self.pool = KeyedWorkerPool(application.process_update, workers, max_pending, max_per_user)
+        self.shed = 0
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle_update)
+        self.app.router.add_get("/health", self.health)
+        self.runner: Optional[web.AppRunner] = None
+
+    @staticmethod
+    def update_key(update: Update) -> int:
+        """کلید ترتیب: کاربر (یا چت برای updateهای بدون کاربر)"""
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return 0
+
+    @staticmethod
+    def is_sheddable(update: Update) -> bool:
+        """updateهایی که کاربر با یک کلیک دوباره تکرارشان می‌کند"""
+        return update.callback_query is not None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            return web.Response(status=403)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            logger.error(f"Invalid webhook payload: {e}")
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+
+        # در بار زیاد کلیک‌های دکمه کنار گذاشته می‌شوند تا دستورها جا داشته باشند؛ پاسخ answerCallbackQuery
+        # در بدنه‌ی همین پاسخ webhook است تا spinner دکمه بدون درخواست اضافه به Bot API متوقف شود
+        if self.pool.load() >= self.shed_watermark and self.is_sheddable(update):
+            self.shed += 1
+            return web.json_response({
+                "method": "answerCallbackQuery",
+                "callback_query_id": update.callback_query.id,
+                "text": SHED_CALLBACK_TEXT,
+            })
+
+        if not self.pool.submit(self.update_key(update), update):
+            # پاسخ غیر 2xx باعث می‌شود Telegram همین update را بعدا دوباره بفرستد (backpressure)
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response()
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict:
+        stats = dict(self.pool.stats(), shed=self.shed)
+        if self.extra_stats is not None:
+            stats.update(self.extra_stats())
+        return stats
+
+    async def start(self, listen: str, port: int, webhook_url: str = None, max_connections: int = 40):
+        """راه‌اندازی Application، workerها، سرور HTTP و ثبت webhook"""
+        await self.application.initialize()
+        await self.application.start()
+        self.pool.start()
+
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, listen, port).start()
+
+        if webhook_url:
+            await self.application.bot.set_webhook(
+                webhook_url + self.path,
+                secret_token=self.secret_token,
+                max_connections=max_connections,
+                allowed_updates=Update.ALL_TYPES
+            )
+        logger.info(f"Webhook server listening on {listen}:{port}{self.path}")
+
+    async def stop(self):
+        """توقف ورودی، پردازش باقی‌مانده‌ی صف و بستن Application"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+        await self.pool.stop()
+        await self.application.stop()
+        await self.application.shutdown()
+
+    async def serve_forever(self, listen: str, port: int, webhook_url: str = None, max_connections: int = 40):
+        await self.start(listen, port, webhook_url, max_connections)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
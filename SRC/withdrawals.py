@@ -0,0 +1,453 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from eth_account import Account
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from .balances import JSONRPCClient
+from .config import Config
+from .contracts import connect, get_contract
+from .database import DatabaseManager, db
+from .models import TransactionStatus, TransactionType
+
+logger = logging.getLogger(__name__)
+
+# وضعیت دسته‌ها: امضا شده ← ارسال شده ← تایید شده / ناموفق (revert)
+BATCH_SIGNED = "signed"
+BATCH_SENT = "sent"
+BATCH_CONFIRMED = "confirmed"
+BATCH_FAILED = "failed"
+
+FEE_FIELDS = ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+
+
+class NonceManager:
+    """nonce محلی حساب ارسال‌کننده؛ فقط هنگام شروع با شبکه همگام می‌شود و بعد بدون RPC جلو می‌رود"""
+
+    def __init__(self, w3: Web3, address: str):
+        self.w3 = w3
+        self.address = address
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def sync(self, floor: int = 0):
+        """nonce بعدی = بیشترین مقدار بین pending شبکه و nonceهای ثبت شده‌ی خودمان"""
+        with self._lock:
+            self._next = max(self.w3.eth.get_transaction_count(self.address, "pending"), floor)
+
+    def peek(self) -> int:
+        with self._lock:
+            return self._next
+
+    def advance(self, used: int):
+        """بعد از ثبت تراکنش امضا شده؛ اگر امضا یا ثبت ناموفق باشد nonce مصرف نمی‌شود"""
+        with self._lock:
+            self._next = max(self._next, used + 1)
+
+
+class WithdrawalEngine:
+    """برداشت توکن: رزرو اتمی موجودی، پرداخت دسته‌ای با یک تراکنش Disperse و پیگیری تایید
+
+    ربات فقط request_withdrawal را صدا می‌زند (بدون اتصال به شبکه). پروسه‌ی python -m src.withdrawals
+    هر WITHDRAWAL_BATCH_INTERVAL برداشت‌های pending را در دسته‌های WITHDRAWAL_BATCH_SIZE تایی امضا و
+    ارسال می‌کند و رسید همه‌ی دسته‌های در جریان را با هم بررسی می‌کند. فقط یک پروسه باید اجرا شود.
+    """
+
+    def __init__(self, manager: DatabaseManager, w3: Web3 = None, private_key: str = None,
+                 token_address: str = None, disperse_address: str = None,
+                 batch_size: int = None, confirmations: int = None, rpc: JSONRPCClient = None):
+        self.manager = manager
+        self.w3 = w3
+        self.rpc = rpc
+        self.private_key = private_key or Config.HOT_WALLET_PRIVATE_KEY
+        self.token_address = token_address or Config.LFE_TOKEN_ADDRESS
+        self.disperse_address = disperse_address or Config.DISPERSE_ADDRESS
+        self.batch_size = batch_size or Config.WITHDRAWAL_BATCH_SIZE
+        self.confirmations = confirmations or Config.WITHDRAWAL_CONFIRMATIONS
+        self.unit = 10 ** Config.TOKEN_DECIMALS
+
+        self.account = None
+        self.nonces: Optional[NonceManager] = None
+        self._disperse = None
+        self._chain_id = None
+        # حلقه‌ی جدا برای JSONRPCClient (async) در پروسه‌ی batcher که sync اجرا می‌شود
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ===== REQUESTS =====
+
+    def request_withdrawal(self, user_id: int, amount: int, to_address: str) -> Dict:
+        """ثبت برداشت pending؛ موجودی در همان تراکنش کم می‌شود تا دو درخواست همزمان بیش از موجودی نگیرند"""
+        if amount < Config.WITHDRAWAL_MIN_AMOUNT:
+            return {"success": False,
+                    "error": f"Minimum withdrawal is {Config.WITHDRAWAL_MIN_AMOUNT} {Config.TOKEN_SYMBOL}."}
+        if not Web3.is_address(to_address):
+            return {"success": False, "error": "Invalid wallet address."}
+        to_address = Web3.to_checksum_address(to_address)
+
+        def op(cursor):
+            cursor.execute('''
+                UPDATE users
+                SET total_tokens = total_tokens - ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND total_tokens >= ?
+                RETURNING total_tokens, telegram_id
+            ''', (amount, user_id, amount))
+            updated = cursor.fetchone()
+            if updated is None:
+                return None, None
+
+            cursor.execute('''
+                INSERT INTO transactions (user_id, transaction_type, amount, description, status, wallet_address)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, TransactionType.WITHDRAWAL.value, -amount, f"Withdrawal to {to_address}",
+                  TransactionStatus.PENDING.value, to_address))
+            cursor.execute('''
+                INSERT INTO withdrawals (user_id, amount, to_address, status, transaction_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, amount, to_address, TransactionStatus.PENDING.value, cursor.lastrowid))
+            return cursor.lastrowid, updated
+
+        try:
+            withdrawal_id, updated = self.manager.run_write(op)
+        except Exception as e:
+            logger.error(f"Error requesting withdrawal: {e}")
+            return {"success": False, "error": "Could not record the withdrawal. Please try again."}
+        if withdrawal_id is None:
+            return {"success": False, "error": "Insufficient balance."}
+
+        self.manager.invalidate_user(updated[1])
+        self.manager.leaderboard.update_tokens(user_id, updated[0])
+        return {"success": True, "withdrawal_id": withdrawal_id, "amount": amount, "to": to_address,
+                "balance": updated[0]}
+
+    def get_withdrawal(self, withdrawal_id: int) -> Optional[Dict]:
+        with self.manager.get_connection() as conn:
+            row = conn.execute('''
+                SELECT w.id, w.user_id, w.amount, w.to_address, w.status, w.batch_id, b.tx_hash, w.created_at
+                FROM withdrawals w
+                LEFT JOIN withdrawal_batches b ON b.id = w.batch_id
+                WHERE w.id = ?
+            ''', (withdrawal_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("id", "user_id", "amount", "to_address", "status", "batch_id", "tx_hash", "created_at"),
+                        row))
+
+    # ===== BATCHING =====
+
+    def _connect(self):
+        """اتصال به شبکه در اولین استفاده"""
+        if self.nonces is not None:
+            return
+        if self.w3 is None and self.rpc is None:
+            # همان node؛ رسیدهای دسته‌ها با یک درخواست JSON-RPC batch خوانده می‌شوند
+            self.rpc = JSONRPCClient()
+        self.w3 = self.w3 or connect()
+        self.account = Account.from_key(self.private_key)
+        self._disperse = get_contract(self.w3, "Disperse", self.disperse_address)
+        self._chain_id = self.w3.eth.chain_id
+        nonces = NonceManager(self.w3, self.account.address)
+        with self.manager.get_connection() as conn:
+            last = conn.execute('SELECT MAX(nonce) FROM withdrawal_batches').fetchone()[0]
+        nonces.sync(last + 1 if last is not None else 0)
+        self.nonces = nonces
+
+    def _pending(self, limit: int) -> List[Tuple]:
+        with self.manager.get_connection() as conn:
+            return conn.execute('''
+                SELECT id, user_id, amount, to_address FROM withdrawals
+                WHERE status = 'pending' AND batch_id IS NULL
+                ORDER BY id
+                LIMIT ?
+            ''', (limit,)).fetchall()
+
+    def _disperse_call(self, rows: List[Tuple]):
+        """فراخوانی Disperse برای ردیف‌های (to_address, amount)"""
+        return self._disperse.functions.disperseToken(
+            self.token_address, [row[0] for row in rows], [row[1] * self.unit for row in rows])
+
+    def create_batch(self) -> Optional[Dict]:
+        """امضای یک تراکنش Disperse برای حداکثر batch_size برداشت pending، ثبت آن و ارسال به شبکه"""
+        self._connect()
+        rows = self._pending(self.batch_size)
+        if not rows:
+            return None
+
+        nonce = self.nonces.peek()
+        call = self._disperse_call([(row[3], row[2]) for row in rows])
+        # تخمین gas بدون nonce؛ وقتی دسته‌های قبلی هنوز mine نشده‌اند nonce محلی از state شبکه جلوتر است
+        gas = call.estimate_gas({"from": self.account.address})
+        transaction = call.build_transaction({"from": self.account.address, "nonce": nonce, "gas": gas,
+                                              "chainId": self._chain_id})
+        signed = self.account.sign_transaction(transaction)
+        tx_hash = Web3.to_hex(signed.hash)
+        total = sum(row[2] for row in rows)
+        fees = json.dumps({key: transaction[key] for key in FEE_FIELDS if key in transaction})
+
+        def op(cursor):
+            cursor.execute('''
+                INSERT INTO withdrawal_batches
+                (nonce, tx_hash, raw_transaction, status, size, total_amount, fees, signed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (nonce, tx_hash, bytes(signed.raw_transaction), BATCH_SIGNED, len(rows), total, fees, time.time()))
+            batch_id = cursor.lastrowid
+            cursor.executemany('''
+                UPDATE withdrawals SET batch_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND batch_id IS NULL
+            ''', [(batch_id, row[0]) for row in rows])
+            if cursor.rowcount != len(rows):
+                raise RuntimeError(f"Withdrawals of batch {batch_id} changed while it was being signed")
+            return batch_id
+
+        batch_id = self.manager.run_write(op)
+        self.nonces.advance(nonce)
+        self._broadcast(batch_id, signed.raw_transaction)
+        logger.info(f"Withdrawal batch {batch_id}: {len(rows)} withdrawals, {total} {Config.TOKEN_SYMBOL}, "
+                    f"nonce {nonce}, tx {tx_hash}")
+        return {"batch_id": batch_id, "size": len(rows), "total_amount": total, "nonce": nonce, "tx_hash": tx_hash}
+
+    def _broadcast(self, batch_id: int, raw_transaction: bytes) -> bool:
+        """ارسال (یا ارسال دوباره‌ی) تراکنش امضا شده؛ تراکنشی که node از قبل دارد هم ارسال شده حساب می‌شود"""
+        try:
+            self.w3.eth.send_raw_transaction(raw_transaction)
+        except Exception as e:
+            if "known" not in str(e).lower():
+                logger.error(f"Error broadcasting withdrawal batch {batch_id}: {e}")
+                return False
+        self.manager.run_write(lambda cursor: cursor.execute('''
+            UPDATE withdrawal_batches SET status = ?, sent_at = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN (?, ?)
+        ''', (BATCH_SENT, time.time(), batch_id, BATCH_SIGNED, BATCH_SENT)))
+        return True
+
+    def _bump_fee(self, batch_id: int, nonce: int, tx_hash: str, fees: Optional[str],
+                  replaced: Optional[str]) -> bool:
+        """امضای دوباره‌ی همان nonce با کارمزد بیشتر و ارسال آن؛ hash قبلی نگه داشته می‌شود چون ممکن است هنوز mine شود"""
+        if not fees:
+            # دسته‌های امضا شده قبل از migration 15 کارمزد ثبت شده ندارند و فقط دوباره ارسال می‌شوند
+            return False
+        fees = json.loads(fees)
+        with self.manager.get_connection() as conn:
+            rows = conn.execute('''
+                SELECT to_address, amount FROM withdrawals WHERE batch_id = ? ORDER BY id
+            ''', (batch_id,)).fetchall()
+        call = self._disperse_call(rows)
+        gas = call.estimate_gas({"from": self.account.address})
+        transaction = call.build_transaction({"from": self.account.address, "nonce": nonce, "gas": gas,
+                                              "chainId": self._chain_id})
+        # کارمزد فعلی شبکه ولی حداقل WITHDRAWAL_FEE_BUMP برابر قبلی؛ node جایگزین ارزان‌تر را رد می‌کند
+        for key in FEE_FIELDS:
+            if key in transaction:
+                previous = fees.get(key, max(fees.values()))
+                transaction[key] = max(transaction[key], math.ceil(previous * Config.WITHDRAWAL_FEE_BUMP))
+        bumped = {key: transaction[key] for key in FEE_FIELDS if key in transaction}
+        if max(bumped.values()) > Web3.to_wei(Config.WITHDRAWAL_MAX_FEE_GWEI, "gwei"):
+            logger.error(f"Withdrawal batch {batch_id}: fee bump above WITHDRAWAL_MAX_FEE_GWEI, rebroadcasting as is")
+            return False
+
+        signed = self.account.sign_transaction(transaction)
+        new_hash = Web3.to_hex(signed.hash)
+        replaced_hashes = json.loads(replaced or "[]") + [tx_hash]
+        changed = self.manager.run_write(lambda cursor: cursor.execute('''
+            UPDATE withdrawal_batches
+            SET tx_hash = ?, raw_transaction = ?, fees = ?, signed_at = ?, replaced_tx_hashes = ?, status = ?,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND tx_hash = ? AND status IN (?, ?)
+        ''', (new_hash, bytes(signed.raw_transaction), json.dumps(bumped), time.time(), json.dumps(replaced_hashes),
+              BATCH_SIGNED, batch_id, tx_hash, BATCH_SIGNED, BATCH_SENT)).rowcount)
+        if not changed:
+            return False
+        logger.info(f"Withdrawal batch {batch_id}: nonce {nonce} re-signed with fees {bumped}, tx {new_hash} "
+                    f"replaces {tx_hash}")
+        self._broadcast(batch_id, signed.raw_transaction)
+        return True
+
+    # ===== CONFIRMATIONS =====
+
+    def _receipts(self, tx_hashes: List[str]) -> Tuple[int, List[Optional[Dict]]]:
+        """شماره‌ی آخرین بلاک و رسید هر hash (None اگر هنوز mine نشده)؛ با rpc همه در یک درخواست batch"""
+        if self.rpc is None:
+            # provider بدون HTTP (مثلا eth-tester در benchmark)
+            receipts = []
+            for tx_hash in tx_hashes:
+                try:
+                    receipts.append(self.w3.eth.get_transaction_receipt(tx_hash))
+                except TransactionNotFound:
+                    receipts.append(None)
+            return self.w3.eth.block_number, receipts
+
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        results = self._loop.run_until_complete(self.rpc.batch(
+            [("eth_blockNumber", [])] + [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes]))
+        receipts = [None if receipt is None else {key: int(receipt[key], 16) for key in ("blockNumber", "gasUsed", "status")}
+                    for receipt in results[1:]]
+        return int(results[0], 16), receipts
+
+    def poll_confirmations(self) -> Dict[str, List[int]]:
+        """بررسی رسید همه‌ی دسته‌های در جریان (با hashهای جایگزین شده) در یک batch و ثبت نتیجه در یک تراکنش"""
+        self._connect()
+        with self.manager.get_connection() as conn:
+            # تعداد دسته‌های در جریان کم است؛ مرتب‌سازی بر اساس nonce در پایتون
+            in_flight = sorted(conn.execute('''
+                SELECT nonce, id, tx_hash, raw_transaction, status, sent_at, signed_at, fees, replaced_tx_hashes
+                FROM withdrawal_batches
+                WHERE status IN ('signed', 'sent')
+            ''').fetchall())
+        if not in_flight:
+            return {"confirmed": [], "failed": []}
+
+        lookups = [(row[1], tx_hash) for row in in_flight for tx_hash in [row[2]] + json.loads(row[8] or "[]")]
+        head, receipts = self._receipts([tx_hash for _, tx_hash in lookups])
+        mined = {batch_id: (tx_hash, receipt)
+                 for (batch_id, tx_hash), receipt in zip(lookups, receipts) if receipt is not None}
+
+        now = time.time()
+        confirmed, failed = [], []
+        for nonce, batch_id, tx_hash, raw_transaction, status, sent_at, signed_at, fees, replaced in in_flight:
+            if batch_id not in mined:
+                # هنوز mine نشده یا از mempool حذف شده است
+                if status == BATCH_SENT and now - (signed_at or sent_at) >= Config.WITHDRAWAL_FEE_BUMP_AFTER:
+                    try:
+                        if self._bump_fee(batch_id, nonce, tx_hash, fees, replaced):
+                            continue
+                    except Exception as e:
+                        logger.error(f"Error bumping fee of withdrawal batch {batch_id}: {e}")
+                if status == BATCH_SIGNED or now - sent_at >= Config.WITHDRAWAL_REBROADCAST_AFTER:
+                    self._broadcast(batch_id, raw_transaction)
+                continue
+            mined_hash, receipt = mined[batch_id]
+            # تا عمق confirmations صبر می‌کنیم تا reorg نتیجه را عوض نکند
+            if head - receipt["blockNumber"] + 1 < self.confirmations:
+                continue
+            result = (batch_id, receipt["blockNumber"], receipt["gasUsed"], mined_hash)
+            (confirmed if receipt["status"] == 1 else failed).append(result)
+
+        if confirmed or failed:
+            refunded = self.manager.run_write(lambda cursor: self._settle(cursor, confirmed, failed))
+            for user_id, telegram_id, total_tokens in refunded:
+                self.manager.invalidate_user(telegram_id, user_id)
+                self.manager.leaderboard.update_tokens(user_id, total_tokens)
+        for batch_id, _, _, _ in failed:
+            logger.error(f"Withdrawal batch {batch_id} reverted on chain; its withdrawals were refunded")
+        return {"confirmed": [row[0] for row in confirmed], "failed": [row[0] for row in failed]}
+
+    def _settle(self, cursor, confirmed: List[Tuple], failed: List[Tuple]) -> List[Tuple[int, int, int]]:
+        """ثبت دسته‌های قطعی شده؛ برداشت‌های دسته‌ی revert شده به موجودی کاربر برمی‌گردند (user_id, telegram_id, total_tokens)"""
+        # tx_hash همانی می‌شود که mine شده (ممکن است یکی از hashهای جایگزین شده باشد)
+        cursor.executemany('''
+            UPDATE withdrawal_batches
+            SET status = ?, block_number = ?, gas_used = ?, tx_hash = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', [(BATCH_CONFIRMED, block, gas, tx_hash, batch_id) for batch_id, block, gas, tx_hash in confirmed]
+             + [(BATCH_FAILED, block, gas, tx_hash, batch_id) for batch_id, block, gas, tx_hash in failed])
+        statuses = [(TransactionStatus.COMPLETED.value, row[0]) for row in confirmed] \
+            + [(TransactionStatus.FAILED.value, row[0]) for row in failed]
+        cursor.executemany('''
+            UPDATE withdrawals SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE batch_id = ?
+        ''', statuses)
+        # ردیف‌های ledger همه‌ی برداشت‌های یک دسته با یک UPDATE (join روی withdrawals) قطعی می‌شوند
+        cursor.executemany('''
+            UPDATE transactions SET status = ?, transaction_hash = b.tx_hash
+            FROM withdrawals w
+            JOIN withdrawal_batches b ON b.id = w.batch_id
+            WHERE w.batch_id = ? AND transactions.id = w.transaction_id
+        ''', statuses)
+        if not failed:
+            return []
+
+        refunds = []
+        for batch_id, _, _, _ in failed:
+            refunds += cursor.execute('SELECT id, user_id, amount FROM withdrawals WHERE batch_id = ?',
+                                      (batch_id,)).fetchall()
+        cursor.executemany('''
+            INSERT INTO transactions (user_id, transaction_type, amount, description, metadata)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(user_id, TransactionType.WITHDRAWAL.value, amount, f"Withdrawal #{withdrawal_id} refunded",
+               json.dumps({"refund_of": withdrawal_id})) for withdrawal_id, user_id, amount in refunds])
+
+        credits: Dict[int, int] = {}
+        for _, user_id, amount in refunds:
+            credits[user_id] = credits.get(user_id, 0) + amount
+        updated = []
+        for user_id, amount in credits.items():
+            cursor.execute('''
+                UPDATE users SET total_tokens = total_tokens + ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                RETURNING id, telegram_id, total_tokens
+            ''', (amount, user_id))
+            updated.append(cursor.fetchone())
+        return updated
+
+    # ===== LOOP =====
+
+    def run(self, stop: threading.Event = None, batch_interval: float = None, poll_interval: float = None):
+        """هر batch_interval (یا زودتر اگر یک دسته‌ی کامل آماده باشد) دسته می‌سازد و هر poll_interval رسیدها را بررسی می‌کند"""
+        stop = stop or threading.Event()
+        batch_interval = batch_interval or Config.WITHDRAWAL_BATCH_INTERVAL
+        poll_interval = poll_interval or Config.WITHDRAWAL_POLL_INTERVAL
+        last_batch = 0.0
+        while not stop.is_set():
+            try:
+                if time.time() - last_batch >= batch_interval or len(self._pending(self.batch_size)) >= self.batch_size:
+                    last_batch = time.time()
+                    while (batch := self.create_batch()) and batch["size"] >= self.batch_size:
+                        pass
+                self.poll_confirmations()
+            except Exception as e:
+                logger.error(f"Error processing withdrawals: {e}")
+            stop.wait(poll_interval)
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.run_until_complete(self.rpc.close())
+            self._loop.close()
+            self._loop = None
+
+    def stats(self) -> Dict:
+        with self.manager.get_connection() as conn:
+            withdrawals = dict(conn.execute('SELECT status, COUNT(*) FROM withdrawals GROUP BY status').fetchall())
+            batches = dict(conn.execute('SELECT status, COUNT(*) FROM withdrawal_batches GROUP BY status').fetchall())
+            gas = conn.execute('''
+                SELECT COALESCE(SUM(gas_used), 0), COALESCE(SUM(size), 0) FROM withdrawal_batches
+                WHERE status = 'confirmed'
+            ''').fetchone()
+        return {"withdrawals": withdrawals, "batches": batches,
+                "gas_per_withdrawal": gas[0] / gas[1] if gas[1] else None}
+
+
+# نمونه global برای ثبت برداشت از هندلرهای ربات
+withdrawals = WithdrawalEngine(db)
+
+
+if __name__ == "__main__":
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="LastForEnd withdrawal batcher")
+    parser.add_argument("--db", default=Config.DATABASE_PATH, help="database path")
+    parser.add_argument("--once", action="store_true", help="create pending batches and poll receipts once")
+    parser.add_argument("--stats", action="store_true", help="print withdrawal counts and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    engine = WithdrawalEngine(db if args.db == db.db_path else DatabaseManager(args.db))
+
+    if args.stats:
+        print(engine.stats())
+    elif args.once:
+        while (batch := engine.create_batch()) and batch["size"] >= engine.batch_size:
+            pass
+        print(engine.poll_confirmations())
+    else:
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        engine.run(stop)
+    engine.close()
+    engine.manager.close()
@@ -0,0 +1,113 @@
+"""
+Load test for the HTTP API: requests/sec and latency percentiles over keep-alive connections.
+
+Starts the aiohttp server in-process on a seeded temporary database, or targets an
+already running server with --url (then --api-key-prefix must match its users).
+
+    python -m benchmarks.api_load --users 5000 --requests 20000 --concurrency 100
+    python -m benchmarks.api_load --url http://127.0.0.1:5000 --users 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+from src.api import APIServer
+from src.async_database import AsyncDatabaseManager
+from src.database import DatabaseManager
+
+ENDPOINTS = [
+    ("GET", "/api/balance"),
+    ("GET", "/api/tasks"),
+    ("GET", "/api/transactions?limit=20"),
+    ("GET", "/api/leaderboard?limit=10"),
+]
+
+
+def seed(manager: DatabaseManager, users: int):
+    """ساخت کاربر و referral برای داده‌ی آزمایشی"""
+    for telegram_id in range(1, users + 1):
+        inviter = random.randint(1, telegram_id - 1) if telegram_id > 1 and random.random() < 0.5 else None
+        user_id = manager.register_user(telegram_id, f"user{telegram_id}", inviter)
+        for task_id in random.sample(range(1, 7), random.randint(0, 3)):
+            manager.complete_task(user_id, task_id)
+
+
+async def run_load(url: str, api_keys: list, requests: int, concurrency: int) -> list:
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+    # یک session با connection pool مشترک (keep-alive)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector,
+                                     headers={"Accept-Encoding": "gzip"}) as session:
+        async def one(i):
+            method, path = ENDPOINTS[i % len(ENDPOINTS)]
+            headers = {"X-API-Key": random.choice(api_keys)}
+            async with slots:
+                started = time.perf_counter()
+                async with session.request(method, url + path, headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        raise RuntimeError(f"{path} -> {response.status}")
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+def report(latencies: list, elapsed: float):
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    print(f"requests={len(latencies)}  {len(latencies) / elapsed:.0f} req/sec")
+    print(f"latency ms: mean={statistics.mean(latencies) * 1000:.2f}  p50={p(0.50):.2f}  "
+          f"p99={p(0.99):.2f}  max={latencies[-1] * 1000:.2f}")
+
+
+async def main_async(args):
+    today = datetime.now().strftime('%Y%m%d')
+    api_keys = [f"{args.api_key_prefix}{telegram_id}_{today}" for telegram_id in range(1, args.users + 1)]
+
+    runner = None
+    url = args.url
+    if not url:
+        manager = DatabaseManager(os.path.join(tempfile.mkdtemp(), "api_load.db"))
+        seed(manager, args.users)
+        server = APIServer(AsyncDatabaseManager(manager))
+        runner = web.AppRunner(server.app, keepalive_timeout=75)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", args.port)
+        await site.start()
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        started = time.perf_counter()
+        latencies = await run_load(url, api_keys, args.requests, args.concurrency)
+        report(latencies, time.perf_counter() - started)
+    finally:
+        if runner:
+            print(f"pool stats: {manager.get_pool_stats()}")
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="target an already running API server")
+    parser.add_argument("--api-key-prefix", default="LFE_API_")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
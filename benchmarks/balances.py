@@ -0,0 +1,158 @@
+"""
+On-chain balance lookups for /wallet against a local node stand-in.
+
+Deploys LFE, a 6-decimals USDT stand-in and the BalanceChecker contract on an
+in-memory eth-tester chain and serves it over HTTP (benchmarks.fake_node) with a fixed
+per-request latency. A burst of concurrent /wallet lookups is then resolved in four ways:
+
+  naive     one eth_getBalance and one balanceOf per token, each its own HTTP request
+  batch     BalanceService without a checker: one JSON-RPC batch request per window
+  checker   BalanceService with BalanceChecker: one eth_call per 200 addresses
+  cached    the same burst again in the same block (served from the per-block cache)
+
+It also shows coalescing (many concurrent lookups for a few addresses) and that a new
+block invalidates the cache. Results are checked against direct contract calls.
+
+The node runs in the same process, so wall times include py-evm executing every call;
+the HTTP request count is what a hosted node (and its rate limit) would see.
+
+Requires eth-tester[py-evm] (the web3 "tester" extra).
+
+    python -m benchmarks.balances --addresses 1000 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from decimal import Decimal
+
+from web3 import EthereumTesterProvider, Web3
+
+from benchmarks.fake_node import FakeNode
+from src.balances import BALANCE_OF, BalanceService, JSONRPCClient
+from src.config import Config
+from src.contracts import get_contract
+
+UNIT = 10 ** Config.TOKEN_DECIMALS
+
+
+def deploy(w3: Web3, name: str, *args):
+    receipt = w3.eth.wait_for_transaction_receipt(
+        get_contract(w3, name).constructor(*args).transact({"from": w3.eth.accounts[0]}))
+    return get_contract(w3, name, receipt.contractAddress)
+
+
+def setup_chain(holders: int):
+    """زنجیره‌ی محلی با LFE، USDT و BalanceChecker؛ بخشی از آدرس‌ها توکن و ETH دارند"""
+    provider = EthereumTesterProvider()
+    w3 = Web3(provider)
+    funder = w3.eth.accounts[0]
+    lfe = deploy(w3, "LFEToken", "LastForEnd", "LFE", Config.TOKEN_DECIMALS, 10 ** 12 * UNIT)
+    usdt = deploy(w3, "LFEToken", "Tether USD", "USDT", Config.USDT_DECIMALS, 10 ** 15)
+    checker = deploy(w3, "BalanceChecker")
+
+    rng = random.Random(7)
+    addresses = [Web3.to_checksum_address(os.urandom(20).hex()) for _ in range(holders)]
+    for address in addresses[:holders // 4]:
+        lfe.functions.transfer(address, rng.randint(1, 10 ** 6) * UNIT).transact({"from": funder})
+        usdt.functions.transfer(address, rng.randint(1, 10 ** 9)).transact({"from": funder})
+        w3.eth.send_transaction({"from": funder, "to": address, "value": rng.randint(1, 10 ** 18)})
+    return w3, lfe, usdt, checker, addresses
+
+
+def new_service(url: str, lfe, usdt, checker_address: str, args) -> BalanceService:
+    return BalanceService(JSONRPCClient(url, connections=args.connections, timeout=600),
+                          tokens={"LFE": (lfe.address, Config.TOKEN_DECIMALS),
+                                  "USDT": (usdt.address, Config.USDT_DECIMALS)},
+                          checker_address=checker_address, head_ttl=args.head_ttl)
+
+
+async def naive(url: str, lfe, usdt, addresses, args):
+    """هر موجودی یک درخواست HTTP جدا (روش فعلی web3 برای هر فشار /wallet)"""
+    rpc = JSONRPCClient(url, connections=args.connections, timeout=600)
+
+    async def lookup(address):
+        data = Web3.to_hex(BALANCE_OF + bytes(12) + Web3.to_bytes(hexstr=address))
+        eth = int(await rpc.call("eth_getBalance", [address, "latest"]), 16)
+        tokens = [int(await rpc.call("eth_call", [{"to": token.address, "data": data}, "latest"]), 16)
+                  for token in (lfe, usdt)]
+        return address, {"ETH": Decimal(eth).scaleb(-18),
+                         "LFE": Decimal(tokens[0]).scaleb(-Config.TOKEN_DECIMALS),
+                         "USDT": Decimal(tokens[1]).scaleb(-Config.USDT_DECIMALS)}
+
+    results = dict(await asyncio.gather(*(lookup(address) for address in addresses)))
+    await rpc.close()
+    return results
+
+
+async def burst(service: BalanceService, addresses):
+    return dict(zip(addresses, await asyncio.gather(*(service.get_balances(address) for address in addresses))))
+
+
+async def measure(label: str, node: FakeNode, coro, lookups: int):
+    node.reset_counters()
+    started = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} lookups={lookups:<6} http={node.requests:<6} rpc calls={node.calls:<6} "
+          f"{elapsed * 1000:8.1f}ms")
+    return result
+
+
+def expected_balances(w3: Web3, lfe, usdt, addresses):
+    return {address: {"ETH": Decimal(w3.eth.get_balance(address)).scaleb(-18),
+                      "LFE": Decimal(lfe.functions.balanceOf(address).call()).scaleb(-Config.TOKEN_DECIMALS),
+                      "USDT": Decimal(usdt.functions.balanceOf(address).call()).scaleb(-Config.USDT_DECIMALS)}
+            for address in addresses}
+
+
+async def main_async(args):
+    w3, lfe, usdt, checker, holders = setup_chain(args.holders)
+    node = FakeNode(w3, latency=args.latency)
+    url = await node.start()
+    rng = random.Random(42)
+    addresses = rng.sample(holders, min(args.addresses, len(holders)))
+    expected = expected_balances(w3, lfe, usdt, addresses)
+
+    results = await measure("naive (one request per balance)", node, naive(url, lfe, usdt, addresses, args),
+                            len(addresses))
+    assert results == expected, "naive lookups returned wrong balances"
+
+    for label, checker_address in (("batch (JSON-RPC batch)", ""), ("checker (BalanceChecker)", checker.address)):
+        service = new_service(url, lfe, usdt, checker_address, args)
+        results = await measure(label, node, burst(service, addresses), len(addresses))
+        assert results == expected, f"{label} returned wrong balances"
+        await measure("  same burst, same block (cache)", node, burst(service, addresses), len(addresses))
+        await service.close()
+
+    # چند کاربر همزمان /wallet یک آدرس را می‌زنند
+    service = new_service(url, lfe, usdt, checker.address, args)
+    hot = addresses[:10]
+    lookups = [rng.choice(hot) for _ in range(args.addresses)]
+    await measure(f"coalescing ({len(hot)} distinct addresses)", node, burst(service, lookups), len(lookups))
+    print(f"  coalesced={service.coalesced} batches={service.batches}")
+
+    # بلاک جدید: cache قبلی معتبر نیست
+    lfe.functions.transfer(hot[0], UNIT).transact({"from": w3.eth.accounts[0]})
+    await asyncio.sleep(args.head_ttl)
+    results = await measure("new block (refetch)", node, burst(service, hot), len(hot))
+    assert results == expected_balances(w3, lfe, usdt, hot), "stale balances after a new block"
+    print(f"  stats: {service.stats()}")
+    await service.close()
+    await node.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--holders", type=int, default=2000, help="addresses on the chain (a quarter hold tokens)")
+    parser.add_argument("--addresses", type=int, default=1000, help="concurrent /wallet lookups")
+    parser.add_argument("--latency", type=float, default=0.02, help="node round trip per HTTP request (s)")
+    parser.add_argument("--connections", type=int, default=Config.RPC_CONNECTIONS)
+    parser.add_argument("--head-ttl", type=float, default=0.5)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Load test for the bot handlers: updates/sec with blocking DB calls vs the async DB layer.
+
+    python -m benchmarks.bot_load --users 20000 --updates 2000 --concurrency 200
+    python -m benchmarks.bot_load --io-delay 0.002   # emulate cold page cache
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+import src.bot as bot_module
+from src.async_database import AsyncDatabaseManager
+from src.database import DatabaseManager
+
+
+class BlockingDB:
+    """رفتار قبلی: صدا زدن مستقیم متدهای sync داخل event loop"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def __getattr__(self, name):
+        attr = getattr(self.manager, name)
+
+        async def method(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return method
+
+
+class SlowDisk:
+    """شبیه‌سازی تاخیر I/O دیسک (cache سرد) برای هر کوئری"""
+
+    def __init__(self, manager, delay: float):
+        self.manager = manager
+        self.delay = delay
+
+    def __getattr__(self, name):
+        attr = getattr(self.manager, name)
+
+        def method(*args, **kwargs):
+            time.sleep(self.delay)
+            return attr(*args, **kwargs)
+
+        return method
+
+
+def seed(manager: DatabaseManager, users: int):
+    """ساخت کاربر، referral و ماموریت انجام شده برای داده‌ی آزمایشی"""
+    for telegram_id in range(1, users + 1):
+        inviter = random.randint(1, telegram_id - 1) if telegram_id > 1 and random.random() < 0.7 else None
+        user_id = manager.register_user(telegram_id, f"user{telegram_id}", inviter)
+        for task_id in random.sample(range(1, 7), random.randint(0, 3)):
+            manager.complete_task(user_id, task_id)
+
+
+def make_update(telegram_id: int, rtt: float):
+    async def reply_text(*args, **kwargs):
+        # شبیه‌سازی رفت و برگشت به Telegram API
+        await asyncio.sleep(rtt)
+
+    user = SimpleNamespace(id=telegram_id, username=f"user{telegram_id}", first_name="Bench")
+    message = SimpleNamespace(reply_text=reply_text)
+    return SimpleNamespace(effective_user=user, effective_chat=SimpleNamespace(id=telegram_id),
+                           message=message, effective_message=message, callback_query=None)
+
+
+async def run_load(bot, users: int, updates: int, concurrency: int, rtt: float) -> float:
+    handlers = [bot.profile_command, bot.wallet_command, bot.tasks_command, bot.invite_command]
+    context = SimpleNamespace(args=[])
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            handler = handlers[i % len(handlers)]
+            await handler(make_update(random.randint(1, users), rtt), context)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(updates)))
+    return updates / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=0.05, help="simulated Telegram API latency (s)")
+    parser.add_argument("--io-delay", type=float, default=0.0,
+                        help="extra blocking delay per query to emulate cold-cache disk reads (s)")
+    parser.add_argument("--db", default=None, help="existing database to reuse")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    manager = DatabaseManager(path)
+    if not args.db:
+        print(f"seeding {args.users} users into {path} ...")
+        seed(manager, args.users)
+
+    bot = bot_module.LastForEndBot("123456:BENCHMARK")
+    backend = SlowDisk(manager, args.io_delay) if args.io_delay else manager
+
+    bot_module.async_db = BlockingDB(backend)
+    before = asyncio.run(run_load(bot, args.users, args.updates, args.concurrency, args.rtt))
+
+    async_manager = AsyncDatabaseManager(backend)
+    bot_module.async_db = async_manager
+    after = asyncio.run(run_load(bot, args.users, args.updates, args.concurrency, args.rtt))
+    async_manager.shutdown()
+
+    print(f"blocking db calls : {before:10.1f} updates/sec")
+    print(f"async db layer    : {after:10.1f} updates/sec")
+    print(f"pool stats        : {manager.get_pool_stats()}")
+    print(f"executor stats    : {async_manager.get_executor_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Dashboard benchmark: four separate DatabaseManager calls vs one snapshot transaction.
+
+Caches are disabled so every call reaches SQLite, and the pool counters show how
+many connection checkouts each approach costs. Also reports payload bytes for a
+full response vs a 304 revalidation.
+
+    python -m benchmarks.dashboard_snapshot --users 5000 --iterations 20000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from src.database import DatabaseManager
+
+
+def seed(manager: DatabaseManager, users: int):
+    """ساخت کاربر، referral و ماموریت انجام شده برای داده‌ی آزمایشی"""
+    for telegram_id in range(1, users + 1):
+        inviter = random.randint(1, telegram_id - 1) if telegram_id > 1 and random.random() < 0.7 else None
+        user_id = manager.register_user(telegram_id, f"user{telegram_id}", inviter)
+        for task_id in random.sample(range(1, 7), random.randint(0, 3)):
+            manager.complete_task(user_id, task_id)
+
+
+def separate_calls(manager: DatabaseManager, telegram_id: int) -> dict:
+    """روش قبلی: هر بخش داشبورد با یک فراخوانی و connection جدا"""
+    user = manager.get_user_by_telegram_id(telegram_id)
+    return {
+        'user': user,
+        'tasks': manager.get_available_tasks(user['id']),
+        'referrals': manager.get_referral_stats(user['id']),
+        'transactions': manager.get_user_transactions(user['id'], 10),
+    }
+
+
+def measure(label: str, manager: DatabaseManager, call, users: int, iterations: int):
+    checkouts_before = manager.pool.hits + manager.pool.misses
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call(random.randint(1, users))
+    elapsed = time.perf_counter() - started
+    checkouts = manager.pool.hits + manager.pool.misses - checkouts_before
+    print(f"{label:<24} {iterations / elapsed:9.0f} dashboards/sec  "
+          f"{checkouts / iterations:.1f} connection checkouts/dashboard")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args()
+
+    manager = DatabaseManager(os.path.join(tempfile.mkdtemp(), "dashboard.db"))
+    seed(manager, args.users)
+
+    # فقط کاتالوگ ماموریت‌ها (مشترک بین همه) در حافظه می‌ماند
+    manager.user_cache.enabled = False
+    manager.referral_stats_cache.enabled = False
+    manager.task_catalog.completions.enabled = False
+
+    measure("separate calls", manager, lambda t: separate_calls(manager, t), args.users, args.iterations)
+    measure("snapshot transaction", manager, manager.get_dashboard_snapshot, args.users, args.iterations)
+
+    snapshot = manager.get_dashboard_snapshot(1)
+    etag = snapshot.pop('etag')
+    body = json.dumps(snapshot).encode()
+    print(f"full response: {len(body)} bytes body; revalidation with If-None-Match: \"{etag}\" -> 304, 0 bytes body")
+
+
+if __name__ == "__main__":
+    main()
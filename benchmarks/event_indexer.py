@@ -0,0 +1,213 @@
+"""
+Deposit indexer replay on a local EVM (eth-tester with the py-evm backend).
+
+Deploys LFE on an in-memory chain and builds a history of --blocks blocks containing
+--deposits transfers from users' wallets to the deposit address and --noise transfers
+to other addresses. Two things are measured:
+
+  catch-up  the indexer replays the whole history from the start block, once with the
+            adaptive block range and once with a fixed --fixed-range, reporting blocks/s,
+            eth_getLogs requests and the credited total (checked against the chain)
+  live      new deposits keep arriving (--live-rounds rounds of --live-deposits each)
+            and the indexer syncs after every round; it reports the time per sync and
+            the lag behind head, which should stay at confirmations - 1
+
+eth-tester answers eth_getLogs by walking every block in Python, which is far slower
+than a real node, so time spent inside the node is reported separately from the
+indexer's own time (decoding, matching wallets and the batched writes).
+
+A shallow reorg is also simulated with snapshots: a deposit mined in a block that is
+later dropped is never credited, because it never reached the confirmation depth.
+
+Requires eth-tester[py-evm] (the web3 "tester" extra).
+
+    python -m benchmarks.event_indexer --blocks 2000 --deposits 400 --noise 400
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from eth_account import Account
+from web3 import EthereumTesterProvider, Web3
+
+from src.config import Config
+from src.contracts import get_contract
+from src.database import DatabaseManager
+from src.event_indexer import TransferIndexer
+
+UNIT = 10 ** Config.TOKEN_DECIMALS
+
+
+class TimedIndexer(TransferIndexer):
+    """زمان صرف شده در node (eth_getLogs و eth_getBlockByNumber) جدا از زمان خود indexer"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.node_time = 0.0
+
+    def _get_logs(self, from_block, to_block):
+        started = time.perf_counter()
+        try:
+            return super()._get_logs(from_block, to_block)
+        finally:
+            self.node_time += time.perf_counter() - started
+
+    def sync(self, max_ranges=None):
+        get_block = self.w3.eth.get_block
+
+        def timed_get_block(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return get_block(*args, **kwargs)
+            finally:
+                self.node_time += time.perf_counter() - started
+
+        self.w3.eth.get_block = timed_get_block
+        try:
+            return super().sync(max_ranges)
+        finally:
+            del self.w3.eth.get_block
+
+
+def setup_chain(args):
+    """زنجیره با تاریخچه‌ی واریز و transferهای بی‌ربط بین بلاک‌های خالی"""
+    provider = EthereumTesterProvider()
+    w3 = Web3(provider)
+    tester = provider.ethereum_tester
+    funder, *depositors = w3.eth.accounts
+    receipt = w3.eth.wait_for_transaction_receipt(get_contract(w3, "LFEToken").constructor(
+        "LastForEnd", "LFE", Config.TOKEN_DECIMALS, 10 ** 12 * UNIT).transact({"from": funder}))
+    token = get_contract(w3, "LFEToken", receipt.contractAddress)
+    for depositor in depositors:
+        token.functions.transfer(depositor, 10 ** 9 * UNIT).transact({"from": funder})
+    deposit_address = Account.create().address
+    start_block = w3.eth.block_number + 1
+
+    rng = random.Random(42)
+    transfers = ["deposit"] * args.deposits + ["noise"] * args.noise
+    rng.shuffle(transfers)
+    deposited = {}
+    gaps = max(0, args.blocks - len(transfers)) // max(1, len(transfers))
+    for kind in transfers:
+        if kind == "deposit":
+            amount = rng.randint(1, 10 ** 4) * UNIT + rng.randint(0, UNIT - 1)
+            depositor = rng.choice(depositors)
+            deposited[depositor] = deposited.get(depositor, 0) + amount
+            token.functions.transfer(deposit_address, amount).transact({"from": depositor})
+        else:
+            token.functions.transfer(Account.create().address, UNIT).transact({"from": funder})
+        if gaps:
+            tester.mine_blocks(gaps)
+    # تاریخچه تا عمق تایید کامل است
+    tester.mine_blocks(args.confirmations)
+    # کسرهای کمتر از یک توکن هر کیف پول جمع می‌شوند
+    expected = sum(total // UNIT for total in deposited.values())
+    return w3, tester, token, depositors, deposit_address, start_block, expected
+
+
+def new_manager(depositors):
+    manager = DatabaseManager(os.path.join(tempfile.mkdtemp(), "indexer.db"))
+    manager.bulk_register_users((100000 + i, f"user{i}", None) for i in range(1000))
+    manager.run_write(lambda cursor: cursor.executemany(
+        'UPDATE users SET wallet_address = ? WHERE id = ?',
+        [(address, i + 1) for i, address in enumerate(depositors)]))
+    return manager
+
+
+def credited_total(manager) -> int:
+    with manager.get_connection() as conn:
+        return conn.execute("SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE transaction_type = 'deposit'"
+                            ).fetchone()[0]
+
+
+def catch_up(label, chain, args, **kwargs):
+    w3, tester, token, depositors, deposit_address, start_block, expected = chain
+    manager = new_manager(depositors)
+    indexer = TimedIndexer(manager, w3, token_address=token.address, deposit_address=deposit_address,
+                              confirmations=args.confirmations, start_block=start_block, **kwargs)
+    started = time.perf_counter()
+    result = indexer.sync()
+    own = time.perf_counter() - started - indexer.node_time
+    blocks = result["indexed_to"] - start_block + 1
+    total = credited_total(manager)
+    print(f"{label:<22} blocks={blocks:<7} logs={result['logs']:<6} get_logs={indexer.requests:<5} "
+          f"node {indexer.node_time:6.1f}s  indexer {own * 1000:7.1f}ms "
+          f"({result['logs'] / own:8.0f} logs/s)  final range={indexer.block_range}")
+    assert result["logs"] == args.deposits, "indexer missed deposit logs"
+    assert total == expected, f"credited {total}, expected {expected}"
+    return manager, indexer
+
+
+def live(chain, args, manager, indexer):
+    """واریزهای جدید در حین کار؛ هر دور یک sync"""
+    w3, tester, token, depositors, deposit_address, _, _ = chain
+    rng = random.Random(7)
+    timings, own, lags = [], [], []
+    before = credited_total(manager)
+    expected = 0
+    for _ in range(args.live_rounds):
+        for _ in range(args.live_deposits):
+            amount = rng.randint(1, 100) * UNIT
+            expected += amount // UNIT
+            token.functions.transfer(deposit_address, amount).transact({"from": rng.choice(depositors)})
+        tester.mine_blocks(1)
+        started, node_time = time.perf_counter(), indexer.node_time
+        result = indexer.sync()
+        timings.append(time.perf_counter() - started)
+        own.append(timings[-1] - (indexer.node_time - node_time))
+        lags.append(result["lag"])
+    # بلاک‌های باقی‌مانده تا عمق تایید
+    tester.mine_blocks(args.confirmations)
+    indexer.sync()
+    assert credited_total(manager) - before == expected, "live deposits were not all credited"
+    timings.sort()
+    own.sort()
+    print(f"live: {args.live_rounds} rounds x {args.live_deposits} deposits  "
+          f"sync p50={timings[len(timings) // 2] * 1000:.1f}ms (indexer {own[len(own) // 2] * 1000:.1f}ms) "
+          f"max={timings[-1] * 1000:.1f}ms  "
+          f"lag max={max(lags)} blocks (confirmations={args.confirmations})")
+
+
+def shallow_reorg(chain, args, manager, indexer):
+    """واریزی که قبل از رسیدن به عمق تایید از زنجیره حذف شود هرگز اعتبار نمی‌گیرد"""
+    w3, tester, token, depositors, deposit_address, _, _ = chain
+    before = credited_total(manager)
+    snapshot = tester.take_snapshot()
+    token.functions.transfer(deposit_address, 5 * UNIT).transact({"from": depositors[0]})
+    tester.mine_blocks(max(args.confirmations - 2, 0))
+    indexer.sync()
+    tester.revert_to_snapshot(snapshot)
+    tester.mine_blocks(args.confirmations + 1)
+    indexer.sync()
+    assert credited_total(manager) == before, "a dropped deposit was credited"
+    print(f"shallow reorg: dropped deposit not credited; stats {indexer.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=2000)
+    parser.add_argument("--deposits", type=int, default=400)
+    parser.add_argument("--noise", type=int, default=400)
+    parser.add_argument("--confirmations", type=int, default=12)
+    parser.add_argument("--fixed-range", type=int, default=100)
+    parser.add_argument("--live-rounds", type=int, default=10)
+    parser.add_argument("--live-deposits", type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    chain = setup_chain(args)
+    print(f"chain: {chain[0].eth.block_number} blocks, {args.deposits} deposits, {args.noise} other transfers "
+          f"(built in {time.perf_counter() - started:.0f}s)")
+
+    catch_up(f"fixed range {args.fixed_range}", chain, args,
+             block_range=args.fixed_range, max_block_range=args.fixed_range)
+    manager, indexer = catch_up("adaptive range", chain, args)
+    live(chain, args, manager, indexer)
+    shallow_reorg(chain, args, manager, indexer)
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Local JSON-RPC node stand-in for benchmarks.
+
+Serves an in-memory eth-tester chain (py-evm backend) over HTTP with aiohttp. Single
+and batch JSON-RPC requests are supported. Every HTTP request pays a fixed --latency,
+which models the network round trip to a hosted node. The counters show how many HTTP
+requests and RPC calls a client made.
+
+Requires eth-tester[py-evm] (the web3 "tester" extra).
+
+    node = FakeNode(Web3(EthereumTesterProvider()), latency=0.02)
+    url = await node.start()
+"""
+import asyncio
+from collections.abc import Mapping
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from web3 import Web3
+
+
+def to_wire(value: Any) -> Any:
+    """نتیجه‌ی provider (int و bytes) به قالب hex مثل یک node واقعی"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return hex(value)
+    if isinstance(value, (bytes, bytearray)):
+        return Web3.to_hex(value)
+    if isinstance(value, Mapping):
+        # رسیدها و logها AttributeDict هستند
+        return {key: to_wire(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_wire(item) for item in value]
+    return value
+
+
+class FakeNode:
+    def __init__(self, w3: Web3, latency: float = 0.0):
+        # middlewareهای EthereumTesterProvider پارامترهای hex را به قالب eth-tester تبدیل می‌کنند
+        self.make_request = w3.provider.request_func(w3, w3.middleware_onion)
+        self.latency = latency
+        self.requests = 0
+        self.calls = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def _handle_call(self, call: Dict) -> Dict:
+        try:
+            response = self.make_request(call["method"], call.get("params", []))
+        except Exception as e:
+            response = {"error": {"code": -32000, "message": str(e)}}
+        if "error" in response:
+            return {"jsonrpc": "2.0", "id": call.get("id"), "error": response["error"]}
+        return {"jsonrpc": "2.0", "id": call.get("id"), "result": to_wire(response.get("result"))}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """هر درخواست HTTP یک بار latency می‌پردازد؛ batch چند فراخوانی را با هم اجرا می‌کند"""
+        payload = await request.json()
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if isinstance(payload, list):
+            self.calls += len(payload)
+            return web.json_response([self._handle_call(call) for call in payload])
+        self.calls += 1
+        return web.json_response(self._handle_call(payload))
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post("/", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/"
+
+    def reset_counters(self):
+        self.requests = 0
+        self.calls = 0
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
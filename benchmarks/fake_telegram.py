@@ -0,0 +1,218 @@
+"""
+Offline webhook benchmark: a fake Bot API server plus an update stream replayer.
+
+The bot runs in-process in webhook mode with its base_url pointed at the fake
+server, which answers getMe/sendMessage/editMessageText/... after --api-latency.
+Updates are either generated (commands and button presses from --users users) or
+replayed from a recorded JSONL file (one Telegram Update object per line) and
+POSTed to the webhook at --rate updates/sec (0 = as fast as possible).
+
+    python -m benchmarks.fake_telegram --updates 5000 --workers 1,8,64
+    python -m benchmarks.fake_telegram --record stream.jsonl --updates 2000
+    python -m benchmarks.fake_telegram --replay stream.jsonl --rate 500 --max-pending 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter, deque
+
+import aiohttp
+from aiohttp import web
+
+import src.bot as bot_module
+from src.async_database import AsyncDatabaseManager
+from src.config import Config
+from src.database import DatabaseManager
+from src.webhook import WebhookServer
+
+TOKEN = "123456:FAKE"
+SECRET = "benchmark-secret"
+COMMANDS = ["/profile", "/tasks", "/wallet", "/invite", "/leaderboard"]
+BUTTONS = ["wallet", "tasks", "profile", "leaderboard:0", "transactions"]
+
+
+class FakeTelegram:
+    """پیاده‌سازی حداقلی Bot API با تاخیر قابل تنظیم"""
+
+    def __init__(self, latency: float, flood_rate: float = 0):
+        self.latency = latency
+        # اگر بیش از flood_rate پیام در ثانیه ارسال شود مثل Telegram خطای 429 برمی‌گردد
+        self.flood_rate = flood_rate
+        self.window = deque()
+        self.flooded = 0
+        self.calls = Counter()
+        # اعضای کانال برای getChatMember (None یعنی همه عضو هستند)
+        self.members = None
+        self.message_id = 0
+        self.app = web.Application()
+        self.app.router.add_route("*", "/bot{token}/{method}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if self.flood_rate and "chat_id" in params and self.is_flooding():
+            self.flooded += 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": "Too Many Requests: retry after 1",
+                                      "parameters": {"retry_after": 1}}, status=429)
+        await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self.result(method, params)})
+
+    def is_flooding(self) -> bool:
+        now = time.monotonic()
+        while self.window and self.window[0] < now - 1.0:
+            self.window.popleft()
+        if len(self.window) >= self.flood_rate:
+            return True
+        self.window.append(now)
+        return False
+
+    def result(self, method: str, params: dict):
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "LastForEnd", "username": "LastForEndBot",
+                    "can_join_groups": False, "can_read_all_group_messages": False,
+                    "supports_inline_queries": False}
+        if method in ("sendMessage", "editMessageText"):
+            self.message_id += 1
+            chat_id = int(params.get("chat_id") or 0)
+            return {"message_id": self.message_id, "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        if method == "getChatMember":
+            user_id = int(params["user_id"])
+            status = "member" if self.members is None or user_id in self.members else "left"
+            return {"status": status, "user": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}}
+        return True
+
+
+def generate_updates(users: int, count: int, button_ratio: float) -> list:
+    """ساخت جریان update شبیه ترافیک واقعی (دستورها و کلیک دکمه‌ها)"""
+    updates = []
+    now = int(time.time())
+    for update_id in range(1, count + 1):
+        telegram_id = random.randint(1, users)
+        user = {"id": telegram_id, "is_bot": False, "first_name": "Bench", "username": f"user{telegram_id}"}
+        chat = {"id": telegram_id, "type": "private"}
+        message = {"message_id": update_id, "date": now, "chat": chat, "from": user}
+        if random.random() < button_ratio:
+            updates.append({"update_id": update_id, "callback_query": {
+                "id": str(update_id), "from": user, "chat_instance": str(telegram_id),
+                "data": random.choice(BUTTONS), "message": dict(message, text="menu")}})
+        else:
+            text = random.choice(COMMANDS)
+            updates.append({"update_id": update_id, "message": dict(
+                message, text=text, entities=[{"type": "bot_command", "offset": 0, "length": len(text)}])})
+    return updates
+
+
+async def replay(url: str, updates: list, rate: float, concurrency: int) -> Counter:
+    """ارسال updateها به webhook مثل Telegram (با تکرار در صورت پاسخ 503)"""
+    statuses = Counter()
+    slots = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async with aiohttp.ClientSession() as session:
+        async def post(i, update):
+            if rate:
+                await asyncio.sleep(max(0.0, started + i / rate - time.perf_counter()))
+            async with slots:
+                while True:
+                    async with session.post(url, json=update,
+                                            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as response:
+                        statuses[response.status] += 1
+                        if response.status != 503:
+                            return
+                    await asyncio.sleep(float(response.headers.get("Retry-After", 1)) / 10)
+
+        await asyncio.gather(*(post(i, update) for i, update in enumerate(updates)))
+    return statuses
+
+
+async def run(args, updates: list, workers: int, fake: FakeTelegram):
+    bot = bot_module.LastForEndBot(TOKEN, base_url=f"http://127.0.0.1:{args.api_port}/bot")
+    server = WebhookServer(bot.app, SECRET, path="/webhook", workers=workers, max_pending=args.max_pending,
+                           max_per_user=args.max_per_user, shed_watermark=args.shed_watermark,
+                           extra_stats=bot.get_stats)
+    await server.start("127.0.0.1", args.webhook_port)
+
+    started = time.perf_counter()
+    statuses = await replay(f"http://127.0.0.1:{args.webhook_port}/webhook", updates, args.rate, args.connections)
+    await server.pool.join()
+    elapsed = time.perf_counter() - started
+    await server.stop()
+
+    stats = server.stats()
+    print(f"workers={workers:<4} {stats['processed'] / elapsed:8.0f} updates/sec  "
+          f"p50={stats['p50_latency_ms']:.1f}ms p99={stats['p99_latency_ms']:.1f}ms  "
+          f"shed={stats['shed']} rejected(503)={stats['rejected']} failed={stats['failed']}  "
+          f"http={dict(statuses)}")
+    print(f"{'':<12} rate limited={stats['rate_limit']['limited']}  "
+          f"coalesced reads={stats['coalesced_reads']['coalesced']}")
+
+
+async def main_async(args):
+    if args.replay:
+        with open(args.replay) as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = generate_updates(args.users, args.updates, args.button_ratio)
+    if args.record:
+        with open(args.record, "w") as f:
+            for update in updates:
+                f.write(json.dumps(update) + "\n")
+        print(f"recorded {len(updates)} updates to {args.record}")
+
+    fake = FakeTelegram(args.api_latency)
+    runner = web.AppRunner(fake.app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.api_port).start()
+
+    try:
+        for workers in (int(n) for n in args.workers.split(",")):
+            await run(args, updates, workers, fake)
+        print(f"bot api calls: {dict(fake.calls)}")
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=3000)
+    parser.add_argument("--button-ratio", type=float, default=0.3)
+    parser.add_argument("--replay", help="JSONL file of recorded updates")
+    parser.add_argument("--record", help="write the update stream to this JSONL file")
+    parser.add_argument("--rate", type=float, default=0, help="updates/sec offered (0 = unlimited)")
+    parser.add_argument("--connections", type=int, default=40, help="like setWebhook max_connections")
+    parser.add_argument("--workers", default="1,8,64", help="comma separated pool sizes to compare")
+    parser.add_argument("--max-pending", type=int, default=10000)
+    parser.add_argument("--max-per-user", type=int, default=50)
+    parser.add_argument("--shed-watermark", type=float, default=0.8)
+    parser.add_argument("--api-latency", type=float, default=0.03, help="fake Bot API latency (s)")
+    parser.add_argument("--send-rate", type=float, default=0,
+                        help="outbound scheduler global cap in msgs/sec (0 = scheduler off)")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8444)
+    args = parser.parse_args()
+
+    # به صورت پیش‌فرض سقف ارسال Telegram اعمال نمی‌شود تا خود pool سنجیده شود
+    Config.SEND_SCHEDULER_ENABLED = args.send_rate > 0
+    Config.SEND_GLOBAL_RATE = args.send_rate or Config.SEND_GLOBAL_RATE
+
+    manager = DatabaseManager(os.path.join(tempfile.mkdtemp(), "webhook.db"))
+    for telegram_id in range(1, args.users + 1):
+        manager.register_user(telegram_id, f"user{telegram_id}")
+    bot_module.async_db = AsyncDatabaseManager(manager)
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Background job queue: enqueue latency seen by a bot handler, and worker throughput.
+
+Every job simulates a slow external check (--work seconds, failing with probability
+--fail-rate so retries with backoff kick in) and, when it finishes, edits the user's
+"verifying..." message on the fake Bot API. Each job is enqueued twice with the
+same dedup key to show that only one of them runs.
+
+    python -m benchmarks.job_queue --jobs 2000 --processes 1,2,4 --concurrency 16 --work 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from aiohttp import web
+
+from benchmarks.fake_telegram import FakeTelegram
+from src.database import DatabaseManager
+from src.job_queue import JobQueue, run_worker_process, task
+
+
+@task("bench_verify", on_result=lambda result: f"✅ Task {result['task_id']} verified!",
+      on_failure=lambda error: "⚠️ Verification is temporarily unavailable.")
+async def bench_verify(payload, worker):
+    """شبیه‌سازی بررسی کند با سرویس خارجی (با احتمال خطا)"""
+    await asyncio.sleep(payload['work'])
+    if random.random() < payload['fail_rate']:
+        raise ConnectionError("external API timed out")
+    return {'task_id': payload['task_id'], 'finished_at': time.time()}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run(args, processes: int, base_url: str, fake: FakeTelegram):
+    path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    queue = JobQueue(DatabaseManager(path))
+
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker_process,
+                               args=(path, ["benchmarks.job_queue"], args.concurrency, base_url))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    # صبر تا import و راه‌اندازی workerها تمام شود
+    await asyncio.sleep(args.warmup)
+    fake.calls.clear()
+
+    # زمانی که هندلر ربات برای ثبت job صرف می‌کند (به جای انجام خود بررسی)، همزمان با کار workerها
+    started = time.time()
+    enqueue_times, created = [], 0
+    for i in range(args.jobs):
+        for _ in range(2):
+            enqueue_started = time.perf_counter()
+            _, new = await asyncio.to_thread(
+                queue.enqueue, "bench_verify", {'task_id': i, 'work': args.work, 'fail_rate': args.fail_rate},
+                dedup_key=f"bench:{i}", chat_id=1000 + i, message_id=i + 1)
+            enqueue_times.append(time.perf_counter() - enqueue_started)
+            created += new
+        if args.rate:
+            await asyncio.sleep(max(0.0, started + (i + 1) / args.rate - time.time()))
+
+    while True:
+        await asyncio.sleep(0.2)
+        stats = await asyncio.to_thread(queue.stats)
+        if stats['queued'] == 0 and stats['running'] == 0:
+            break
+    elapsed = time.time() - started
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join()
+
+    with queue.manager.get_connection() as conn:
+        attempts = conn.execute('SELECT SUM(attempts) FROM jobs').fetchone()[0]
+        rows = conn.execute("SELECT result FROM jobs WHERE status = 'done'").fetchall()
+    latencies = [json.loads(row[0])['finished_at'] - started for row in rows]
+
+    print(f"processes={processes:<2} x{args.concurrency:<3} {stats['done'] / elapsed:8.0f} jobs/sec  "
+          f"done={stats['done']} failed={stats['failed']} attempts={attempts}  "
+          f"time to result p50={percentile(latencies, 0.5):.2f}s p99={percentile(latencies, 0.99):.2f}s  "
+          f"edits={fake.calls['editMessageText']}")
+    print(f"{'':<16} enqueue p50={percentile(enqueue_times, 0.5) * 1000:.2f}ms "
+          f"p99={percentile(enqueue_times, 0.99) * 1000:.2f}ms  created {created}/{args.jobs * 2} (dedup)  "
+          f"inline handler would block ~{args.work * 1000:.0f}ms+ per update")
+    queue.manager.close()
+
+
+async def main_async(args):
+    fake = FakeTelegram(args.api_latency)
+    runner = web.AppRunner(fake.app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.api_port).start()
+    try:
+        for processes in (int(n) for n in args.processes.split(",")):
+            await run(args, processes, f"http://127.0.0.1:{args.api_port}/bot", fake)
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--processes", default="1,2,4", help="comma separated worker process counts")
+    parser.add_argument("--concurrency", type=int, default=16, help="jobs in flight per process")
+    parser.add_argument("--work", type=float, default=0.05, help="simulated external call (s)")
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--rate", type=float, default=0, help="jobs/sec offered (0 = enqueue all at once)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds to let workers start")
+    parser.add_argument("--api-latency", type=float, default=0.01)
+    parser.add_argument("--api-port", type=int, default=8084)
+    args = parser.parse_args()
+
+    # تنظیمات worker از محیط خوانده می‌شوند (پروسه‌های spawn شده Config را دوباره import می‌کنند)
+    os.environ.setdefault("JOB_RETRY_BASE_DELAY", "0.05")
+    os.environ.setdefault("SEND_SCHEDULER_ENABLED", "0")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
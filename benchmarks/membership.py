@@ -0,0 +1,109 @@
+"""
+Channel membership verification against the fake Bot API (getChatMember).
+
+Compares one-by-one getChatMember calls with MembershipVerifier.check_many at
+several concurrency limits, then measures reward-claim lookups served from the
+in-process cache, from the shared channel_members table (a fresh worker
+process), and after a background re-verification sweep.
+
+    python -m benchmarks.membership --users 2000 --api-latency 0.05 --concurrency 1,10,50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from aiohttp import web
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+
+from benchmarks.fake_telegram import FakeTelegram, TOKEN
+from src.database import DatabaseManager
+from src.membership import MembershipVerifier
+from src.send_queue import SendScheduler
+
+CHANNEL = "@LastForEnd"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def claims(label: str, verifier: MembershipVerifier, users: list):
+    """تاخیر is_member برای درخواست‌های پاداش"""
+    latencies = []
+    calls_before = verifier.api_calls
+    for telegram_id in users:
+        started = time.perf_counter()
+        await verifier.is_member(CHANNEL, telegram_id)
+        latencies.append(time.perf_counter() - started)
+    print(f"  claims, {label:<28} p50={percentile(latencies, 0.5) * 1000:7.3f}ms "
+          f"p99={percentile(latencies, 0.99) * 1000:7.3f}ms  api calls={verifier.api_calls - calls_before}")
+
+
+async def main_async(args):
+    fake = FakeTelegram(args.api_latency)
+    users = list(range(1, args.users + 1))
+    fake.members = set(users[::2])
+    runner = web.AppRunner(fake.app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.api_port).start()
+
+    # getChatMember از صف ارسال پیام عبور نمی‌کند، پس scheduler نباید آن را کند کند
+    bot = ExtBot(TOKEN, base_url=f"http://127.0.0.1:{args.api_port}/bot", rate_limiter=SendScheduler(),
+                 request=HTTPXRequest(connection_pool_size=64))
+    await bot.initialize()
+    manager = DatabaseManager(os.path.join(tempfile.mkdtemp(), "membership.db"))
+
+    try:
+        sample = users[:args.serial_users]
+        started = time.perf_counter()
+        for telegram_id in sample:
+            await bot.get_chat_member(CHANNEL, telegram_id)
+        print(f"one by one getChatMember       {len(sample) / (time.perf_counter() - started):8.0f} checks/sec")
+
+        verifier = None
+        for concurrency in (int(n) for n in args.concurrency.split(",")):
+            manager.run_write(lambda cursor: cursor.execute('DELETE FROM channel_members'))
+            verifier = MembershipVerifier(manager, bot, concurrency=concurrency)
+            started = time.perf_counter()
+            results = await verifier.check_many(CHANNEL, users)
+            elapsed = time.perf_counter() - started
+            print(f"check_many concurrency={concurrency:<4}    {len(users) / elapsed:8.0f} checks/sec  "
+                  f"members={sum(results.values())}/{len(users)}")
+
+        await claims("in-process cache", verifier, users)
+        await claims("shared table (new process)", MembershipVerifier(manager, bot), users)
+
+        # sweep: اعتبار عضوها رو به اتمام است؛ یک کاربر در این فاصله کانال را ترک کرده
+        await asyncio.sleep(args.sweep_ttl)
+        fake.members.discard(users[0])
+        swept = MembershipVerifier(manager, bot, positive_ttl=args.sweep_ttl, concurrency=50)
+        started = time.perf_counter()
+        checked = await swept.sweep(batch_size=args.users)
+        print(f"sweep re-verified {checked} members in {time.perf_counter() - started:.2f}s; "
+              f"user {users[0]} still member: {await swept.is_member(CHANNEL, users[0])}")
+        await claims("after sweep", swept, users[::2])
+    finally:
+        await bot.shutdown()
+        manager.close()
+        await runner.cleanup()
+    print(f"bot api calls: {dict(fake.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--serial-users", type=int, default=200, help="users for the one-by-one baseline")
+    parser.add_argument("--concurrency", default="1,10,50")
+    parser.add_argument("--sweep-ttl", type=float, default=1.0, help="positive TTL used for the sweep demo (s)")
+    parser.add_argument("--api-latency", type=float, default=0.05)
+    parser.add_argument("--api-port", type=int, default=8085)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
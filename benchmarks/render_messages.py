@@ -0,0 +1,87 @@
+"""
+Micro-benchmark for message rendering: the old f-string += loops vs src.templates.
+
+Renders task and transaction lists of increasing size and reports renders/sec plus
+how many <4096-char pages the template path produces.
+
+    python -m benchmarks.render_messages --sizes 10,100,500 --repeat 2000
+"""
+import argparse
+import time
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from src import templates
+
+
+def legacy_tasks(tasks: list):
+    """رندر قبلی tasks_command"""
+    tasks_text = "📋 **Available Tasks**\n\n"
+    for task in tasks:
+        status = "✅" if task['completed'] else "⭕"
+        tasks_text += f"{status} **{task['name']}**\n"
+        tasks_text += f"📝 {task['description']}\n"
+        tasks_text += f"💰 Reward: `{task['reward_tokens']} LFE`\n"
+        if not task['completed']:
+            tasks_text += f"🆔 Complete with: `/complete_{task['id']}`\n"
+        tasks_text += "\n"
+    keyboard = [
+        [InlineKeyboardButton("🔄 Refresh Tasks", callback_data="refresh_tasks")],
+        [InlineKeyboardButton("📊 My Progress", callback_data="task_progress")]
+    ]
+    return tasks_text, InlineKeyboardMarkup(keyboard)
+
+
+def legacy_transactions(transactions: list) -> str:
+    """رندر قبلی show_transactions"""
+    transactions_text = "📊 **Recent Transactions**\n\n"
+    for tx in transactions:
+        emoji = "🟢" if tx['amount'] > 0 else "🔴"
+        date = tx['created_at'][:16]
+        transactions_text += f"{emoji} **{tx['transaction_type'].replace('_', ' ').title()}**\n"
+        transactions_text += f"   Amount: `{tx['amount']} LFE`\n"
+        transactions_text += f"   Date: `{date}`\n"
+        transactions_text += f"   Desc: {tx['description']}\n\n"
+    return transactions_text
+
+
+def make_tasks(n: int) -> list:
+    return [{'id': i, 'name': f"Task number {i}", 'description': f"Do the thing #{i} for the community",
+             'reward_tokens': 10 + i % 50, 'task_type': 'social', 'completed': i % 3 == 0} for i in range(1, n + 1)]
+
+
+def make_transactions(n: int) -> list:
+    return [{'id': i, 'transaction_type': 'task_reward' if i % 2 else 'referral_bonus', 'amount': 25,
+             'description': f"Task completed: Task number {i}", 'created_at': '2024-01-01 12:00:00'}
+            for i in range(1, n + 1)]
+
+
+def measure(label: str, func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    rate = repeat / (time.perf_counter() - started)
+    print(f"  {label:<30} {rate:12.0f} renders/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10,100,500")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    for size in (int(n) for n in args.sizes.split(",")):
+        tasks, transactions = make_tasks(size), make_transactions(size)
+        print(f"{size} rows: tasks -> {len(templates.render_tasks(tasks))} page(s), "
+              f"transactions -> {len(templates.render_transactions(transactions))} page(s)")
+        measure("tasks, legacy +=", lambda: legacy_tasks(tasks), args.repeat)
+        measure("tasks, templates + paginate", lambda: (templates.render_tasks(tasks), templates.TASKS_KEYBOARD),
+                args.repeat)
+        measure("transactions, legacy +=", lambda: legacy_transactions(transactions), args.repeat)
+        measure("transactions, templates + paginate", lambda: templates.render_transactions(transactions),
+                args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Ledger benchmark on a million-row transactions table.
+
+Seeds --rows transactions with the rich columns. About --pending-ratio of them are
+pending withdrawals, each linked to a withdrawals row in a batch of --batch-size.
+It then measures:
+
+  mapping   rows -> Transaction: dict(zip(columns, row)) + Transaction(**d) vs
+            Transaction.from_row vs a cursor row_factory
+  status    paging through every pending row and counting them with the (status, id)
+            index vs NOT INDEXED, and per-user pending lookups
+  bulk      settling --settle pending rows: one UPDATE and commit per row, executemany
+            in one transaction, update_transactions_status (UPDATE ... IN per chunk),
+            and the per-batch join UPDATE used by the withdrawal engine
+
+    python -m benchmarks.transactions_ledger --rows 1000000 --settle 10000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from src.database import DatabaseManager
+from src.models import TRANSACTION_COLUMNS, Transaction, TransactionStatus, TransactionType, transaction_factory
+
+SELECT = f'SELECT {", ".join(TRANSACTION_COLUMNS)} FROM transactions'
+
+
+def seed(manager: DatabaseManager, args):
+    """ledger تصادفی؛ برداشت‌های pending در دسته‌های batch_size به withdrawals وصل می‌شوند"""
+    manager.bulk_register_users((100000 + i, f"user{i}", None) for i in range(args.users))
+    rng = random.Random(42)
+    types = [TransactionType.TASK_REWARD, TransactionType.REFERRAL_BONUS, TransactionType.AIRDROP,
+             TransactionType.DEPOSIT]
+
+    def rows(start, count):
+        for i in range(start, start + count):
+            user_id = rng.randint(1, args.users)
+            if rng.random() < args.pending_ratio:
+                yield (user_id, "withdrawal", -rng.randint(10, 1000), f"Withdrawal #{i}", "pending",
+                       None, None, "0x" + os.urandom(20).hex(), None, None)
+            else:
+                kind = rng.choice(types)
+                yield (user_id, kind.value, rng.randint(1, 100), f"{kind.value} #{i}", "completed",
+                       rng.randint(1, 6) if kind is TransactionType.TASK_REWARD else None, None, None,
+                       None, json.dumps({"i": i}) if kind is TransactionType.DEPOSIT else None)
+
+    for start in range(0, args.rows, 100000):
+        chunk = list(rows(start, min(100000, args.rows - start)))
+        manager.run_write(lambda cursor: cursor.executemany('''
+            INSERT INTO transactions
+            (user_id, transaction_type, amount, description, status, related_task_id,
+             related_referral_id, wallet_address, transaction_hash, metadata)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', chunk))
+
+    def link(cursor):
+        pending = [row[0] for row in cursor.execute(
+            "SELECT id FROM transactions WHERE status = 'pending' ORDER BY id")]
+        batches = len(pending) // args.batch_size
+        cursor.executemany('''
+            INSERT INTO withdrawal_batches (nonce, tx_hash, raw_transaction, status, size, total_amount)
+            VALUES (?, ?, x'00', 'sent', ?, 0)
+        ''', [(n, "0x" + os.urandom(32).hex(), args.batch_size) for n in range(batches + 1)])
+        cursor.executemany('''
+            INSERT INTO withdrawals (user_id, amount, to_address, status, batch_id, transaction_id)
+            SELECT user_id, -amount, wallet_address, 'pending', ?, id FROM transactions WHERE id = ?
+        ''', [(i // args.batch_size + 1, transaction_id) for i, transaction_id in enumerate(pending)])
+        return pending
+
+    return manager.run_write(link)
+
+
+def timed(label: str, func, count: int, unit: str = "rows"):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<40} {elapsed * 1000:9.1f}ms  {count / elapsed:12,.0f} {unit}/s")
+    return result
+
+
+def mapping(manager: DatabaseManager, args):
+    print(f"mapping {args.map_rows:,} rows to Transaction:")
+    with manager.get_connection() as conn:
+        query = f'{SELECT} ORDER BY id LIMIT {args.map_rows}'
+
+        def via_dict():
+            cursor = conn.execute(query)
+            columns = [column[0] for column in cursor.description]
+            result = []
+            for row in cursor:
+                data = dict(zip(columns, row))
+                data["transaction_type"] = TransactionType(data["transaction_type"])
+                data["status"] = TransactionStatus(data["status"])
+                data["created_at"] = datetime.fromisoformat(data["created_at"]) if data["created_at"] else None
+                data["metadata"] = json.loads(data["metadata"]) if data["metadata"] else None
+                result.append(Transaction(**data))
+            return result
+
+        def via_from_row():
+            return [Transaction.from_row(row) for row in conn.execute(query)]
+
+        def via_factory():
+            cursor = conn.cursor()
+            cursor.row_factory = transaction_factory
+            return cursor.execute(query).fetchall()
+
+        timed("raw tuples (no mapping)", lambda: conn.execute(query).fetchall(), args.map_rows)
+        baseline = timed("dict(zip(columns, row)) + Transaction(**d)", via_dict, args.map_rows)
+        fast = timed("Transaction.from_row", via_from_row, args.map_rows)
+        factory = timed("cursor.row_factory", via_factory, args.map_rows)
+        assert baseline[-1].status == fast[-1].status == factory[-1].status
+
+
+def status_queries(manager: DatabaseManager, pending: int, args):
+    print(f"paging all {pending:,} pending rows (500 per page):")
+
+    def page_all(hint: str):
+        def run():
+            after, total = 0, 0
+            with manager.get_connection() as conn:
+                while True:
+                    rows = conn.execute(f'''
+                        {SELECT} {hint}
+                        WHERE status = 'pending' AND id > ?
+                        ORDER BY id
+                        LIMIT 500
+                    ''', (after,)).fetchall()
+                    if not rows:
+                        return total
+                    total += len(rows)
+                    after = rows[-1][0]
+        return run
+
+    assert timed("(status, id) index", page_all(""), pending) == pending
+    assert timed("NOT INDEXED", page_all("NOT INDEXED"), pending) == pending
+
+    def count(hint: str):
+        def run():
+            with manager.get_connection() as conn:
+                return conn.execute(f"SELECT COUNT(*) FROM transactions {hint} WHERE status = 'pending'").fetchone()[0]
+        return run
+
+    assert timed("COUNT pending, index", count(""), 1, "calls") == pending
+    assert timed("COUNT pending, NOT INDEXED", count("NOT INDEXED"), 1, "calls") == pending
+
+    def model_pages():
+        after, total = 0, 0
+        while page := manager.get_transactions_by_status(TransactionStatus.PENDING, after, 500):
+            total += len(page)
+            after = page[-1].id
+        return total
+    timed("get_transactions_by_status (models)", model_pages, pending)
+    timed("count_transactions_by_status", manager.count_transactions_by_status, 1, "calls")
+
+    users = random.Random(1).sample(range(1, args.users + 1), 1000)
+    timed("get_user_transactions_by_status x1000", lambda: [
+        manager.get_user_transactions_by_status(user_id, TransactionStatus.PENDING) for user_id in users],
+          len(users), "calls")
+
+
+def bulk_updates(manager: DatabaseManager, pending, args):
+    print(f"settling {args.settle:,} pending withdrawals per method:")
+    slices = [pending[i * args.settle:(i + 1) * args.settle] for i in range(4)]
+
+    def per_row():
+        with manager.get_connection() as conn:
+            for transaction_id in slices[0]:
+                conn.execute("UPDATE transactions SET status = 'completed' WHERE id = ?", (transaction_id,))
+                conn.commit()
+
+    def executemany():
+        manager.run_write(lambda cursor: cursor.executemany(
+            "UPDATE transactions SET status = 'completed' WHERE id = ?", [(i,) for i in slices[1]]))
+
+    def in_chunks():
+        return manager.update_transactions_status(slices[2], TransactionStatus.COMPLETED, "0xfeed",
+                                                  expected=TransactionStatus.PENDING)
+
+    with manager.get_connection() as conn:
+        batch_ids = sorted({row[0] for row in conn.execute(
+            f'SELECT batch_id FROM withdrawals WHERE transaction_id IN ({",".join("?" * len(slices[3]))})',
+            slices[3])})
+        in_batches = conn.execute(f'SELECT COUNT(*) FROM withdrawals WHERE batch_id IN '
+                                  f'({",".join("?" * len(batch_ids))})', batch_ids).fetchone()[0]
+
+    def join_per_batch():
+        # همان UPDATE ... FROM که WithdrawalEngine._settle برای هر دسته اجرا می‌کند
+        manager.run_write(lambda cursor: cursor.executemany('''
+            UPDATE transactions SET status = ?, transaction_hash = b.tx_hash
+            FROM withdrawals w
+            JOIN withdrawal_batches b ON b.id = w.batch_id
+            WHERE w.batch_id = ? AND transactions.id = w.transaction_id
+        ''', [("completed", batch_id) for batch_id in batch_ids]))
+
+    timed("UPDATE + commit per row", per_row, len(slices[0]))
+    timed("executemany, one transaction", executemany, len(slices[1]))
+    assert timed("update_transactions_status (IN chunks)", in_chunks, len(slices[2])) == len(slices[2])
+    timed(f"join UPDATE per batch ({len(batch_ids)} batches)", join_per_batch, in_batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--pending-ratio", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--map-rows", type=int, default=100000)
+    parser.add_argument("--settle", type=int, default=10000)
+    args = parser.parse_args()
+
+    manager = DatabaseManager(os.path.join(tempfile.mkdtemp(), "ledger.db"))
+    started = time.perf_counter()
+    pending = seed(manager, args)
+    print(f"seeded {args.rows:,} transactions ({len(pending):,} pending withdrawals) "
+          f"in {time.perf_counter() - started:.1f}s; statuses {manager.count_transactions_by_status()}")
+    assert len(pending) >= 4 * args.settle, "not enough pending rows for --settle"
+
+    mapping(manager, args)
+    status_queries(manager, len(pending), args)
+    bulk_updates(manager, pending, args)
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
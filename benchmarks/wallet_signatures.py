@@ -0,0 +1,141 @@
+"""
+EIP-191 (personal_sign) wallet signature verification throughput.
+
+Signs --signatures connection messages with throwaway accounts, then verifies
+them one by one on the calling thread and in batches on the signature process
+pool with 1, 2, 4... workers. Also measures how long the asyncio event loop is
+stalled while verifying inline versus through the pool, the cached address
+validation, and the full challenge -> signature -> connect flow (including a
+replayed signature, which must be rejected).
+
+    python -m benchmarks.wallet_signatures --signatures 400 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from web3 import Web3
+
+from src.database import DatabaseManager
+from src.wallet_integration import WalletIntegration
+
+
+def sign(account, message: str) -> str:
+    return Account.sign_message(encode_defunct(text=message), account.key).signature.hex()
+
+
+def make_items(count: int, accounts: int):
+    """(address, signature, message)؛ یک دهم امضاها متعلق به آدرس دیگری هستند"""
+    signers = [Account.create() for _ in range(accounts)]
+    items = []
+    for i in range(count):
+        account = signers[i % accounts]
+        message = f"LastForEnd Bot Connection: {i}\nNonce: {os.urandom(16).hex()}"
+        address = signers[(i + 1) % accounts].address if i % 10 == 9 else account.address
+        items.append((address, sign(account, message), message))
+    return items
+
+
+async def loop_stall(verify) -> float:
+    """بیشترین تاخیر یک ticker ده میلی‌ثانیه‌ای در حین اجرای verify"""
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal worst
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            worst = max(worst, time.perf_counter() - started - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.05)
+    await verify()
+    done.set()
+    await tick
+    return worst
+
+
+async def connect_flow(wallet: WalletIntegration):
+    """challenge، امضا و ثبت کیف پول؛ امضای تکراری باید رد شود"""
+    manager = wallet.db
+    user_id = manager.register_user(777, "signer")
+    account = Account.create()
+    message = wallet.create_wallet_challenge(user_id, 777, account.address)
+    signature = sign(account, message)
+
+    started = time.perf_counter()
+    first = await wallet.connect_wallet(user_id, 777, signature)
+    elapsed = time.perf_counter() - started
+    replay = await wallet.connect_wallet(user_id, 777, signature)
+    stored = manager.get_user_by_telegram_id(777)['wallet_address']
+    print(f"connect flow {elapsed * 1000:6.1f}ms  success={first['success']} stored={stored == account.address}  "
+          f"replay rejected={not replay['success']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--signatures", type=int, default=400)
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--workers", default="1,2,4", help="comma separated pool sizes")
+    parser.add_argument("--stall-signatures", type=int, default=50, help="signatures verified in the loop stall test")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    items = make_items(args.signatures, args.accounts)
+    print(f"signed {len(items)} messages in {time.perf_counter() - started:.1f}s")
+    expected = [i % 10 != 9 for i in range(len(items))]
+
+    manager = DatabaseManager(os.path.join(tempfile.mkdtemp(), "wallet.db"))
+    inline = WalletIntegration(manager, workers=1)
+    started = time.perf_counter()
+    results = [inline.verify_wallet_signature(*item) for item in items]
+    elapsed = time.perf_counter() - started
+    print(f"one by one (calling thread)  {len(items) / elapsed:8.1f} signatures/sec  correct={results == expected}")
+
+    for workers in (int(n) for n in args.workers.split(",")):
+        wallet = WalletIntegration(manager, workers=workers)
+        wallet.warm_up()
+        started = time.perf_counter()
+        results = wallet.verify_signatures(items)
+        elapsed = time.perf_counter() - started
+        print(f"process pool workers={workers:<3}     {len(items) / elapsed:8.1f} signatures/sec  "
+              f"correct={results == expected}")
+        wallet.close()
+
+    async def stalls():
+        sample = items[:args.stall_signatures]
+
+        async def verify_inline():
+            for item in sample:
+                inline.verify_wallet_signature(*item)
+
+        pooled = WalletIntegration(manager)
+        pooled.warm_up()
+        try:
+            print(f"event loop stall, inline     {await loop_stall(verify_inline) * 1000:8.1f}ms "
+                  f"({len(sample)} signatures)")
+            print(f"event loop stall, pool       "
+                  f"{await loop_stall(lambda: pooled.verify_signatures_async(sample)) * 1000:8.1f}ms")
+            await connect_flow(pooled)
+        finally:
+            pooled.close()
+
+    asyncio.run(stalls())
+
+    addresses = [item[0] for item in items] * 25
+    for label, validate in (("Web3.is_address", Web3.is_address), ("validate (cached)", inline.validate_wallet_address)):
+        started = time.perf_counter()
+        for address in addresses:
+            validate(address)
+        elapsed = time.perf_counter() - started
+        print(f"{label:<28} {elapsed / len(addresses) * 1e6:8.2f}µs/address")
+    manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """پوشه‌ی موقت با data/؛ import بسته‌ی src دیتابیس global را در data/ می‌سازد"""
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def manager(workdir):
+    from src.database import DatabaseManager
+
+    manager = DatabaseManager(str(workdir / "tasks.db"))
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def user_id(manager):
+    return manager.register_user(1, "worker")
+
+
+def ledger_rows(manager, user_id, task_id):
+    with manager.get_connection() as conn:
+        return conn.execute('''
+            SELECT COUNT(*) FROM transactions
+            WHERE user_id = ? AND transaction_type = 'task_reward' AND related_task_id = ?
+        ''', (user_id, task_id)).fetchone()[0]
+
+
+def test_duplicate_completion_pays_once(manager, user_id):
+    task = manager.get_task(1)
+    assert manager.complete_task(user_id, 1)
+    assert not manager.complete_task(user_id, 1)
+    # بدون cache هم تکراری تشخیص داده می‌شود
+    manager.task_catalog.completions.clear()
+    assert not manager.complete_task(user_id, 1)
+
+    user = manager.get_user_by_telegram_id(1)
+    assert user['total_tokens'] == task['reward_tokens']
+    assert user['completed_tasks_count'] == 1
+    assert ledger_rows(manager, user_id, 1) == 1
+
+
+def test_idempotency_key_replay(manager, user_id):
+    assert manager.complete_task(user_id, 1, "callback-1")
+    assert manager.complete_task(user_id, 1, "callback-1")
+    # بعد از پاک شدن cacheها نتیجه از completed_tasks خوانده می‌شود
+    manager.idempotency_cache.clear()
+    manager.task_catalog.completions.clear()
+    assert manager.complete_task(user_id, 1, "callback-1")
+    assert not manager.complete_task(user_id, 1, "callback-2")
+    assert not manager.complete_task(user_id, 1)
+    assert ledger_rows(manager, user_id, 1) == 1
+
+
+@pytest.mark.parametrize("task_id", [-1, 10 ** 6])
+def test_invalid_task_ids(manager, user_id, task_id):
+    assert not manager.complete_task(user_id, task_id)
+    assert manager.get_user_by_telegram_id(1)['total_tokens'] == 0
+
+
+@pytest.mark.parametrize("idempotency_key", [None, "same-key"])
+def test_concurrent_completion(manager, user_id, idempotency_key):
+    barrier = threading.Barrier(16)
+    results = []
+
+    def complete():
+        barrier.wait()
+        results.append(manager.complete_task(user_id, 2, idempotency_key))
+
+    threads = [threading.Thread(target=complete) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # با همان کلید همه‌ی تکرارها نتیجه‌ی اولین اجرا را می‌گیرند؛ بدون کلید فقط یکی موفق است
+    assert sum(results) == (16 if idempotency_key else 1)
+    assert ledger_rows(manager, user_id, 2) == 1
+    assert manager.get_user_by_telegram_id(1)['total_tokens'] == manager.get_task(2)['reward_tokens']
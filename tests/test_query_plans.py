@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def migrated(workdir):
+    """دیتابیس موقت با همه‌ی migrationها"""
+    from src.migrations import MIGRATIONS, run_migrations
+
+    conn = sqlite3.connect(str(workdir / "plans.db"), isolation_level=None)
+    assert run_migrations(conn) == MIGRATIONS[-1][0]
+    yield conn
+    conn.close()
+
+
+def test_hot_queries_use_indexes(migrated):
+    """هیچ کوئری پرتکرار نباید به SCAN یا USE TEMP B-TREE برگردد"""
+    from src.migrations import HOT_QUERIES, check_query_plans
+
+    assert HOT_QUERIES
+    assert check_query_plans(migrated) == []
+
+
+def test_check_query_plans_reports_scans(migrated):
+    from src.migrations import check_query_plans
+
+    problems = check_query_plans(migrated, {
+        "by_username": ('SELECT id FROM users WHERE username = ?', ("alice",)),
+        "sorted_tasks": ('SELECT id FROM tasks ORDER BY reward_tokens', ()),
+    })
+    assert any(problem.startswith("by_username: SCAN") for problem in problems)
+    assert any(problem.startswith("sorted_tasks: ") and "USE TEMP B-TREE" in problem for problem in problems)
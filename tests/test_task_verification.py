@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def manager(workdir):
+    from src.database import DatabaseManager
+
+    manager = DatabaseManager(str(workdir / "tasks.db"))
+    yield manager
+    manager.close()
+
+
+class FakeMembership:
+    def __init__(self, members):
+        self.members = members
+        self.checked = []
+
+    async def is_member(self, channel, telegram_id):
+        self.checked.append(channel)
+        return (channel, telegram_id) in self.members
+
+
+def tasks_by_name(manager):
+    return {task['name']: task for task in manager.get_active_tasks()}
+
+
+def test_each_task_has_its_own_channel(manager):
+    from src.config import Config
+    from src.task_manager import task_manager
+
+    tasks = tasks_by_name(manager)
+    assert task_manager.channel_for_task(tasks["Join Telegram Channel"]) == Config.TELEGRAM_CHANNEL
+    assert task_manager.channel_for_task(tasks["Join Announcement Channel"]) == Config.ANNOUNCEMENT_CHANNEL
+    assert Config.TELEGRAM_CHANNEL != Config.ANNOUNCEMENT_CHANNEL
+    for name in ("Follow Twitter", "Retweet Post", "Invite 1 Friend"):
+        assert task_manager.channel_for_task(tasks[name]) is None
+
+    task_id = manager.add_task("Join Partner Group", "Join our partner group", 15, "social", channel="@Partner")
+    assert task_manager.channel_for_task(manager.get_task(task_id)) == "@Partner"
+
+
+def test_verify_checks_the_task_channel(manager, monkeypatch):
+    from src import jobs
+    from src.config import Config
+    from src.task_manager import task_manager
+
+    membership = FakeMembership({(Config.TELEGRAM_CHANNEL, 1)})
+    monkeypatch.setattr(task_manager, "membership", membership)
+    tasks = tasks_by_name(manager)
+    user = {'telegram_id': 1, 'referral_count': 0}
+
+    assert asyncio.run(jobs._verify(tasks["Join Telegram Channel"], user)) is True
+    # عضویت در کانال اصلی ماموریت کانال اعلانات را کامل نمی‌کند
+    assert asyncio.run(jobs._verify(tasks["Join Announcement Channel"], user)) is False
+    assert membership.checked == [Config.TELEGRAM_CHANNEL, Config.ANNOUNCEMENT_CHANNEL]
+
+
+def test_twitter_tasks_fail_closed(manager):
+    from src import jobs
+
+    tasks = tasks_by_name(manager)
+    user = {'telegram_id': 1, 'referral_count': 0}
+    for name in ("Follow Twitter", "Retweet Post"):
+        assert asyncio.run(jobs._verify(tasks[name], user)) is None
+
+    text = jobs._task_result_text({'completed': False, 'manual': True, 'task': "Follow Twitter", 'task_id': 2})
+    assert "no reward was added" in text
@@ -0,0 +1,55 @@
+import dataclasses
+
+import pytest
+
+
+@pytest.fixture
+def manager(workdir):
+    from src.database import DatabaseManager
+
+    manager = DatabaseManager(str(workdir / "ledger.db"))
+    yield manager
+    manager.close()
+
+
+def test_columns_match_dataclass_fields():
+    from src.models import TRANSACTION_COLUMNS, Transaction
+
+    assert TRANSACTION_COLUMNS == tuple(field.name for field in dataclasses.fields(Transaction))
+
+
+def test_round_trip(manager):
+    from src.models import Transaction, TransactionStatus, TransactionType, transaction_factory
+
+    user_id = manager.register_user(1, "ledger")
+    referral_user = manager.register_user(2, "friend", invited_by=1)
+    with manager.get_connection() as conn:
+        referral_id = conn.execute('SELECT id FROM referrals WHERE invited_id = ?', (referral_user,)).fetchone()[0]
+
+    # هر ستون مقدار متمایز دارد تا جابه‌جایی ترتیب to_row/from_row دیده شود
+    original = Transaction(
+        id=None, user_id=user_id, transaction_type=TransactionType.WITHDRAWAL, amount=-75,
+        description="round trip", status=TransactionStatus.PENDING, created_at=None,
+        related_task_id=3, related_referral_id=referral_id, wallet_address="0x" + "ab" * 20,
+        transaction_hash="0x" + "cd" * 32, metadata={"batch": 7, "note": "x"},
+    )
+    before = manager.count_transactions_by_status().get('pending', 0)
+    assert manager.add_transactions([original]) == 1
+
+    [loaded] = manager.get_user_transactions_by_status(user_id, TransactionStatus.PENDING)
+    assert loaded.id is not None and loaded.created_at is not None
+    assert dataclasses.replace(loaded, id=None, created_at=None) == original
+    assert manager.get_transaction(loaded.id) == loaded
+    assert loaded in manager.get_transactions_by_status(TransactionStatus.PENDING)
+    assert manager.count_transactions_by_status()['pending'] == before + 1
+    assert loaded.to_row() == original.to_row()
+
+    from src.database import TRANSACTION_SELECT
+
+    with manager.get_connection() as conn:
+        conn.row_factory = transaction_factory
+        try:
+            assert conn.execute(f'SELECT {TRANSACTION_SELECT} FROM transactions WHERE id = ?',
+                                (loaded.id,)).fetchone() == loaded
+        finally:
+            conn.row_factory = None
@@ -0,0 +1,76 @@
+import pytest
+
+TIE = "2024-01-01 12:00:00"
+
+
+@pytest.fixture
+def manager(workdir):
+    from src.database import DatabaseManager
+
+    manager = DatabaseManager(str(workdir / "pages.db"))
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def user_id(manager):
+    user_id = manager.register_user(1, "pager")
+    # ۲۵ ردیف با created_at یکسان بین ردیف‌هایی با زمان متفاوت
+    created = (["2024-01-01 11:00:00", "2024-01-01 11:30:00"] + [TIE] * 25
+               + ["2024-01-01 12:30:00", "2024-01-01 13:00:00"])
+    manager.run_write(lambda cursor: cursor.executemany('''
+        INSERT INTO transactions (user_id, transaction_type, amount, description, created_at)
+        VALUES (?, 'task_reward', ?, 'tie', ?)
+    ''', [(user_id, amount, created_at) for amount, created_at in enumerate(created, 1)]))
+    return user_id
+
+
+def expected_order(manager, user_id):
+    with manager.get_connection() as conn:
+        return [row[0] for row in conn.execute('''
+            SELECT id FROM transactions WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        ''', (user_id,))]
+
+
+def callback_cursor(cursor):
+    """رفت و برگشت cursor از قالب callback_data کیبورد (<جهت>:<id>:<created_at>)"""
+    from src import templates
+
+    markup = templates.transactions_keyboard(cursor, cursor)
+    data = markup.inline_keyboard[0][-1].callback_data
+    _, tx_id, created_at = data.split(":", 2)
+    return created_at, int(tx_id)
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7])
+def test_pages_across_ties(manager, user_id, limit):
+    expected = expected_order(manager, user_id)
+    assert len(expected) == 29
+
+    # قدیمی‌تر: از ابتدا تا انتها بدون تکرار یا جاافتادگی
+    seen, pages = [], []
+    page = manager.get_transactions_page(user_id, limit=limit)
+    while True:
+        pages.append(page)
+        seen.extend(tx['id'] for tx in page['transactions'])
+        if page['older'] is None:
+            break
+        page = manager.get_transactions_page(user_id, callback_cursor(page['older']), 'older', limit)
+    assert seen == expected
+    assert pages[0]['newer'] is None
+
+    # جدیدتر: از آخرین صفحه به ابتدا با cursor بالای هر صفحه
+    back = []
+    page = pages[-1]
+    while page['newer'] is not None:
+        page = manager.get_transactions_page(user_id, callback_cursor(page['newer']), 'newer', limit)
+        back = [tx['id'] for tx in page['transactions']] + back
+    assert back + [tx['id'] for tx in pages[-1]['transactions']] == expected
+
+
+def test_iter_across_ties(manager, user_id):
+    expected = expected_order(manager, user_id)
+    older = [tx['id'] for tx in manager.iter_user_transactions(user_id, batch_size=4)]
+    newer = [tx['id'] for tx in manager.iter_user_transactions(user_id, ('', 0), 'newer', batch_size=4)]
+    assert older == expected
+    assert newer == expected[::-1]
@@ -0,0 +1,42 @@
+import pytest
+
+
+@pytest.fixture
+def processes(workdir, monkeypatch):
+    """دو DatabaseManager روی یک فایل، مثل پروسه‌ی ربات و پروسه‌ی worker"""
+    from src.config import Config
+    from src.database import DatabaseManager
+
+    # sync با فراخوانی مستقیم، نه thread پس‌زمینه
+    monkeypatch.setattr(Config, "USER_CHANGES_SYNC_INTERVAL", 3600.0)
+    path = str(workdir / "changes.db")
+    bot, worker = DatabaseManager(path), DatabaseManager(path)
+    yield bot, worker
+    bot.close()
+    worker.close()
+
+
+def test_completion_in_worker_reaches_bot_caches(processes):
+    bot, worker = processes
+    bot.register_user(1, "inviter")
+    user_id = bot.register_user(2, "invited", invited_by=1)
+    task_id = bot.get_available_tasks(user_id)[0]['id']
+    balance = bot.get_user_by_telegram_id(2)['total_tokens']
+
+    assert worker.complete_task(user_id, task_id)
+    worker.register_user(3, "second", invited_by=1)
+    worker.changes.sync()
+    assert bot.changes.sync() > 0
+
+    tasks = {task['id']: task for task in bot.get_available_tasks(user_id)}
+    assert tasks[task_id]['completed']
+    assert bot.get_user_by_telegram_id(2)['total_tokens'] > balance
+    assert bot.get_leaderboard_rank(1)['referral_count'] == 2
+
+
+def test_own_changes_are_not_reapplied(processes):
+    bot, _ = processes
+    bot.register_user(1, "alone")
+    bot.invalidate_user(1)
+    assert bot.changes.sync() == 0
+    assert bot.changes.published >= 1